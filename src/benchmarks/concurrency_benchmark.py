@@ -0,0 +1,48 @@
+"""Compare fixed worker counts with the adaptive concurrency controller against a throttling stub server.
+
+The stub server slows down beyond its capacity and answers 429 above twice
+the capacity, like a site starting to block us. Run from the src directory:
+    python -m benchmarks.concurrency_benchmark --links 400 --capacity 8
+"""
+import argparse
+import time
+
+from benchmarks.stub_server import StubServer
+from fetching import AsyncFetcher, ConcurrencyController, HttpClient, RateLimiter
+
+
+def run(server, links, max_workers, adaptive):
+    client = HttpClient(RateLimiter(rate=1e9, burst=1), retries=0)
+    controller = ConcurrencyController(max_limit=max_workers) if adaptive else None
+    throttled = server.throttled
+    start = time.perf_counter()
+    with AsyncFetcher(max_concurrency=max_workers, client=client, controller=controller) as fetcher:
+        results = fetcher.run(links)
+    elapsed = time.perf_counter() - start
+    client.close()
+    ok = sum(result.ok for result in results)
+    state = controller.describe() if controller is not None else '-'
+    return elapsed, ok, server.throttled - throttled, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--links', type=int, default=400)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--capacity', type=int, default=8)
+    parser.add_argument('--max-workers', type=int, default=32)
+    args = parser.parse_args()
+
+    with StubServer(latency=args.latency, capacity=args.capacity) as server:
+        links = [f'{server.url}/offer/{i}' for i in range(args.links)]
+        print(f"{args.links} links, {args.latency * 1000:.0f} ms latency, server capacity {args.capacity}")
+        print(f"{'mode':<14}{'seconds':>9}{'pages/s':>9}{'ok':>6}{'429':>6}  final state")
+        modes = [('fixed 4', 4, False), (f'fixed {args.max_workers}', args.max_workers, False),
+                 ('adaptive', args.max_workers, True)]
+        for name, workers, adaptive in modes:
+            elapsed, ok, throttled, state = run(server, links, workers, adaptive)
+            print(f"{name:<14}{elapsed:>9.2f}{ok / elapsed:>9.1f}{ok:>6}{throttled:>6}  {state}")
+
+
+if __name__ == '__main__':
+    main()
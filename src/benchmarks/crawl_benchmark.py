@@ -0,0 +1,128 @@
+"""Sharded crawl over local mock sites: scaling with worker processes and recovery from a crashed worker.
+
+Every source and region is a shard of --pages listing pages on a MockSite.
+The crawl runs once per --processes value; then, with --crash, two workers
+share a queue with short leases and one is killed mid-crawl, and the run
+checks that the survivor finishes its tasks once their leases expire. Run
+from the src directory:
+    python -m benchmarks.crawl_benchmark --regions lodz warszawa krakow --pages 6 --processes 1 2 4 --crash
+"""
+import argparse
+import contextlib
+import functools
+import io
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
+
+from benchmarks.mock_site import MockSite
+from pipeline.crawl import build_scraper, export_crawl, run_crawl, run_worker, seed_tasks
+from storage import WorkQueue
+
+
+def mock_scraper(source, region, client, rate_limit=5.0, urls=None, **options):
+    """build_scraper pointed at the mock site of the source."""
+    scraper = build_scraper(source, region, client, rate_limit=rate_limit, **options)
+    scraper.endpoint = scraper.endpoint.replace(scraper.domain, urls[source])
+    scraper.domain = urls[source]
+    client.rate_limiter.configure(scraper.domain, rate_limit, max(1, int(min(rate_limit, 100))))
+    return scraper
+
+
+def new_queue(directory, sources, regions, lease_seconds=60.0):
+    path = os.path.join(directory, 'crawl_queue.db')
+    queue = WorkQueue(path, lease_seconds=lease_seconds)
+    seed_tasks(queue, sources, regions)
+    queue.close()
+    return path
+
+
+def summary(queue_path, directory):
+    """Task counts by status and exported rows by source."""
+    queue = WorkQueue(queue_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        data_files = export_crawl(queue, directory)
+    counts = queue.counts()
+    stored = queue.connection.execute('SELECT COUNT(*) FROM offers').fetchone()[0]
+    queue.close()
+    rows = {}
+    for source, data_file in data_files.items():
+        with open(data_file, encoding='utf-8') as f:
+            rows[source] = sum(1 for _ in f) - 1
+    return counts, stored, rows
+
+
+def bench_processes(args, urls, processes):
+    with tempfile.TemporaryDirectory() as directory:
+        queue_path = new_queue(directory, urls, args.regions)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            exitcodes = run_crawl(queue_path, processes=processes, rate_limit=args.rate,
+                                  make_scraper=functools.partial(mock_scraper, urls=urls), pages=args.pages,
+                                  max_workers=args.workers)
+        wall = time.perf_counter() - start
+        counts, stored, rows = summary(queue_path, directory)
+        print(f"{processes} processes: {wall:6.2f} s, {stored / wall:7.1f} offers/s, tasks {counts}, "
+              f"{stored} offers stored, rows {rows}, exit codes {exitcodes}")
+
+
+def bench_crash(args, urls):
+    lease_seconds = 2.0
+    with tempfile.TemporaryDirectory() as directory:
+        queue_path = new_queue(directory, urls, args.regions, lease_seconds)
+        options = {'make_scraper': functools.partial(mock_scraper, rate_limit=args.rate / 2, urls=urls),
+                   'pages': args.pages, 'max_workers': args.workers, 'lease_seconds': lease_seconds, 'tasks': 2}
+        workers = [multiprocessing.Process(target=quiet_worker, args=(queue_path,), kwargs=options)
+                   for _ in range(2)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        time.sleep(args.crash_after)
+        os.kill(workers[0].pid, signal.SIGKILL)
+        queue = WorkQueue(queue_path)
+        orphaned = queue.connection.execute(
+            "SELECT COUNT(*) FROM tasks WHERE status = 'leased' AND owner LIKE ?", (f'%-{workers[0].pid}',)
+        ).fetchone()[0]
+        queue.close()
+        for worker in workers:
+            worker.join()
+        wall = time.perf_counter() - start
+        counts, stored, rows = summary(queue_path, directory)
+        print(f"crash: worker killed after {args.crash_after} s holding {orphaned} leased tasks; "
+              f"survivor finished in {wall:.2f} s, tasks {counts}, {stored} offers stored, rows {rows}, "
+              f"exit codes {[worker.exitcode for worker in workers]}")
+
+
+def quiet_worker(queue_path, **options):
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        run_worker(queue_path, **options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', nargs='*', default=['olx', 'otodom'])
+    parser.add_argument('--regions', nargs='*', default=['lodz', 'warszawa', 'krakow'])
+    parser.add_argument('--pages', type=int, default=6, help='listing pages of every shard')
+    parser.add_argument('--latency', type=float, default=0.05, help='mock site response latency in seconds')
+    parser.add_argument('--rate', type=float, default=1e4, help='requests per second per site, whole crawl')
+    parser.add_argument('--workers', type=int, default=16, help='requests in flight per worker process')
+    parser.add_argument('--processes', type=int, nargs='*', default=[1, 2, 4])
+    parser.add_argument('--crash', action='store_true', help='also kill one of two workers mid-crawl')
+    parser.add_argument('--crash-after', type=float, default=1.0)
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        urls = {site: stack.enter_context(MockSite(site, pages=args.pages, latency=args.latency)).url
+                for site in args.sites}
+        print(f"{len(args.sites)} sites x {len(args.regions)} regions x {args.pages} pages, "
+              f"{args.latency * 1000:.0f} ms latency")
+        for processes in args.processes:
+            bench_processes(args, urls, processes)
+        if args.crash:
+            bench_crash(args, urls)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Compare the old list-popping remove_duplicates with storage.dedup on combined_data.csv.
+
+The dataset can be stacked several times over (--copies) and shuffled to
+model re-scrapes in which most offers come back again on other pages. Run
+from the src directory:
+    python -m benchmarks.dedup_benchmark --copies 1 3
+"""
+import argparse
+import contextlib
+import io
+import os
+import time
+
+import pandas as pd
+
+from headers import Headers
+from storage.dedup import deduplicate
+
+DEFAULT_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                            'resources', 'combined_data.csv')
+
+
+def remove_duplicates(data):
+    """The previous implementation, popping duplicates out of every column list."""
+    seen_links = {}
+    indices_to_remove = []
+
+    for i, link in enumerate(data[Headers.LINK.value]):
+        if not link or link.strip() == '':
+            continue
+        if link in seen_links:
+            indices_to_remove.append(i)
+        else:
+            seen_links[link] = i
+
+    for index in sorted(indices_to_remove, reverse=True):
+        for key in data.keys():
+            data[key].pop(index)
+
+    return data
+
+
+def old_pipeline(df):
+    # Per-source remove_duplicates on dict-of-lists, then drop_duplicates on the raw link in main()
+    data = {column: df[column].fillna('').tolist() for column in df.columns}
+    data = remove_duplicates(data)
+    return pd.DataFrame(data).drop_duplicates(subset=[Headers.LINK.value], keep='first')
+
+
+def new_pipeline(df):
+    return deduplicate(df)
+
+
+def best_seconds(function, df, repeat):
+    """Fastest of repeat runs, and the rows kept."""
+    timings = []
+    for _ in range(repeat):
+        # deduplicate() reports its counts on every run
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            kept = len(function(df))
+            timings.append(time.perf_counter() - start)
+    return min(timings), kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', default=DEFAULT_DATA)
+    parser.add_argument('--copies', type=int, nargs='*', default=[1, 3, 10])
+    parser.add_argument('--repeat', type=int, default=5, help='runs of each, the fastest is reported')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    base = pd.read_csv(args.data)
+    print(f"{'rows':>8}{'old s':>10}{'old kept':>10}{'new s':>10}{'new kept':>10}{'speedup':>10}")
+    for copies in args.copies:
+        df = pd.concat([base] * copies, ignore_index=True)
+        if copies > 1:
+            df = df.sample(frac=1, random_state=args.seed).reset_index(drop=True)
+        old_seconds, old_kept = best_seconds(old_pipeline, df, args.repeat)
+        new_seconds, new_kept = best_seconds(new_pipeline, df, args.repeat)
+        print(f"{len(df):>8}{old_seconds:>10.3f}{old_kept:>10}{new_seconds:>10.3f}{new_kept:>10}"
+              f"{old_seconds / new_seconds:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Compare the embedded-JSON fast path with the selector parsers on offer page fixtures.
+
+Every fixture is parsed both ways and the records must be identical; pages
+without an embedded blob are counted as fallbacks. Pages whose embedded JSON
+has an unexpected shape must fall back to the selector parser. The benchmark
+exits with an error when either check fails. Run from the src directory:
+    python -m benchmarks.embedded_benchmark --repeat 5
+"""
+import argparse
+import statistics
+import sys
+import time
+
+from benchmarks.fixtures import GENERATORS, embedded_script, load_fixtures
+from parsing import get_backend
+from scrapers import olxscraper, otodomscraper
+
+
+SITE_PARSERS = {
+    'olx': olxscraper,
+    'otodom': otodomscraper,
+}
+
+# Embedded JSON of other shapes than the parsers expect, each put into a page without its own blob
+MALFORMED = {
+    'olx': [
+        [],
+        {'ad': ['ad']},
+        {'ad': {'ad': {'title': 5}}},
+        {'ad': {'ad': {'title': 'x', 'price': {'regularPrice': 5}}}},
+        {'ad': {'ad': {'title': 'x', 'params': ['Rynek: Wtórny']}}},
+        {'ad': {'ad': {'title': 'x', 'location': 'Łódź'}}},
+    ],
+    'otodom': [
+        [],
+        {'props': {'pageProps': None}},
+        {'props': {'pageProps': []}},
+        {'props': {'pageProps': {'ad': {'characteristics': ['m', 5]}}}},
+        {'props': {'pageProps': {'ad': {'characteristics': 5}}}},
+        {'props': {'pageProps': {'ad': {'characteristics': [{'key': 'x', 'label': 5, 'value': 'tak'}]}}}},
+        {'props': {'pageProps': {'ad': {'featuresByCategory': [None]}}}},
+    ],
+}
+
+
+def mean_ms(parse, fixtures, repeat):
+    timings = []
+    for _ in range(repeat):
+        for name, content in fixtures:
+            start = time.perf_counter()
+            parse(name, content)
+            timings.append(time.perf_counter() - start)
+    return statistics.mean(timings) * 1000
+
+
+def malformed_pages(site):
+    """(state, page) of a fixture page holding each MALFORMED state of site."""
+    page = GENERATORS[(site, 'detail')](embedded=False)
+    for state in MALFORMED[site]:
+        yield state, page.replace(b'</body>', embedded_script(site, state).encode() + b'</body>')
+
+
+def falls_back(module, page):
+    """True if a page parses into its selector record, not through the embedded path and without raising."""
+    link = 'malformed'
+    try:
+        return (module.parse_embedded_details(link, page) is None
+                and module.parse_offer_details(link, page) == module.parse_selector_details(link, page))
+    except Exception:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    failures = []
+    print(f"selector backend: {get_backend()}")
+    print(f"{'site':<8}{'pages':>6}{'embedded':>10}{'selector ms':>13}{'embedded ms':>13}{'speedup':>9}  identical")
+    for site, module in SITE_PARSERS.items():
+        fixtures = load_fixtures(site, 'detail')
+        embedded = [(name, content) for name, content in fixtures
+                    if module.parse_embedded_details(name, content) is not None]
+        identical = all(
+            module.parse_embedded_details(name, content) == module.parse_selector_details(name, content)
+            for name, content in embedded
+        )
+        selector_ms = mean_ms(module.parse_selector_details, embedded, args.repeat) if embedded else float('nan')
+        embedded_ms = mean_ms(module.parse_embedded_details, embedded, args.repeat) if embedded else float('nan')
+        print(f"{site:<8}{len(fixtures):>6}{len(embedded):>10}{selector_ms:>13.2f}{embedded_ms:>13.2f}"
+              f"{selector_ms / embedded_ms:>8.1f}x  {identical}")
+        if not embedded or not identical:
+            failures.append(f"{site}: {len(embedded)} embedded records, identical: {identical}")
+
+    for site, module in SITE_PARSERS.items():
+        fallbacks = [falls_back(module, page) for _, page in malformed_pages(site)]
+        print(f"{site}: {sum(fallbacks)} of {len(fallbacks)} malformed embedded states fall back to the selectors")
+        failures += [f"{site}: malformed state {state!r} does not fall back"
+                     for (state, _), ok in zip(malformed_pages(site), fallbacks) if not ok]
+
+    if failures:
+        sys.exit('\n'.join(failures))
+
+
+if __name__ == '__main__':
+    main()
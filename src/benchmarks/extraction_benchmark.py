@@ -0,0 +1,74 @@
+"""Per-offer CPU time of the field extraction in the offer page parsers.
+
+Each offer page fixture is parsed by the embedded-JSON and the selector
+parser of its site. The "extraction" column runs the embedded parser with the
+JSON already decoded, so it measures only what happens after the page is
+read: the empty row, the per-row label dispatch and the value patterns.
+--save writes the parsed records to a file and --check compares them with one
+saved earlier, to confirm a change keeps the output. Run from the src
+directory:
+    python -m benchmarks.extraction_benchmark --repeat 200
+"""
+import argparse
+import json
+import time
+from unittest import mock
+
+from benchmarks.fixtures import load_fixtures
+from scrapers import olxscraper, otodomscraper
+
+# Site module and the name of its embedded-JSON decoder in that module
+SITES = {
+    'olx': (olxscraper, 'prerendered_state'),
+    'otodom': (otodomscraper, 'next_data'),
+}
+
+
+def cpu_us(parse, fixtures, repeat):
+    """Mean CPU microseconds per offer of parse over the fixtures."""
+    start = time.process_time()
+    for _ in range(repeat):
+        for name, content in fixtures:
+            parse(name, content)
+    return (time.process_time() - start) / (repeat * len(fixtures)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--synthetic', type=int, default=20, help='synthetic fixtures per site when none are recorded')
+    parser.add_argument('--save', default=None, help='write the parsed records to this JSON file')
+    parser.add_argument('--check', default=None, help='compare the parsed records with this JSON file')
+    args = parser.parse_args()
+
+    records = {}
+    print(f"{'site':<8}{'embedded us':>13}{'selector us':>13}{'extraction us':>15}")
+    for site, (module, decoder_name) in SITES.items():
+        fixtures = load_fixtures(site, 'detail', synthetic=args.synthetic)
+        for name, content in fixtures:
+            records[f'{site}/{name}/embedded'] = module.parse_embedded_details(name, content)
+            records[f'{site}/{name}/selector'] = module.parse_selector_details(name, content)
+
+        embedded_us = cpu_us(module.parse_embedded_details, fixtures, max(1, args.repeat // 10))
+        selector_us = cpu_us(module.parse_selector_details, fixtures, max(1, args.repeat // 50))
+
+        # Decode every page once up front, so that the timed loop is the extraction alone
+        decoder = getattr(module, decoder_name)
+        decoded = {content: decoder(content) for _, content in fixtures}
+        with mock.patch.object(module, decoder_name, decoded.__getitem__):
+            extraction_us = cpu_us(module.parse_embedded_details, fixtures, args.repeat)
+        print(f"{site:<8}{embedded_us:>13.1f}{selector_us:>13.1f}{extraction_us:>15.1f}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=1, sort_keys=True)
+    if args.check:
+        with open(args.check, encoding='utf-8') as f:
+            expected = json.load(f)
+        differing = sorted(key for key in expected.keys() | records.keys() if expected.get(key) != records.get(key))
+        print(f"records identical to {args.check}: {not differing}"
+              + (f" ({len(differing)} differ, e.g. {differing[0]})" if differing else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Compare detail-page throughput of the old sleep-per-thread model and AsyncFetcher.
+
+Run from the src directory:
+    python -m benchmarks.fetch_benchmark --links 200 --latency 0.05
+"""
+import argparse
+import concurrent.futures
+import random
+import time
+
+import requests
+
+from benchmarks.stub_server import StubServer
+from fetching import AsyncFetcher, HttpClient, RateLimiter
+
+
+def threaded_sleep_fetch(links, max_workers=10):
+    """The previous get_offer_details_threaded model: sleep 1-2 s, then one blocking GET."""
+    def process_link(link):
+        time.sleep(random.uniform(1, 2))
+        return requests.get(link, timeout=10).content
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(process_link, links))
+
+
+def async_fetch(links, max_workers=10, rate=1e9, burst=1):
+    client = HttpClient(RateLimiter(rate=rate, burst=burst))
+    with AsyncFetcher(max_concurrency=max_workers, client=client) as fetcher:
+        return fetcher.run(links)
+
+
+def measure(name, func, links, **kwargs):
+    start = time.perf_counter()
+    func(links, **kwargs)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {len(links):>6} pages in {elapsed:7.2f} s  ->  {len(links) / elapsed:8.1f} pages/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--links', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.05, help='stub server response latency in seconds')
+    parser.add_argument('--skip-threaded', action='store_true', help='skip the slow sleep-per-thread baseline')
+    args = parser.parse_args()
+
+    with StubServer(latency=args.latency) as server:
+        links = [f'{server.url}/oferta/{i}' for i in range(args.links)]
+        if not args.skip_threaded:
+            measure('threaded + sleep(1-2 s)', threaded_sleep_fetch, links, max_workers=args.workers)
+        measure('async, unlimited rate', async_fetch, links, max_workers=args.workers)
+        measure('async, 5 req/s per domain', async_fetch, links, max_workers=args.workers, rate=5.0, burst=5)
+
+
+if __name__ == '__main__':
+    main()
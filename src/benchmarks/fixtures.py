@@ -0,0 +1,177 @@
+"""HTML fixtures for the offline benchmarks.
+
+Recorded pages are read from benchmarks/fixtures/<site>/<kind>/*.html. When
+none have been recorded, synthetic pages that follow the markup the parsers
+expect are generated instead, padded with filler to a realistic page size.
+Synthetic offer pages embed the same ad as JSON, the way the sites do.
+"""
+import json
+import os
+import random
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+SITES = ('olx', 'otodom')
+KINDS = ('listing', 'detail')
+
+
+def _filler(blocks: int):
+    # Navigation, scripts and footers make up most of a real page
+    return ''.join(
+        f'<div class="css-{i:x}x"><ul>' + ''.join(f'<li><a href="/kat/{i}/{j}">Kategoria {j}</a></li>' for j in range(8)) +
+        f'</ul><script>window.__x{i}={{"k":{i}}};</script></div>'
+        for i in range(blocks)
+    )
+
+
+def _pagination(url: str, pages: int):
+    if not pages:
+        return ''
+    links = ''.join(f'<li><a href="{url}{page}">{page}</a></li>' for page in range(1, pages + 1))
+    return f'<ul data-testid="pagination-list">{links}</ul>'
+
+
+def embedded_script(site: str, state):
+    """The <script> a detail page of site embeds its ad JSON (state) in."""
+    if site == 'olx':
+        # OLX assigns the store as a JSON document inside a string literal
+        return f'<script>window.__PRERENDERED_STATE__= {json.dumps(json.dumps(state))};</script>'
+    return f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(state)}</script>'
+
+
+def olx_listing(cards: int = 40, seed: int = 0, pages: int = None):
+    rng = random.Random(seed)
+    body = ''.join(
+        f'<div data-cy="l-card" data-testid="l-card" id="{1000 + i}" class="css-1sw7q4x">'
+        f'<a href="/d/oferta/mieszkanie-{i}-CID3-ID{seed:03d}{i:03d}.html"><img src="x.jpg"></a>'
+        f'<a href="/d/oferta/mieszkanie-{i}-CID3-ID{seed:03d}{i:03d}.html"><h6>Mieszkanie {i} pokoje</h6></a>'
+        f'<p data-testid="ad-price">{rng.randint(200, 900)} {rng.randint(100, 999)} zł</p>'
+        f'<p data-testid="location-date">Łódź, Bałuty - Odświeżono dnia 10 lutego 2025</p></div>'
+        for i in range(cards)
+    )
+    pagination = _pagination('/nieruchomosci/mieszkania/sprzedaz/lodz/?page=', pages)
+    return f'<html><head><title>OLX</title></head><body>{_filler(150)}{body}{pagination}{_filler(50)}</body></html>'.encode()
+
+
+def olx_detail(seed: int = 0, embedded: bool = True):
+    rng = random.Random(seed)
+    params = {
+        'Cena za m²': f'{rng.randint(6000, 12000)} zł/m²',
+        'Poziom': str(rng.randint(0, 10)),
+        'Umeblowane': 'Tak',
+        'Rynek': 'Wtórny',
+        'Rodzaj zabudowy': 'Blok',
+        'Powierzchnia': f'{rng.randint(25, 90)} m²',
+        'Liczba pokoi': f'{rng.randint(1, 4)} pokoje',
+    }
+    rows = ''.join(f'<div class="css-ae1s7g"><p class="css-b5m1rv">{k}: {v}</p></div>' for k, v in params.items())
+    price = (rng.randint(200, 900), rng.randint(100, 999))
+    description = 'Ogrzewanie miejskie, rok budowy: 1978, winda w budynku.'
+    state = ''
+    if embedded:
+        ad = {
+            'title': f'Mieszkanie {seed}',
+            'price': {'regularPrice': {'value': int(f'{price[0]}{price[1]}'), 'currencyCode': 'PLN'}},
+            'params': [{'key': f'param{i}', 'name': k, 'value': v} for i, (k, v) in enumerate(params.items())],
+            'location': {'cityName': 'Łódź', 'regionName': 'Łódzkie'},
+            'description': f'<p>{description}</p>',
+        }
+        state = embedded_script('olx', {'ad': {'ad': ad}})
+    return (
+        '<html><head><title>OLX</title></head><body>' + _filler(200) +
+        '<a href="/nieruchomosci/mieszkania/sprzedaz/">Sprzedaż</a>'
+        '<a href="/nieruchomosci/mieszkania/sprzedaz/lodz/">Łódź</a>'
+        f'<h4 class="css-10ofhqw">Mieszkanie {seed}</h4>'
+        f'<h3 class="css-90xrc0">{price[0]} {price[1]} zł</h3>'
+        f'<div data-testid="ad-parameters-container" class="css-41yf00">{rows}</div>'
+        f'<div data-cy="ad_description"><div>{description}</div></div>' +
+        _filler(100) + state + '</body></html>'
+    ).encode()
+
+
+def otodom_listing(articles: int = 36, seed: int = 0, pages: int = None):
+    rng = random.Random(seed)
+    body = ''.join(
+        f'<article data-cy="listing-item"><a href="/pl/oferta/mieszkanie-{i}-ID4u{seed:03d}{i:03d}.html">x</a>'
+        f'<p data-cy="listing-item-title">Mieszkanie {i}</p>'
+        f'<span direction="horizontal">{rng.randint(200, 900)} {rng.randint(100, 999)} zł</span>'
+        f'<p>Bałuty, Łódź, łódzkie</p></article>'
+        for i in range(articles)
+    )
+    pagination = next_data = ''
+    if pages:
+        pagination = _pagination('/pl/wyniki/sprzedaz/mieszkanie/lodzkie/lodz/lodz/lodz?viewType=listing&amp;page=', pages)
+        search = {'searchAds': {'pagination': {'page': 1, 'totalPages': pages, 'itemsPerPage': articles}}}
+        next_data = ('<script id="__NEXT_DATA__" type="application/json">' +
+                     json.dumps({'props': {'pageProps': {'data': search}}}) + '</script>')
+    return (f'<html><head><title>Otodom</title></head><body>{_filler(200)}{body}{pagination}{_filler(80)}'
+            f'{next_data}</body></html>').encode()
+
+
+def otodom_detail(seed: int = 0, embedded: bool = True):
+    rng = random.Random(seed)
+    pairs = {
+        'Czynsz': f'{rng.randint(300, 900)} zł', 'Rynek': 'wtórny', 'Rodzaj zabudowy': 'blok',
+        'Ogrzewanie': 'miejskie', 'Piętro': f'{rng.randint(0, 10)}/11', 'Stan wykończenia': 'do zamieszkania',
+        'Forma własności': 'pełna własność', 'Dostępne od': '2025-02-10', 'Typ ogłoszeniodawcy': 'biuro nieruchomości',
+        'Rok budowy': str(rng.randint(1950, 2024)), 'Winda': 'tak', 'Materiał budynku': 'wielka płyta',
+        'Okna': 'plastikowe', 'Certyfikat energetyczny': 'brak',
+    }
+    feature_lists = (('Wyposażenie', ('meble', 'lodówka', 'pralka')), ('Media', ('internet', 'telefon')))
+    rows = ''.join(f'<div class="css-1xw0jqp"><p>{k}:</p><p>{v}</p></div>' for k, v in pairs.items())
+    features = ''.join(
+        f'<div class="css-1xw0jqp"><p>{title}</p>' + ''.join(f'<span class="css-axw7ok">{f}</span>' for f in items) + '</div>'
+        for title, items in feature_lists
+    )
+    area = rng.randint(25, 90)
+    rooms = rng.randint(1, 4)
+    price = rng.randint(200, 900) * 1000
+    next_data = ''
+    if embedded:
+        characteristics = [
+            {'key': 'm', 'value': str(area), 'label': 'Powierzchnia', 'localizedValue': f'{area} m²'},
+            {'key': 'rooms_num', 'value': str(rooms), 'label': 'Liczba pokoi', 'localizedValue': str(rooms)},
+            {'key': 'price', 'value': str(price), 'label': 'Cena', 'localizedValue': f'{price:,} zł'.replace(',', ' ')},
+            {'key': 'price_per_m', 'value': str(price // area), 'label': 'Cena za metr kwadratowy',
+             'localizedValue': f'{price // area} zł/m²'},
+        ] + [
+            {'key': 'floor_no' if k == 'Piętro' else f'key{i}', 'value': v, 'label': k, 'localizedValue': v}
+            for i, (k, v) in enumerate(pairs.items())
+        ]
+        ad = {
+            'title': f'Mieszkanie {seed}',
+            'characteristics': characteristics,
+            'featuresByCategory': [{'label': title, 'values': list(items)} for title, items in feature_lists],
+        }
+        next_data = embedded_script('otodom', {'props': {'pageProps': {'ad': ad}}})
+    return (
+        '<html><head><title>Otodom</title></head><body>' + _filler(250) +
+        f'<strong aria-label="Cena">{price:,} zł'.replace(',', ' ') + '</strong>'
+        f'<div aria-label="Cena za metr kwadratowy">{price // area} zł/m²</div>'
+        f'<div class="css-8mnxk5"><button>{area} m²</button><button>{rooms} pokoje</button>'
+        f'{rows}{features}</div>' + _filler(120) + next_data + '</body></html>'
+    ).encode()
+
+
+GENERATORS = {
+    ('olx', 'listing'): olx_listing,
+    ('olx', 'detail'): olx_detail,
+    ('otodom', 'listing'): otodom_listing,
+    ('otodom', 'detail'): otodom_detail,
+}
+
+
+def load_fixtures(site: str, kind: str, synthetic: int = 10):
+    """Return (name, content) pairs of recorded pages, falling back to synthetic ones."""
+    directory = os.path.join(FIXTURES_DIR, site, kind)
+    if os.path.isdir(directory):
+        names = sorted(name for name in os.listdir(directory) if name.endswith('.html'))
+        if names:
+            fixtures = []
+            for name in names:
+                with open(os.path.join(directory, name), 'rb') as f:
+                    fixtures.append((name, f.read()))
+            return fixtures
+
+    generator = GENERATORS[(site, kind)]
+    return [(f'synthetic-{i}.html', generator(seed=i)) for i in range(synthetic)]
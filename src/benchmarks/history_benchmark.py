@@ -0,0 +1,119 @@
+"""Offer history store against dated full snapshots: storage growth, write time and query latency.
+
+A synthetic market of --offers offers is scraped --runs times, one day
+apart; between runs a share of the offers changes price, some are taken
+down and new ones appear. Every run is recorded in an OfferHistory, and the
+as-of queries are checked against the generated truth. Run from the src
+directory:
+    python -m benchmarks.history_benchmark --offers 20000 --runs 30
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from records import OfferBatch, OfferRecord
+from storage.history import ACTIVE, OfferHistory
+
+DAY = 24 * 3600.0
+
+
+def new_offer(rng, i):
+    m2 = round(rng.uniform(25, 120), 1)
+    price = round(m2 * rng.uniform(6000, 14000), -3)
+    return OfferRecord(title=f'Mieszkanie {i}', link=f'https://www.olx.pl/d/oferta/mieszkanie-ID{i:07d}.html',
+                       location='Łódź', m2=m2, total_price=price, price_per_m2=round(price / m2, 2),
+                       rent=float(rng.choice([400, 500, 600, 700])), rooms=float(rng.randint(1, 5)), source='olx')
+
+
+def simulate(args):
+    """Yield (day, active offers) of every run, with the market changing between runs."""
+    rng = random.Random(args.seed)
+    active = {i: new_offer(rng, i) for i in range(args.offers)}
+    next_id = args.offers
+    for day in range(args.runs):
+        if day:
+            for i in rng.sample(sorted(active), int(len(active) * args.delisted)):
+                del active[i]
+            for i in rng.sample(sorted(active), int(len(active) * args.changed)):
+                record = active[i]
+                record.total_price = round(record.total_price * rng.uniform(0.9, 1.05), -3)
+                record.price_per_m2 = round(record.total_price / record.m2, 2)
+            for _ in range(int(args.offers * args.new)):
+                active[next_id] = new_offer(rng, next_id)
+                next_id += 1
+        yield day, active
+
+
+def db_size(path):
+    return sum(os.path.getsize(path + suffix) for suffix in ('', '-wal') if os.path.exists(path + suffix))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--offers', type=int, default=20000)
+    parser.add_argument('--runs', type=int, default=30)
+    parser.add_argument('--changed', type=float, default=0.03, help='share of active offers changing price per run')
+    parser.add_argument('--delisted', type=float, default=0.01, help='share of active offers taken down per run')
+    parser.add_argument('--new', type=float, default=0.02, help='new offers per run, as a share of --offers')
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        history = OfferHistory(os.path.join(directory, 'offer_history.db'))
+        snapshot_bytes = 0
+        write_seconds = []
+        truth = {}  # (day, link) -> total_price of the offers active that day
+        started = 1.7e9
+        for day, active in simulate(args):
+            records = [OfferRecord(**{field: getattr(record, field) for field in record.__slots__})
+                       for record in active.values()]
+            snapshot_bytes += len(OfferBatch(records).to_frame().to_csv(index=False).encode())
+            start = time.perf_counter()
+            counts = history.record_snapshot('olx', records, observed_at=started + day * DAY,
+                                             listed=[record.link for record in records])
+            write_seconds.append(time.perf_counter() - start)
+            truth.update({(day, record.link): record.total_price for record in records})
+            if day in (0, 1, args.runs - 1):
+                print(f"day {day}: {len(records)} offers, {counts}, recorded in {write_seconds[-1]:.2f} s")
+
+        history.connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        history_bytes = db_size(history.path)
+        changes = history.connection.execute('SELECT COUNT(*) FROM changes').fetchone()[0]
+        print(f"\n{args.runs} runs: dated CSV snapshots {snapshot_bytes / 2**20:.1f} MiB, "
+              f"history {history_bytes / 2**20:.1f} MiB with {changes} change rows; "
+              f"mean write {sum(write_seconds) / len(write_seconds):.2f} s per run")
+
+        # Point queries against the generated truth
+        rng = random.Random(args.seed + 1)
+        keys = rng.sample(sorted(truth), args.queries)
+        start = time.perf_counter()
+        wrong = 0
+        for day, link in keys:
+            values = history.as_of(link, started + day * DAY + 3600)
+            if values.get('total_price') != truth[day, link] or values.get('status') != ACTIVE:
+                wrong += 1
+        as_of_ms = (time.perf_counter() - start) / len(keys) * 1000
+        start = time.perf_counter()
+        for _, link in keys:
+            history.current(link)
+        current_ms = (time.perf_counter() - start) / len(keys) * 1000
+        print(f"as_of: {as_of_ms:.3f} ms per offer, {wrong} of {len(keys)} wrong; current: {current_ms:.3f} ms per offer")
+
+        # Whole-market queries
+        for name, query in (('current_frame', lambda: history.current_frame('olx')),
+                            ('as_of_frame day 0', lambda: history.as_of_frame(started + 3600, 'olx')),
+                            (f'as_of_frame day {args.runs // 2}',
+                             lambda: history.as_of_frame(started + args.runs // 2 * DAY + 3600, 'olx'))):
+            start = time.perf_counter()
+            df = query()
+            print(f"{name}: {len(df)} offers in {time.perf_counter() - start:.2f} s")
+        expected = sum(1 for day, _ in truth if day == 0)
+        print(f"offers active on day 0: {expected}")
+        history.close()
+
+
+if __name__ == '__main__':
+    main()
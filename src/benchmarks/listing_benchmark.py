@@ -0,0 +1,76 @@
+"""Compare the sequential listing walk with the windowed, concurrent one of the streaming pipeline.
+
+A stub server serves --pages listing pages whose pagination reports the page
+count; pages past the end repeat the last one, as OLX does. Every offer is
+already known to the OfferIndex, so only listing discovery is measured. Run
+from the src directory:
+    python -m benchmarks.listing_benchmark --pages 25 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import re
+import tempfile
+import time
+
+from benchmarks.fixtures import olx_listing
+from benchmarks.stub_server import StubServer
+from fetching import AsyncFetcher, HttpClient, RateLimiter
+from pipeline import stream_source
+from scrapers.olxscraper import OlxScraper
+from storage import CheckpointStore, OfferIndex, offer_key
+
+
+def make_scraper(server, rate):
+    scraper = OlxScraper(client=HttpClient(RateLimiter(rate=rate, burst=5)), rate_limit=rate)
+    scraper.domain = server.url
+    scraper.endpoint = server.url + '/nieruchomosci/mieszkania/sprzedaz/lodz'
+    return scraper
+
+
+def sequential(server, rate):
+    scraper = make_scraper(server, rate)
+    return len(scraper.scrape_offers())
+
+
+def windowed(server, rate, pages, workers):
+    scraper = make_scraper(server, rate)
+    records = [record for page in range(1, pages + 1) for record in scraper.parse_page(olx_listing(seed=page))]
+    index = OfferIndex({offer_key(record.link): (record.total_price, record.title) for record in records})
+    with tempfile.TemporaryDirectory() as directory:
+        checkpoint = CheckpointStore(os.path.join(directory, 'checkpoint.db'))
+        fetcher = AsyncFetcher(max_concurrency=workers, client=scraper.client)
+        try:
+            asyncio.run(stream_source(scraper, 'olx', None, fetcher, checkpoint, index=index, workers=workers,
+                                      listing_window=workers))
+            return len(checkpoint.completed_pages())
+        finally:
+            fetcher.close()
+            checkpoint.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=25)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--rate', type=float, default=5.0, help='listing requests per second allowed per domain')
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    def route(path):
+        match = re.search(r'page=(\d+)', path)
+        page = min(int(match.group(1)), args.pages) if match else 1
+        return olx_listing(seed=page, pages=args.pages)
+
+    with StubServer(latency=args.latency, page=route) as server:
+        for name, run in (('sequential', lambda: sequential(server, args.rate)),
+                          ('windowed', lambda: windowed(server, args.rate, args.pages, args.workers))):
+            requests = server.requests
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            print(f"{name:<12} {args.pages} pages in {elapsed:6.2f} s, {server.requests - requests} listing requests")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""Peak memory of building the combined dataset and of resuming a checkpoint, against dataset size.
+
+Synthetic OLX and Otodom data files of every --offers size are generated
+(a share of the flats is listed on both sites, and some OLX offers link to
+Otodom ones). Each scenario then runs in a fresh interpreter, which reports
+its peak RSS above the RSS after its imports (Linux only, from /proc):
+
+* in-memory   all files in one DataFrame: read_csv, concat, deduplicate,
+              normalize_offers, to_csv
+* csv, parquet, feather
+              pipeline.combine_data_files, chunk by chunk, with each
+              --format (parquet and feather also write the dataset)
+* compact     a resumed checkpoint holding every OLX offer with details,
+              merged into the existing data file (CheckpointStore.compact)
+
+A streaming path passes when its peak grows by less than --max-growth times
+the in-memory growth between the smallest and the largest size; the
+benchmark exits with an error when one does not. That only tells anything
+when every size spans several chunks, so unless --chunk-size is given, the
+combine scenarios read the smallest dataset in at least MIN_CHUNKS chunks
+(CHUNK_SIZE rows at most). Run from the src directory:
+    python -m benchmarks.memory_benchmark --offers 25000 100000 200000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+from pipeline.combine import CHUNK_SIZE
+from records import OfferRecord
+from storage import CheckpointStore
+from storage.checkpoint import write_records
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROLOGUE = '''
+import json, sys
+import pandas as pd
+from pipeline import combine_data_files, normalize_offers
+from storage import CheckpointStore, deduplicate
+
+def status(field):
+    # Bytes of a /proc/self/status field; unlike ru_maxrss, VmHWM starts over at exec, so the size of
+    # the benchmark process that spawned this one is not counted
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) * 1024
+
+start = status('VmRSS')
+directory = sys.argv[1]
+chunk_size = int(sys.argv[2])
+files = [f'{directory}/olx_data.csv', f'{directory}/otodom_data.csv']
+'''
+EPILOGUE = '''
+print(json.dumps(status('VmHWM') - start))
+'''
+SCENARIOS = {
+    'in-memory': '''
+df = pd.concat([pd.read_csv(data_file) for data_file in files], ignore_index=True)
+normalize_offers(deduplicate(df)).to_csv(f'{directory}/combined_data.csv', index=False, encoding='utf-8')
+''',
+    **{output_format: f'''
+combine_data_files(files, f'{{directory}}/combined_data.csv', output_format='{output_format}',
+                   chunk_size=chunk_size)
+''' for output_format in ('csv', 'parquet', 'feather')},
+    'compact': '''
+checkpoint = CheckpointStore(f'{directory}/olx_checkpoint.db')
+checkpoint.compact(f'{directory}/olx_resumed.csv', base_file=files[0])
+checkpoint.close()
+''',
+}
+STREAMING_SCENARIOS = ('csv', 'parquet', 'feather', 'compact')
+PAGE_SIZE = 40
+MIN_CHUNKS = 4
+
+
+def offer(rng, source, i, flat):
+    """One synthetic offer; flat seeds the flat's attributes, so the same flat matches on both sites."""
+    attributes = random.Random(flat)
+    m2 = round(attributes.uniform(25, 120), 1)
+    price = round(m2 * attributes.uniform(6000, 14000), -3)
+    if source == 'olx' and i % 50:
+        link = f'https://www.olx.pl/d/oferta/mieszkanie-CID3-ID{i:07d}.html'
+    else:
+        link = f'https://www.otodom.pl/pl/oferta/mieszkanie-ID{i:07d}'
+    return OfferRecord(
+        title=f'Mieszkanie {i}', link=link, location=attributes.choice(['Łódź, Bałuty', 'Łódź, Widzew', 'Łódź']),
+        m2=m2, total_price=price, price_per_m2=round(price / m2, 2), rent=float(rng.choice([400, 500, 600, 700])),
+        rooms=float(attributes.randint(1, 5)), floor=attributes.choice(['parter/4', '3/10', '> 10/11', '2']),
+        building_type=rng.choice(['Blok', 'blok', 'kamienica', 'apartamentowiec']),
+        market=rng.choice(['wtórny', 'pierwotny']), heating=rng.choice(['miejskie', 'gazowe', 'brak informacji']),
+        building_year=str(rng.randint(1950, 2024)), elevator=rng.choice(['tak', 'nie']),
+        available_from=rng.choice(['2025-02-10', '']), source=source,
+    )
+
+
+def generate(directory, offers, seed):
+    """Write the data files and an OLX checkpoint of offers OLX offers and half as many Otodom ones."""
+    rng = random.Random(seed)
+    olx = [offer(rng, 'olx', i, i) for i in range(offers)]
+    # One Otodom flat in ten is also on OLX
+    otodom = (offer(rng, 'otodom', i, i if i % 10 == 0 else offers + i) for i in range(offers // 2))
+    write_records(olx, os.path.join(directory, 'olx_data.csv'))
+    write_records(otodom, os.path.join(directory, 'otodom_data.csv'))
+
+    checkpoint = CheckpointStore(os.path.join(directory, 'olx_checkpoint.db'))
+    for start in range(0, offers, PAGE_SIZE):
+        page = olx[start:start + PAGE_SIZE]
+        listing = [OfferRecord(title=record.title, link=record.link, location=record.location,
+                               total_price=record.total_price) for record in page]
+        added = checkpoint.add_page(start // PAGE_SIZE + 1, listing)
+        checkpoint.commit_records([(idx, record) for (idx, _), record in zip(added, page)])
+    checkpoint.close()
+
+
+def peak_bytes(scenario, directory, chunk_size):
+    """Peak RSS of a fresh interpreter running the scenario, above its RSS after the imports."""
+    result = subprocess.run([sys.executable, '-c', PROLOGUE + SCENARIOS[scenario] + EPILOGUE, directory,
+                             str(chunk_size)],
+                            cwd=SRC_DIR, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--offers', type=int, nargs='+', default=[25000, 100000, 200000],
+                        help='OLX offers per dataset size; Otodom gets half as many')
+    parser.add_argument('--scenarios', nargs='*', default=list(SCENARIOS))
+    parser.add_argument('--max-growth', type=float, default=0.25)
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help=f'rows per chunk of the combine scenarios (default: at most {CHUNK_SIZE}, '
+                             f'and small enough for {MIN_CHUNKS} chunks of the smallest dataset)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # Both sites' rows of the smallest size; a chunk covering most of them would be bounded by nothing
+    chunk_size = args.chunk_size or max(1, min(CHUNK_SIZE, (min(args.offers) * 3 // 2) // MIN_CHUNKS))
+    print(f"combine chunk size: {chunk_size} rows")
+    peaks = {}
+    print(f"{'offers':>8}{'data MiB':>10}" + ''.join(f'{scenario:>12}' for scenario in args.scenarios) + '  (peak MiB)')
+    for offers in args.offers:
+        with tempfile.TemporaryDirectory() as directory:
+            generate(directory, offers, args.seed)
+            size = sum(os.path.getsize(os.path.join(directory, f'{source}_data.csv')) for source in ('olx', 'otodom'))
+            peaks[offers] = {scenario: peak_bytes(scenario, directory, chunk_size)
+                             for scenario in args.scenarios}
+        print(f"{offers:>8}{size / 2**20:>10.1f}"
+              + ''.join(f'{peaks[offers][scenario] / 2**20:>12.1f}' for scenario in args.scenarios))
+
+    smallest, largest = min(args.offers), max(args.offers)
+    if smallest == largest or 'in-memory' not in args.scenarios:
+        return
+    growth = {scenario: peaks[largest][scenario] - peaks[smallest][scenario] for scenario in args.scenarios}
+    unbounded = []
+    print(f"\ngrowth from {smallest} to {largest} offers:")
+    for scenario in args.scenarios:
+        verdict = ''
+        if scenario in STREAMING_SCENARIOS:
+            bounded = growth[scenario] < args.max_growth * growth['in-memory']
+            verdict = f" ({growth[scenario] / growth['in-memory']:.0%} of in-memory, bounded: {bounded})"
+            if not bounded:
+                unbounded.append(scenario)
+        print(f"  {scenario:<10} {growth[scenario] / 2**20:7.1f} MiB{verdict}")
+    if unbounded:
+        sys.exit(f"peak memory grows with the dataset in: {', '.join(unbounded)}")
+
+
+if __name__ == '__main__':
+    main()
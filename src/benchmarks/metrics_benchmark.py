@@ -0,0 +1,55 @@
+"""Cost of the always-on metrics, per call and per scraped offer.
+
+Run from the src directory:
+    python -m benchmarks.metrics_benchmark --calls 200000
+"""
+import argparse
+import time
+
+from benchmarks.fixtures import olx_detail
+from metrics import MetricsRegistry
+from pipeline.stages import count_fields
+from scrapers import parse_offer_details
+
+
+def per_call_ns(func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=200000)
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    counter = registry.counter('benchmark_total', labelnames=('domain', 'status'))
+    histogram = registry.histogram('benchmark_seconds', labelnames=('domain',))
+    record = parse_offer_details('https://www.olx.pl/d/oferta/x-ID1.html', olx_detail())
+    page = olx_detail()
+
+    def timed_block():
+        with histogram.time('www.olx.pl'):
+            pass
+
+    costs = {
+        'counter inc': per_call_ns(lambda: counter.inc('www.olx.pl', 200), args.calls),
+        'histogram observe': per_call_ns(lambda: histogram.observe(0.123, 'www.olx.pl'), args.calls),
+        'histogram timer': per_call_ns(timed_block, args.calls),
+        'field hit counts per record': per_call_ns(lambda: count_fields('olx', [record] * 100), args.calls // 100) / 100,
+        'parse one offer page': per_call_ns(lambda: parse_offer_details('https://www.olx.pl/d/oferta/x-ID1.html', page),
+                                            1000),
+    }
+    for name, ns in costs.items():
+        print(f"{name:<30} {ns / 1000:9.2f} µs")
+
+    # One offer records about 8 fetch/rate-limit/parse samples plus its field counts
+    per_offer = 8 * costs['histogram observe'] + costs['field hit counts per record']
+    print(f"metrics per offer ~{per_offer / 1000:.1f} µs, "
+          f"{per_offer / costs['parse one offer page']:.1%} of parsing it from embedded JSON")
+
+
+if __name__ == '__main__':
+    main()
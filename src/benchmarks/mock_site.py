@@ -0,0 +1,68 @@
+"""A local stand-in for OLX or Otodom that replays the fixture corpus.
+
+Listing pages are served for page=1..pages (later pages repeat the last one,
+as OLX does) and every offer link is answered with one of the detail
+fixtures, so the scrapers can run end to end against it.
+"""
+import re
+import zlib
+
+from benchmarks.fixtures import GENERATORS, load_fixtures
+from benchmarks.stub_server import StubServer
+from fetching import HttpClient, RateLimiter
+from scrapers import SCRAPERS
+
+
+PAGE_PATTERN = re.compile(r'[?&]page=(\d+)')
+
+
+class MockSite:
+    """StubServer routing listing and offer paths of one site to its fixtures; use as a context manager."""
+
+    def __init__(self, site: str, pages: int = 5, latency: float = 0.02, error_rate: float = 0.0,
+                 capacity: int = None, seed: int = 0):
+        self.site = site
+        self.pages = pages
+        self.listings = load_fixtures(site, 'listing')
+        self.details = load_fixtures(site, 'detail')
+        self.synthetic = self.listings[0][0].startswith('synthetic-')
+        self.server = StubServer(latency=latency, page=self.route, capacity=capacity, error_rate=error_rate,
+                                 seed=seed)
+
+    def route(self, path: str):
+        if '/oferta/' in path:
+            return self.details[zlib.crc32(path.encode()) % len(self.details)][1]
+        match = PAGE_PATTERN.search(path)
+        page = min(int(match.group(1)) if match else 1, self.pages)
+        if self.synthetic:
+            # Synthetic listings carry pagination and links unique to their page
+            return GENERATORS[(self.site, 'listing')](seed=page, pages=self.pages)
+        return self.listings[(page - 1) % len(self.listings)][1]
+
+    @property
+    def url(self):
+        # The site name in the path keeps scrapers.parse_offer_details picking the right parser
+        return f'{self.server.url}/{self.site}'
+
+    def scraper(self, rate: float = 1e6, **client_options):
+        """A scraper of this site pointed at the mock, with its own client."""
+        client = HttpClient(RateLimiter(rate=rate, burst=max(1, int(min(rate, 100)))), **client_options)
+        scraper = SCRAPERS[self.site](client=client)
+        scraper.endpoint = scraper.endpoint.replace(scraper.domain, self.url)
+        scraper.domain = self.url
+        return scraper
+
+    def offer_links(self, count: int):
+        """Offer links the mock answers, for calling the scrapers' detail functions directly."""
+        return [f'{self.url}/d/oferta/benchmark-ID{i}.html' for i in range(count)]
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def __enter__(self):
+        self.server.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.stop()
@@ -0,0 +1,92 @@
+"""Compare per-page parse time and peak memory of the HTML parser backends.
+
+Detail pages are parsed with the selector path, which is the only one the
+backend affects; the fixtures carry an embedded state, so the full parser
+would read that instead. The embedded path is timed separately at the end.
+Peak memory is the Python heap seen by tracemalloc, so it leaves out
+libxml2's own allocations in the lxml backend. Run from the src directory:
+    python -m benchmarks.parse_benchmark --repeat 5
+"""
+import argparse
+import statistics
+import time
+import tracemalloc
+
+from benchmarks.fixtures import KINDS, SITES, load_fixtures
+from parsing import available_backends, set_backend
+from scrapers import olxscraper, otodomscraper
+from scrapers.olxscraper import OlxScraper
+from scrapers.otodomscraper import OtodomScraper
+
+EMBEDDED_PARSERS = {
+    'olx': olxscraper.parse_embedded_details,
+    'otodom': otodomscraper.parse_embedded_details,
+}
+
+
+def parsers():
+    olx, otodom = OlxScraper(), OtodomScraper()
+    return {
+        ('olx', 'listing'): lambda name, content: olx.parse_page(content),
+        ('olx', 'detail'): olxscraper.parse_selector_details,
+        ('otodom', 'listing'): lambda name, content: otodom.parse_page(content),
+        ('otodom', 'detail'): otodomscraper.parse_selector_details,
+    }
+
+
+def report(label, backend, fixtures, timings, peaks, identical):
+    p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+    print(f"{label:<18}{backend:<14}{len(fixtures):>6}"
+          f"{statistics.mean(timings) * 1000:>10.2f}{p95 * 1000:>10.2f}"
+          f"{max(peaks) / 2**20:>10.2f}  {identical}")
+
+
+def run(parse, fixtures, repeat):
+    timings = []
+    outputs = [parse(name, content) for name, content in fixtures]
+    for _ in range(repeat):
+        for name, content in fixtures:
+            start = time.perf_counter()
+            parse(name, content)
+            timings.append(time.perf_counter() - start)
+
+    # Peak Python heap while parsing a single page
+    peaks = []
+    for name, content in fixtures:
+        tracemalloc.start()
+        parse(name, content)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return timings, peaks, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--backends', nargs='*', default=available_backends())
+    args = parser.parse_args()
+
+    page_parsers = parsers()
+    print(f"{'page':<18}{'backend':<14}{'pages':>6}{'mean ms':>10}{'p95 ms':>10}{'peak MiB':>10}  identical")
+    for site in SITES:
+        for kind in KINDS:
+            fixtures = load_fixtures(site, kind)
+            reference = None
+            for backend in args.backends:
+                set_backend(backend)
+                timings, peaks, outputs = run(page_parsers[(site, kind)], fixtures, args.repeat)
+                if reference is None:
+                    reference = outputs
+                report(f'{site} {kind}', backend, fixtures, timings, peaks, outputs == reference)
+
+    # The embedded state is read without building a document, so the backend does not matter here;
+    # the last column says whether every page was read from its state rather than falling back
+    print(f"\n{'page':<18}{'path':<14}{'pages':>6}{'mean ms':>10}{'p95 ms':>10}{'peak MiB':>10}  all embedded")
+    for site in SITES:
+        fixtures = load_fixtures(site, 'detail')
+        timings, peaks, outputs = run(EMBEDDED_PARSERS[site], fixtures, args.repeat)
+        report(f'{site} detail', 'embedded', fixtures, timings, peaks, None not in outputs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Compare the memory of 100k offers as dicts/dict-of-lists vs OfferRecord/OfferBatch.
+
+For each layout it reports the Python heap (tracemalloc) held by the
+per-offer records, the heap held by and the peak heap while building the
+DataFrame from them, and the dtypes of the numeric columns. Run from the src directory:
+    python -m benchmarks.records_benchmark --offers 100000
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from headers import Headers
+from records import OfferBatch, OfferRecord
+
+
+def fresh(text: str):
+    """A new string object, as parsing every page produces, rather than a shared literal."""
+    return text.encode().decode()
+
+
+def synthetic_offer(i: int, rng: random.Random):
+    """Parsed offer as the detail parsers return it, with about half of the columns filled."""
+    data = {header.value: '' for header in Headers}
+    data[Headers.TITLE.value] = f'Mieszkanie {rng.randint(1, 5)}-pokojowe, {rng.choice(["Bałuty", "Widzew", "Polesie"])}'
+    data[Headers.LINK.value] = f'https://www.otodom.pl/pl/oferta/mieszkanie-ID{i:07d}.html'
+    data[Headers.LOCATION.value] = fresh('Łódź')
+    data[Headers.M2.value] = round(rng.uniform(20, 120), 2)
+    if rng.random() < 0.95:  # The rest are 'Zapytaj o cenę'
+        data[Headers.TOTAL_PRICE.value] = float(rng.randrange(150_000, 1_200_000, 1000))
+    data[Headers.PRICE_PER_M2.value] = float(rng.randrange(5000, 15000))
+    if rng.random() < 0.6:
+        data[Headers.RENT.value] = float(rng.randrange(200, 1200, 10))
+    data[Headers.ROOMS.value] = float(rng.randint(1, 5))
+    data[Headers.FLOOR.value] = f'{rng.randint(0, 10)}/10'
+    data[Headers.MARKET.value] = fresh(rng.choice(['wtórny', 'pierwotny']))
+    data[Headers.BUILDING_TYPE.value] = fresh('blok')
+    data[Headers.ELEVATOR.value] = fresh(rng.choice(['tak', 'nie']))
+    data[Headers.BUILDING_YEAR.value] = str(rng.randint(1950, 2025))
+    data[Headers.SOURCE.value] = fresh('otodom')
+    return data
+
+
+def dict_records(offers):
+    """Today's records: one dict per offer keyed by column name, '' for missing values."""
+    return [{key: offer.get(key, '') for key in offer} for offer in offers]
+
+
+def typed_records(offers):
+    return [OfferRecord.from_dict(offer) for offer in offers]
+
+
+def dict_of_lists_frame(records):
+    """Today's frame: one list per column, object dtype wherever a '' placeholder appears."""
+    import pandas as pd
+
+    data = {header.value: [] for header in Headers}
+    for record in records:
+        for key in data.keys():
+            data[key].append(record.get(key, ''))
+    return pd.DataFrame(data)
+
+
+def batch_frame(records):
+    return OfferBatch(records).to_frame()
+
+
+def measure(build, *args):
+    """Result of build, its run time, the heap it still holds and its peak heap."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build(*args)
+    elapsed = time.perf_counter() - start
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, held, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--offers', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    offers = [synthetic_offer(i, rng) for i in range(args.offers)]
+    layouts = (
+        ('dict of lists', dict_records, dict_of_lists_frame),
+        ('OfferBatch', typed_records, batch_frame),
+    )
+
+    print(f"{args.offers} offers")
+    print(f"{'layout':<16}{'records MiB':>12}{'frame s':>9}{'frame MiB':>11}{'frame peak MiB':>16}  cena / czynsz dtype")
+    for name, make_records, make_frame in layouts:
+        records, _, records_held, _ = measure(make_records, offers)
+        frame, elapsed, frame_held, frame_peak = measure(make_frame, records)
+        print(f"{name:<16}{records_held / 2**20:>12.1f}{elapsed:>9.2f}{frame_held / 2**20:>11.1f}"
+              f"{frame_peak / 2**20:>16.1f}  {frame[Headers.TOTAL_PRICE.value].dtype} / {frame[Headers.RENT.value].dtype}")
+        del records, frame
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Startup time of the entry point and of parse workers, each in a fresh interpreter.
+
+Every scenario runs --repeat times in a new python process started from the
+src directory; the median and minimum wall time and the modules loaded are
+reported. Run from the src directory:
+    python -m benchmarks.startup_benchmark --repeat 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What a parse worker does before its first page: import the parse function and parse one offer
+PARSE_WORKER = '''
+from benchmarks.fixtures import load_fixtures
+name, content = load_fixtures('olx', 'detail')[0]
+from pipeline.stages import timed_parse
+timed_parse('https://www.olx.pl/d/oferta/' + name, content)
+'''
+
+SCENARIOS = {
+    'import main': 'import main',
+    'main --help': 'import sys, main; sys.argv = ["main.py", "--help"]\ntry:\n    main.main()\nexcept SystemExit:\n    pass',
+    'import scrapers': 'import scrapers',
+    'parse worker': PARSE_WORKER,
+}
+HEAVY_MODULES = ('pandas', 'numpy', 'pyarrow', 'requests', 'bs4', 'lxml', 'tqdm', 'asyncio')
+
+
+def run(code):
+    """Wall seconds of one fresh interpreter running code, and the heavy modules it loaded."""
+    report = '\nimport sys, json\nprint(json.dumps(sorted(m for m in %r if m in sys.modules)))' % (HEAVY_MODULES,)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', code + report], cwd=SRC_DIR, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode:
+        raise RuntimeError(result.stderr)
+    return wall, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--scenarios', nargs='*', default=list(SCENARIOS))
+    args = parser.parse_args()
+
+    run('pass')  # warms the file system cache
+    baseline = min(run('pass')[0] for _ in range(args.repeat))
+    print(f"bare interpreter: {baseline * 1000:.0f} ms (included below)")
+    for name in args.scenarios:
+        timings = []
+        for _ in range(args.repeat):
+            wall, loaded = run(SCENARIOS[name])
+            timings.append(wall)
+        print(f"{name:<16} median {statistics.median(timings) * 1000:6.0f} ms, min {min(timings) * 1000:6.0f} ms, "
+              f"loads {', '.join(loaded) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+STUB_PAGE = b'<html><head><title>stub</title></head><body><h1>Stub offer</h1></body></html>'
+
+
+class StubServer:
+    """Local HTTP server answering GETs (with an ETag) after a fixed latency.
+
+    page is either the bytes served for every path, or a callable mapping the
+    request path to bytes (None answers 404). With a capacity, the server
+    simulates throttling: latency grows with the requests in flight beyond
+    it, and above twice the capacity requests are answered 429 straight away.
+    A fraction error_rate of the requests, drawn from a seeded generator, is
+    answered with error_status instead of the page.
+    """
+
+    def __init__(self, latency: float = 0.05, page=STUB_PAGE, host: str = '127.0.0.1', port: int = 0,
+                 capacity: int = None, error_rate: float = 0.0, error_status: int = 500, seed: int = 0):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                    server.in_flight += 1
+                    in_flight = server.in_flight
+                try:
+                    self.respond(in_flight)
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def respond(self, in_flight):
+                if server.capacity is not None and in_flight > 2 * server.capacity:
+                    with server._lock:
+                        server.throttled += 1
+                    self.send_response(429)
+                    self.send_header('Retry-After', '0')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                overload = max(1.0, in_flight / server.capacity) if server.capacity is not None else 1.0
+                time.sleep(server.latency * overload)
+                if server.error_rate:
+                    with server._lock:
+                        failed = server._random.random() < server.error_rate
+                        server.errors += failed
+                    if failed:
+                        self.send_response(server.error_status)
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                page = server.page(self.path) if callable(server.page) else server.page
+                if page is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                etag = '"' + hashlib.md5(page).hexdigest() + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(page)))
+                self.end_headers()
+                self.wfile.write(page)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.latency = latency
+        self.page = page
+        self.capacity = capacity
+        self.requests = 0
+        self.in_flight = 0
+        self.throttled = 0
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
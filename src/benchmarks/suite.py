@@ -0,0 +1,187 @@
+"""End-to-end benchmark suite against local mock sites, with JSON results for comparing runs.
+
+For every site it measures, against a MockSite with the given latency and
+error rate:
+  parse           parse_page / parse_offer_details on the fixtures, no network
+  scrape_page     WebpageScraper.scrape_page, one listing page per call
+  offer_details   the site's scrape_offer_details, one offer per call
+  end_to_end      main.process_data_source over all listing pages, parsing inline
+and reports throughput, p50/p99 latency and the peak RSS of the process so
+far. Results go to resources/benchmark_results/<timestamp>.json; --compare prints the
+change against an earlier results file. Run from the src directory:
+    python -m benchmarks.suite --pages 5 --latency 0.02 --error-rate 0.02
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+
+import pandas as pd
+
+import main as scraper_main
+from benchmarks.fixtures import load_fixtures
+from benchmarks.mock_site import MockSite
+from fetching.concurrency import percentile
+from scrapers import olxscraper, otodomscraper
+
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.dirname(BENCHMARKS_DIR)), 'resources', 'benchmark_results')
+DETAIL_FUNCTIONS = {
+    'olx': olxscraper.scrape_offer_details,
+    'otodom': otodomscraper.scrape_offer_details,
+}
+PARSE_FUNCTIONS = {
+    'olx': olxscraper.parse_offer_details,
+    'otodom': otodomscraper.parse_offer_details,
+}
+
+
+def peak_rss_mib():
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if platform.system() == 'Darwin' else peak / 2**10
+
+
+def summarize(timings, wall=None, **extra):
+    """Throughput and latency percentiles of per-call timings in seconds."""
+    wall = wall if wall is not None else sum(timings)
+    return {
+        'calls': len(timings),
+        'per_second': round(len(timings) / wall, 2) if wall else None,
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 3),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+        **extra,
+        'peak_rss_mib': round(peak_rss_mib(), 1),
+    }
+
+
+def timed_calls(func, args_list):
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_parse(site, repeat):
+    scraper = MockSite(site).scraper()
+    results = {}
+    for kind, parse in (('listing', lambda name, content: scraper.parse_page(content)),
+                        ('detail', PARSE_FUNCTIONS[site])):
+        fixtures = load_fixtures(site, kind) * repeat
+        results[kind] = summarize(timed_calls(parse, fixtures))
+    return results
+
+
+def bench_scrape_page(site, args):
+    with MockSite(site, pages=args.pages, latency=args.latency, error_rate=args.error_rate) as mock:
+        scraper = mock.scraper()
+        timings = timed_calls(scraper.scrape_page, [(page,) for page in range(1, args.pages + 1)])
+        scraper.client.close()
+        return summarize(timings, injected_errors=mock.server.errors)
+
+
+def bench_offer_details(site, args):
+    with MockSite(site, latency=args.latency, error_rate=args.error_rate) as mock:
+        client = mock.scraper().client
+        links = mock.offer_links(args.offers)
+        timings = timed_calls(DETAIL_FUNCTIONS[site], [(link, client) for link in links])
+        client.close()
+        return summarize(timings, injected_errors=mock.server.errors)
+
+
+def bench_end_to_end(site, args):
+    with MockSite(site, pages=args.pages, latency=args.latency, error_rate=args.error_rate) as mock, \
+            tempfile.TemporaryDirectory() as directory:
+        scraper = mock.scraper()
+        output = io.StringIO()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            data_file = scraper_main.process_data_source(scraper, site, None, directory, max_workers=args.workers)
+        wall = time.perf_counter() - start
+        rows = len(pd.read_csv(data_file))
+        scraper.client.close()
+        return {
+            'seconds': round(wall, 3),
+            'offers': rows,
+            'offers_per_second': round(rows / wall, 2),
+            'requests': mock.requests,
+            'injected_errors': mock.server.errors,
+            'peak_rss_mib': round(peak_rss_mib(), 1),
+        }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=BENCHMARKS_DIR).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def flatten(results, prefix=''):
+    for key, value in results.items():
+        if isinstance(value, dict):
+            yield from flatten(value, f'{prefix}{key}.')
+        elif isinstance(value, (int, float)):
+            yield f'{prefix}{key}', value
+
+
+def compare(current, previous_file):
+    with open(previous_file, encoding='utf-8') as f:
+        previous = dict(flatten(json.load(f)['results']))
+    print(f"\nChange against {previous_file}:")
+    for key, value in flatten(current):
+        if key.endswith(('per_second', '_ms', 'seconds', 'peak_rss_mib')) and previous.get(key):
+            print(f"  {key:<44} {previous[key]:>10} -> {value:>10}  ({value / previous[key] - 1:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', nargs='*', default=list(DETAIL_FUNCTIONS))
+    parser.add_argument('--pages', type=int, default=5, help='listing pages served by each mock site')
+    parser.add_argument('--offers', type=int, default=50, help='offers fetched one by one in offer_details')
+    parser.add_argument('--latency', type=float, default=0.02, help='mock site response latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 500')
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--repeat', type=int, default=3, help='passes over the fixtures in the parse benchmark')
+    parser.add_argument('--out', default=None, help='results file (default: resources/benchmark_results/<timestamp>.json)')
+    parser.add_argument('--compare', default=None, help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    results = {}
+    for site in args.sites:
+        results[site] = {
+            'parse': bench_parse(site, args.repeat),
+            'scrape_page': bench_scrape_page(site, args),
+            'offer_details': bench_offer_details(site, args),
+            'end_to_end': bench_end_to_end(site, args),
+        }
+        print(f"{site}: {json.dumps(results[site], indent=2)}")
+
+    out = args.out or os.path.join(RESULTS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'settings': vars(args),
+            'results': results,
+        }, f, indent=2)
+    print(f"Results saved to {out}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,12 @@
+from lazy import lazy_exports
+
+# requests and asyncio load with the first of these that is used
+__all__ = ['CacheMiss', 'CachedResponse', 'ResponseCache', 'HttpClient', 'default_client', 'format_stats',
+           'AdaptiveLimit', 'ConcurrencyController', 'AsyncFetcher', 'FetchResult', 'RateLimiter']
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'CacheMiss': 'cache', 'CachedResponse': 'cache', 'ResponseCache': 'cache',
+    'HttpClient': 'client', 'default_client': 'client', 'format_stats': 'client',
+    'AdaptiveLimit': 'concurrency', 'ConcurrencyController': 'concurrency',
+    'AsyncFetcher': 'engine', 'FetchResult': 'engine',
+    'RateLimiter': 'ratelimit',
+})
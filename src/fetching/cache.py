@@ -0,0 +1,196 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+'''
+
+
+def body_path(root: str, key: str):
+    """Path of the compressed body with the given ResponseCache.key() inside a cache rooted at root."""
+    return os.path.join(root, key[:2], key[2:4], f'{key}.gz')
+
+
+def read_cached_body(root: str, url: str):
+    """Read a cached body straight from disk, without opening the index (for pool workers)."""
+    with gzip.open(body_path(root, ResponseCache.key(url)), 'rb') as f:
+        return f.read()
+
+
+class CacheMiss(Exception):
+    """Raised in offline mode when a url has never been cached."""
+
+
+class CachedResponse:
+    """The parts of a requests.Response the scrapers use, served from the cache."""
+
+    def __init__(self, url: str, status_code: int, content: bytes, etag: str = None, last_modified: str = None,
+                 fetched_at: float = None):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.from_cache = True
+        self.headers = {}
+
+    @property
+    def conditional_headers(self):
+        """Headers that let the server answer 304 Not Modified for this entry."""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """Gzip-compressed response bodies on disk, keyed by the SHA-256 of the url.
+
+    Bodies live in <root>/ab/cd/<hash>.gz; metadata (validators, timestamps,
+    sizes) lives in <root>/index.db. Entries older than ttl are revalidated
+    with If-None-Match/If-Modified-Since, and the least recently used entries
+    are evicted once the cache grows past max_bytes.
+    """
+
+    def __init__(self, root: str, ttl: float = 24 * 3600, max_bytes: int = 4 * 2**30):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(root, 'index.db'), check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        self.total_bytes = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    @staticmethod
+    def key(url: str):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def path(self, key: str):
+        return body_path(self.root, key)
+
+    def get(self, url: str):
+        """Return the cached response for url regardless of age, or None."""
+        key = self.key(url)
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT status, etag, last_modified, fetched_at FROM entries WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            with self.connection:
+                self.connection.execute('UPDATE entries SET accessed_at = ? WHERE key = ?', (time.time(), key))
+
+        try:
+            with gzip.open(self.path(key), 'rb') as f:
+                content = f.read()
+        except (OSError, EOFError):
+            # The body is gone or truncated; drop the stale index entry
+            self.delete(url)
+            return None
+
+        status, etag, last_modified, fetched_at = row
+        return CachedResponse(url, status, content, etag, last_modified, fetched_at)
+
+    def is_fresh(self, response: CachedResponse, max_age: float = None):
+        max_age = self.ttl if max_age is None else max_age
+        return time.time() - response.fetched_at < max_age
+
+    def put(self, url: str, status: int, content: bytes, etag: str = None, last_modified: str = None):
+        key = self.key(url)
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write next to the final path and rename, so readers never see a partial file; the temporary
+        # name is unique across the threads and the crawl processes sharing the cache
+        with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(path), suffix='.tmp', delete=False) as f:
+            f.write(gzip.compress(content, compresslevel=6))
+            temp_path = f.name
+        size = os.path.getsize(temp_path)
+        os.replace(temp_path, path)
+
+        now = time.time()
+        with self._lock:
+            previous = self.connection.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+            with self.connection:
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO entries (key, url, status, etag, last_modified, size, fetched_at, accessed_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (key, url, status, etag, last_modified, size, now, now)
+                )
+            self.total_bytes += size - (previous[0] if previous else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def refresh(self, url: str):
+        """Mark an entry as fresh again after the server answered 304 Not Modified."""
+        now = time.time()
+        with self._lock, self.connection:
+            self.connection.execute(
+                'UPDATE entries SET fetched_at = ?, accessed_at = ? WHERE key = ?', (now, now, self.key(url))
+            )
+
+    def delete(self, url: str):
+        key = self.key(url)
+        with self._lock:
+            self._delete(key)
+
+    def _delete(self, key: str):
+        row = self.connection.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+        with self.connection:
+            self.connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+        if row:
+            self.total_bytes -= row[0]
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        # Drop least recently used entries until the cache is 10% under its limit
+        target = self.max_bytes * 0.9
+        while self.total_bytes > target:
+            keys = [key for (key,) in self.connection.execute(
+                'SELECT key FROM entries ORDER BY accessed_at LIMIT 100'
+            )]
+            if not keys:
+                break
+            for key in keys:
+                self._delete(key)
+                if self.total_bytes <= target:
+                    break
+
+    def urls(self):
+        """All cached urls, oldest first."""
+        with self._lock:
+            return [url for (url,) in self.connection.execute('SELECT url FROM entries ORDER BY fetched_at')]
+
+    def __len__(self):
+        with self._lock:
+            return self.connection.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
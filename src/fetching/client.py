@@ -0,0 +1,207 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import default_registry
+from .cache import CacheMiss, ResponseCache
+from .ratelimit import RateLimiter, domain_of
+
+
+def _accept_encoding():
+    # urllib3 only decodes brotli when one of the brotli packages is installed
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        try:
+            import brotlicffi  # noqa: F401
+        except ImportError:
+            return 'gzip, deflate'
+    return 'gzip, deflate, br'
+
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'pl-PL,pl;q=0.9,en;q=0.8',
+    'Accept-Encoding': _accept_encoding(),
+}
+
+FETCH_SECONDS = default_registry.histogram(
+    'scraper_fetch_seconds', 'Time from sending a request to having its body, per domain', ('domain',))
+FETCH_RESPONSES = default_registry.counter(
+    'scraper_fetch_responses_total', 'Responses received per domain and HTTP status', ('domain', 'status'))
+FETCH_BYTES = default_registry.counter(
+    'scraper_fetch_bytes_total', 'Bytes received on the wire per domain', ('domain',))
+CACHE_HITS = default_registry.counter(
+    'scraper_cache_hits_total', 'Responses served from the HTTP cache without a request', ('domain',))
+
+# Default of HttpClient.send(stale=...): look the url up in the cache
+_LOOK_UP = object()
+
+
+class HttpClient:
+    """Single entry point for HTTP calls.
+
+    Every request passes the rate limiter and reuses pooled keep-alive
+    connections from one shared session. Transient failures (connection
+    errors, 500/502/504) are retried with jittered exponential backoff;
+    429/503 are left to the rate limiter, which slows the whole domain down.
+
+    With a ResponseCache, fresh entries are served without touching the
+    network and stale ones are revalidated with conditional requests. In
+    offline mode every response must come from the cache.
+    """
+
+    def __init__(self, rate_limiter: RateLimiter = None, headers: dict = None, timeout: float = 10,
+                 pool_size: int = 10, retries: int = 3, cache: ResponseCache = None, offline: bool = False):
+        if offline and cache is None:
+            raise ValueError("Offline mode needs a response cache to replay from")
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.cache = cache
+        self.offline = offline
+        self.headers = headers or DEFAULT_HEADERS
+        self.timeout = timeout
+        self.retries = retries
+        self.pool_size = 0
+
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.ensure_pool_size(pool_size)
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._bytes_received = 0
+        self._bytes_decoded = 0
+        self._cache_hits = 0
+        self._revalidated = 0
+
+    def ensure_pool_size(self, size: int):
+        """Grow the per-host connection pools so that `size` workers never wait for a connection."""
+        if size <= self.pool_size:
+            return
+        retry = Retry(total=self.retries, connect=self.retries, read=self.retries, backoff_factor=0.5,
+                      backoff_jitter=0.5, status_forcelist=(500, 502, 504), allowed_methods=('GET', 'HEAD'),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.pool_size = size
+
+    def cached(self, url: str, max_age: float = None):
+        """(cached response or None, True if it can be used without a request).
+
+        max_age overrides the cache TTL for this url (0 always revalidates).
+        Offline, any cached entry is used and a missing one raises CacheMiss.
+        A stale entry is passed on to send() for revalidation.
+        """
+        if self.cache is None:
+            return None, False
+        cached = self.cache.get(url)
+        if cached is None:
+            if self.offline:
+                raise CacheMiss(f"Not in cache: {url}")
+            return None, False
+        if self.offline or self.cache.is_fresh(cached, max_age):
+            with self._lock:
+                self._cache_hits += 1
+            CACHE_HITS.inc(domain_of(url))
+            return cached, True
+        return cached, False
+
+    def lookup(self, url: str, max_age: float = None):
+        """Return a cached response that can be used without a request, or None (see cached)."""
+        cached, fresh = self.cached(url, max_age)
+        return cached if fresh else None
+
+    def get(self, url: str, headers: dict = None, max_age: float = None):
+        """Serve url from the cache if possible, otherwise wait for the domain's rate limit and send."""
+        cached, fresh = self.cached(url, max_age)
+        if fresh:
+            return cached
+        self.rate_limiter.acquire(url)
+        return self.send(url, headers, stale=cached)
+
+    def send(self, url: str, headers: dict = None, stale=_LOOK_UP):
+        """Send a request whose rate-limit slot has already been acquired.
+
+        stale is the cached entry of url returned by cached(), or None when
+        there is none; by default the cache is looked up here.
+        """
+        if stale is _LOOK_UP:
+            stale = self.cache.get(url) if self.cache is not None else None
+        if self.offline:
+            if stale is None:
+                raise CacheMiss(f"Not in cache: {url}")
+            return stale
+        if stale is not None:
+            headers = {**stale.conditional_headers, **(headers or {})}
+
+        start = time.perf_counter()
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        self.rate_limiter.report(url, response.status_code, response.headers.get('Retry-After'))
+
+        # Reading .content consumes the body, after which raw.tell() is the on-the-wire size
+        content = response.content
+        received = response.raw.tell() if response.raw is not None else len(content)
+        with self._lock:
+            self._requests += 1
+            self._bytes_received += received
+            self._bytes_decoded += len(content)
+        domain = domain_of(url)
+        FETCH_SECONDS.observe(time.perf_counter() - start, domain)
+        FETCH_RESPONSES.inc(domain, response.status_code)
+        FETCH_BYTES.inc(domain, amount=received)
+
+        if self.cache is not None:
+            if response.status_code == 304 and stale is not None:
+                self.cache.refresh(url)
+                with self._lock:
+                    self._revalidated += 1
+                return stale
+            if response.status_code == 200:
+                self.cache.put(url, response.status_code, content, response.headers.get('ETag'),
+                               response.headers.get('Last-Modified'))
+        return response
+
+    def stats(self):
+        """Connection reuse and transfer counters since the client was created."""
+        connections = 0
+        for adapter in set(self.session.adapters.values()):
+            for key in list(adapter.poolmanager.pools.keys()):
+                pool = adapter.poolmanager.pools.get(key)
+                if pool is not None:
+                    connections += pool.num_connections
+        with self._lock:
+            return {
+                'requests': self._requests,
+                'connections_opened': connections,
+                'bytes_received': self._bytes_received,
+                'bytes_decoded': self._bytes_decoded,
+                'cache_hits': self._cache_hits,
+                'revalidated': self._revalidated,
+            }
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+
+def format_stats(stats: dict, since: dict = None):
+    """One-line summary of HttpClient.stats(), optionally relative to an earlier snapshot."""
+    if since:
+        stats = {key: value - since.get(key, 0) for key, value in stats.items()}
+    requests_made = stats['requests']
+    reused = max(0, requests_made - stats['connections_opened'])
+    reuse_rate = reused / requests_made if requests_made else 0.0
+    return (f"{requests_made} requests over {stats['connections_opened']} connections "
+            f"({reuse_rate:.0%} reused), {stats['bytes_received'] / 2**20:.1f} MiB received "
+            f"({stats['bytes_decoded'] / 2**20:.1f} MiB decoded), {stats['cache_hits']} served from cache, "
+            f"{stats['revalidated']} revalidated")
+
+
+# Client shared by the listing scrapers and the detail fetchers
+default_client = HttpClient()
@@ -0,0 +1,147 @@
+import asyncio
+import math
+from collections import deque
+
+from .ratelimit import THROTTLE_STATUSES, domain_of
+
+
+def percentile(values, fraction: float):
+    """Nearest-rank percentile of a non-empty sequence."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+class AdaptiveLimit:
+    """AIMD limit on the requests in flight to one domain.
+
+    The limit starts in slow start, growing by one per successful response,
+    and after the first backoff grows by one per round of `limit` responses.
+    Throttling statuses (429/503), errors and timeouts halve it; a rolling p95
+    latency above `tolerance` times the best p95 seen shrinks it by a quarter.
+    After a decrease, further decreases wait one round, since the responses
+    still in flight were sent under the old limit.
+    """
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 32, window: int = 50,
+                 tolerance: float = 2.0):
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.latencies = deque(maxlen=window)
+        self.slow_start = True
+        self.in_flight = 0
+        self.baseline = None
+        self.p95 = None
+        self.throttled = 0
+        self.errors = 0
+        self._round = 0
+        self._cooldown = 0
+        self._condition = None
+        self._loop = None
+
+    @property
+    def current(self):
+        return int(self.limit)
+
+    def _wait_condition(self):
+        # The condition is bound to the event loop it was created in
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+        return self._condition
+
+    async def acquire(self):
+        condition = self._wait_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < self.current)
+            self.in_flight += 1
+
+    async def release(self):
+        condition = self._wait_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    def _decrease(self, factor: float):
+        self.slow_start = False
+        if self._cooldown > 0:
+            return
+        self.limit = max(self.min_limit, self.limit * factor)
+        self._cooldown = self.current
+        self._round = 0
+
+    def record(self, elapsed: float, status: int = 0, error: str = None):
+        """Feed back the outcome of one request."""
+        self._cooldown = max(0, self._cooldown - 1)
+        if error is not None or status in THROTTLE_STATUSES:
+            if error is not None:
+                self.errors += 1
+            else:
+                self.throttled += 1
+            self._decrease(0.5)
+            return
+
+        self.latencies.append(elapsed)
+        self._round += 1
+        if self._round < self.current or len(self.latencies) < min(10, self.latencies.maxlen):
+            if self.slow_start:
+                self.limit = min(self.max_limit, self.limit + 1)
+            return
+
+        # One round of responses under the current limit: compare its latency with the best seen
+        self._round = 0
+        self.p95 = percentile(self.latencies, 0.95)
+        self.baseline = self.p95 if self.baseline is None else min(self.baseline, self.p95)
+        if self.p95 > self.baseline * self.tolerance:
+            self._decrease(0.75)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1)
+
+    def describe(self):
+        p95 = f"{self.p95 * 1000:.0f}ms" if self.p95 is not None else '-'
+        return f"{self.current}/{self.max_limit} p95={p95}"
+
+
+class ConcurrencyController:
+    """Per-domain AdaptiveLimits for an AsyncFetcher, plus the checkpoint batch size they imply."""
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 32, window: int = 50,
+                 tolerance: float = 2.0, commit_interval: float = 1.0, max_batch: int = 500):
+        self.settings = dict(initial=initial, min_limit=min_limit, max_limit=max_limit, window=window,
+                             tolerance=tolerance)
+        self.max_limit = max_limit
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self.limits = {}
+
+    def limit_for(self, url: str):
+        domain = domain_of(url)
+        limit = self.limits.get(domain)
+        if limit is None:
+            limit = self.limits[domain] = AdaptiveLimit(**self.settings)
+        return limit
+
+    def batch_size(self):
+        """Records to checkpoint per transaction: about commit_interval seconds of throughput.
+
+        By Little's law throughput is the concurrency limit over the latency, so
+        fast, wide crawls commit in large batches while a throttled crawl
+        commits almost every record.
+        """
+        rate = 0.0
+        for limit in self.limits.values():
+            if limit.latencies:
+                rate += limit.current / (sum(limit.latencies) / len(limit.latencies) or 1e-3)
+        return max(1, min(self.max_batch, int(rate * self.commit_interval)))
+
+    def describe(self):
+        """Short state for progress bars, e.g. 'limit 12/32 p95=180ms'."""
+        return ', '.join(f"limit {limit.describe()}" for limit in self.limits.values()) or 'limit -'
+
+    def stats(self):
+        return {
+            domain: {'limit': limit.current, 'p95': limit.p95, 'throttled': limit.throttled, 'errors': limit.errors}
+            for domain, limit in self.limits.items()
+        }
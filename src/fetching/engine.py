@@ -0,0 +1,130 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import requests
+
+from metrics import default_registry
+from .client import HttpClient, default_client
+from .concurrency import ConcurrencyController
+from .ratelimit import domain_of
+
+SLOT_WAIT = default_registry.histogram(
+    'scraper_concurrency_wait_seconds', 'Time requests waited for a concurrency slot', ('domain',))
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int = 0
+    content: bytes = b''
+    error: str = None
+    elapsed: float = 0.0
+    timed_out: bool = False
+
+    @property
+    def ok(self):
+        return self.error is None and 200 <= self.status < 400
+
+
+class AsyncFetcher:
+    """Download many pages concurrently on an asyncio event loop.
+
+    Politeness is handled by the client's per-domain rate limiter, so the
+    worker threads that run the blocking HTTP calls are never parked in a sleep.
+    With a ConcurrencyController, the requests in flight to each domain follow
+    its adaptive limit (up to max_concurrency) instead of a fixed semaphore.
+    """
+
+    def __init__(self, max_concurrency: int = 10, client: HttpClient = None,
+                 controller: ConcurrencyController = None):
+        self.max_concurrency = max_concurrency
+        self.client = client or default_client
+        self.controller = controller
+        self.client.ensure_pool_size(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='fetch')
+        self._semaphore = None
+        self._loop = None
+
+    def _lookup(self, url: str, max_age: float = None):
+        """(FetchResult of a usable cached page or None, stale cached entry to revalidate or None)."""
+        try:
+            page, fresh = self.client.cached(url, max_age)
+        except Exception as e:
+            return FetchResult(url, error=str(e)), None
+        if fresh:
+            return FetchResult(url, page.status_code, page.content), None
+        return None, page
+
+    def _send(self, url: str, stale=None):
+        start = time.perf_counter()
+        try:
+            page = self.client.send(url, stale=stale)
+            return FetchResult(url, page.status_code, page.content, elapsed=time.perf_counter() - start)
+        except Exception as e:
+            return FetchResult(url, error=str(e), elapsed=time.perf_counter() - start,
+                               timed_out=isinstance(e, requests.Timeout))
+
+    async def fetch(self, url: str, max_age: float = None):
+        """Fetch one url; max_age overrides the cache TTL for it (0 always revalidates)."""
+        if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+            return FetchResult(url, error=f"Invalid URL: {url}")
+
+        # The semaphore is bound to the event loop it was created in
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+
+        # Cache hits skip the rate limiter entirely; a stale entry is revalidated without reading it again
+        stale = None
+        if self.client.cache is not None:
+            cached, stale = await loop.run_in_executor(self._executor, self._lookup, url, max_age)
+            if cached is not None:
+                return cached
+
+        await self.client.rate_limiter.acquire_async(url)
+        waiting = time.perf_counter()
+        if self.controller is None:
+            async with self._semaphore:
+                SLOT_WAIT.observe(time.perf_counter() - waiting, domain_of(url))
+                return await loop.run_in_executor(self._executor, self._send, url, stale)
+
+        limit = self.controller.limit_for(url)
+        await limit.acquire()
+        SLOT_WAIT.observe(time.perf_counter() - waiting, domain_of(url))
+        try:
+            result = await loop.run_in_executor(self._executor, self._send, url, stale)
+        finally:
+            await limit.release()
+        limit.record(result.elapsed, result.status, result.error)
+        return result
+
+    async def fetch_all(self, urls, on_result=None):
+        """Fetch all urls, calling on_result(result) as each one completes."""
+        async def fetch_one(url):
+            result = await self.fetch(url)
+            if on_result:
+                on_result(result)
+            return result
+
+        try:
+            return await asyncio.gather(*(fetch_one(url) for url in urls))
+        finally:
+            # The semaphore is bound to this event loop
+            self._semaphore = None
+            self._loop = None
+
+    def run(self, urls, on_result=None):
+        """Blocking wrapper around fetch_all for synchronous callers."""
+        return asyncio.run(self.fetch_all(urls, on_result))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+from urllib.parse import urlparse
+
+from metrics import default_registry
+
+
+# Status codes telling us the server wants us to slow down
+THROTTLE_STATUSES = (429, 503)
+
+RATE_LIMIT_WAIT = default_registry.histogram(
+    'scraper_rate_limit_wait_seconds', 'Time requests spent waiting for their domain rate limit', ('domain',))
+
+
+def domain_of(url: str):
+    """Return the host part of a url, or the value itself when it is already a bare host."""
+    return urlparse(url).netloc or url
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations instead of blocking.
+
+    reserve() takes a token (letting the balance go negative) and returns how
+    long the caller has to wait before it may send, so the same bucket works
+    for blocking threads and for coroutines.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, min_rate: float = None):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate or rate / 16
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def slow_down(self, retry_after: float = None):
+        """Halve the rate and pause the bucket after a throttling response."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+            pause = retry_after if retry_after is not None else 1 / self.rate
+            self.paused_until = max(self.paused_until, now + pause)
+
+    def speed_up(self):
+        """Recover a little of the configured rate after a successful response."""
+        if self.rate < self.max_rate:
+            with self._lock:
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class RateLimiter:
+    """Per-domain token buckets shared by every request the scrapers make."""
+
+    def __init__(self, rate: float = 5.0, burst: int = 5):
+        self.default_rate = rate
+        self.default_burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def configure(self, domain: str, rate: float, burst: int = 1):
+        with self._lock:
+            self._buckets[domain_of(domain)] = TokenBucket(rate, burst)
+
+    def bucket(self, url: str):
+        domain = domain_of(url)
+        bucket = self._buckets.get(domain)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.setdefault(domain, TokenBucket(self.default_rate, self.default_burst))
+        return bucket
+
+    def acquire(self, url: str):
+        """Block the calling thread until a request to url is allowed."""
+        wait = self.bucket(url).reserve()
+        RATE_LIMIT_WAIT.observe(wait, domain_of(url))
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, url: str):
+        """Suspend the calling coroutine until a request to url is allowed."""
+        wait = self.bucket(url).reserve()
+        RATE_LIMIT_WAIT.observe(wait, domain_of(url))
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def report(self, url: str, status: int, retry_after: str = None):
+        """Feed a response status back so the bucket can back off or recover."""
+        bucket = self.bucket(url)
+        if status in THROTTLE_STATUSES:
+            bucket.slow_down(parse_retry_after(retry_after))
+        elif 200 <= status < 400:
+            bucket.speed_up()
+
+    def describe(self):
+        return {domain: round(bucket.rate, 2) for domain, bucket in self._buckets.items()}
+
+
+def parse_retry_after(value):
+    """Parse the seconds form of a Retry-After header, ignoring anything else."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
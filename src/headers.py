@@ -27,4 +27,53 @@ class Headers(Enum):
     EQUIPMENT = 'wyposażenie'
     SECURITY = 'zabezpieczenia'
     MEDIA = 'media'
-    SOURCE = 'źródło'
\ No newline at end of file
+    SOURCE = 'źródło'
+
+    @property
+    def field(self):
+        """Attribute name of this column on OfferRecord."""
+        return self.name.lower()
+
+    @property
+    def numeric(self):
+        """True for columns stored as nullable floats rather than text."""
+        return self in NUMERIC_HEADERS
+
+
+NUMERIC_HEADERS = frozenset({
+    Headers.M2,
+    Headers.TOTAL_PRICE,
+    Headers.PRICE_PER_M2,
+    Headers.RENT,
+    Headers.ROOMS,
+})
+
+# Column name -> '' for every column, built once and copied for each offer
+_EMPTY_ROW = {header.value: '' for header in Headers}
+
+
+def empty_row():
+    """Fresh dict of the scraped offer columns, all set to ''."""
+    return _EMPTY_ROW.copy()
+
+
+class NormalizedHeaders(Enum):
+    """Columns added by pipeline.normalize next to the raw Headers columns."""
+    M2 = 'powierzchnia (znorm.)'
+    TOTAL_PRICE = 'cena (znorm.)'
+    PRICE_PER_M2 = 'cena za metr (znorm.)'
+    RENT = 'czynsz (znorm.)'
+    ROOMS = 'liczba pokoi (znorm.)'
+    FLOOR = 'numer piętra'
+    TOTAL_FLOORS = 'liczba pięter'
+    BUILDING_YEAR = 'rok budowy (znorm.)'
+    AVAILABLE_FROM = 'dostępne od (znorm.)'
+    ELEVATOR = 'winda (znorm.)'
+    BUILDING_TYPE = 'rodzaj budynku (znorm.)'
+    MARKET = 'rynek (znorm.)'
+    HEATING = 'ogrzewanie (znorm.)'
+    FINISH_CONDITION = 'stan wykończenia (znorm.)'
+    OWNERSHIP_FORM = 'forma własności (znorm.)'
+    ADVERTISER_TYPE = 'typ ogłoszeniodawcy (znorm.)'
+    BUILDING_MATERIAL = 'materiał budynku (znorm.)'
+    WINDOWS = 'okna (znorm.)'
@@ -0,0 +1,26 @@
+"""Lazy re-exports for package __init__ modules (PEP 562).
+
+A package lists what it re-exports and from which submodule; the submodule
+is imported the first time one of its names is used, so importing one part
+of a package (a parse worker importing the parsers, or main.py showing its
+--help) does not load requests, pandas and the rest of the package with it.
+"""
+import importlib
+
+
+def lazy_exports(package: str, exports: dict):
+    """Module __getattr__ and __dir__ for package, re-exporting exports (name -> submodule) on first access."""
+
+    def __getattr__(name):
+        module = exports.get(name)
+        if module is None:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(f'.{module}', package), name)
+        # Later lookups find the name in the package namespace without coming back here
+        setattr(importlib.import_module(package), name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(vars(importlib.import_module(package))) | set(exports))
+
+    return __getattr__, __dir__
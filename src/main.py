@@ -1,239 +1,312 @@
-import random
+"""Scrape property offers from OLX and Otodom into resources/<source>_data.csv and resources/combined_data.csv.
+
+Run from the src directory, e.g. a short incremental run of one source:
+    python main.py --source olx --pages 5
+Only the standard library, the scraper registry and the metrics are imported
+at startup; requests, pandas and the pipeline stages load with the mode that
+needs them, so --help and short runs start quickly.
+"""
+import argparse
+import asyncio
+import os
 import time
 
-import pandas as pd
-from tqdm import tqdm
+from metrics import default_registry, serve_metrics, write_report
+from pipeline.stages import EXECUTOR_KINDS, STAGE_SECONDS
+from scrapers import SCRAPERS
+from scrapers.regions import PROPERTY_TYPES, REGIONS, TRANSACTIONS
 
-from headers import Headers
-from scrapers.olxscraper import OlxScraper, scrape_offer_details as get_olx_offer
-from scrapers.otodomscraper import OtodomScraper, scrape_offer_details as get_otodom_offer
-import os
-import threading
-import concurrent.futures
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'resources')
+OUTPUT_FORMATS = ('csv', 'parquet', 'feather')
 
-def get_offer_details_threaded(links, max_workers=10):
-    # Initialize dictionary for scraped data
-    scraped_data = {key: [] for key in [list(Headers)[i].value for i in range(len(Headers))]}
-    
-    # Create a default/empty data template with all required keys
-    empty_data = {key: '' for key in [list(Headers)[i].value for i in range(len(Headers))]}
+ROWS_WRITTEN = default_registry.counter('scraper_rows_written_total', 'Offers in the data file of each source',
+                                        ('source',))
 
-    # Thread-safe lock for appending results
-    lock = threading.Lock()
+def record_history(history_file, source_name, records, observed_at, listed=None, gone=(), region=None):
+    """Append the changes seen in one run of a source to the offer history and return counts by outcome.
 
-    # Counter for progress reporting
-    counter = {'processed': 0, 'total': len(links)}
+    gone holds the links found taken down (404/410) in this run; those offers
+    are recorded as delisted rather than as seen on the listing. listed only
+    delists offers of the given region (see OfferHistory.record_snapshot).
+    """
+    from storage import OfferHistory
 
-    def process_link(link):
-        try:
-            # Random delay between requests (to avoid being blocked)
-            time.sleep(random.uniform(1, 2))
-
-            # Use appropriate scraper based on the domain
-            if 'otodom' in link:
-                data = get_otodom_offer(link)
-            else:
-                data = get_olx_offer(link)
-            
-            # Ensure all required keys exist
-            result_data = {}
-            for key in scraped_data.keys():
-                result_data[key] = data.get(key, '')
-                    
-            with lock:
-                counter['processed'] += 1
-                if counter['processed'] % 100 == 0:
-                    print(f"Processed {counter['processed']} out of {counter['total']} links")
-                return result_data      
-                
-        except Exception as e:
-            # Log the error but continue with next link
-            print(f"Error processing {link}: {str(e)}")
-            with lock:
-                counter['processed'] += 1
-                return None
-
-    # Process links using ThreadPoolExecutor
-    results = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_link = {executor.submit(process_link, link): link for link in links}
-        
-        # Use tqdm to show progress
-        for future in tqdm(concurrent.futures.as_completed(future_to_link), total=len(links), desc="Scraping offer details"):
-            link = future_to_link[future]
-            try:
-                result = future.result()
-                if result:
-                    results.append(result)
-            except Exception as exc:
-                print(f'{link} generated an exception: {exc}')
-                results.append(empty_data)
-    
-    results = [result for result in results if result is not None]
+    gone = set(gone)
+    if gone:
+        records = (record for record in records if record.link not in gone)
+        listed = None if listed is None else set(listed) - gone
+    history = OfferHistory(history_file)
+    try:
+        counts = history.record_snapshot(source_name, records, observed_at, listed=listed, region=region)
+        counts['delisted'] += history.mark_delisted(gone, observed_at)
+    finally:
+        history.close()
+    print(f"{source_name}{f' {region}' if region else ''} offer history: {counts}")
+    return counts
 
-    # Convert results to required format
-    for key in scraped_data.keys():
-        scraped_data[key] = [result.get(key, '') for result in results]
-    
-    return scraped_data
+async def run_data_source(scraper, source_name, pages, resources_dir, max_workers=32, resume=False, incremental=False,
+                          parse_executor=None, position=None, output_format='csv', adaptive=True, history_file=None):
+    """Process a single data source (OLX or Otodom) with checkpoint saving.
 
+    pages caps the listing pages walked (None walks them all, see stream_source).
+    Listing pages stream their offer links straight to the detail workers, and
+    every parsed record is checkpointed as soon as it is ready. In incremental
+    mode only offers that are new, or whose listing price or title changed, get
+    their details scraped; they are merged into the existing data file.
+    Detail pages are parsed in parse_executor (see pipeline.make_parse_executor).
+    With output_format 'parquet' or 'feather' the data file is also written as a
+    partitioned dataset (see storage.columnar).
+    With adaptive, requests in flight grow and shrink between 1 and max_workers
+    with the observed latency and throttling (see fetching.concurrency);
+    otherwise exactly max_workers requests run at a time.
+    Offers whose details fail go to a persistent retry queue and are retried
+    at the end of the run or in the next one (see storage.retry_queue).
+    With history_file, price, rent and status changes of the scraped offers
+    are appended to that OfferHistory; offers missing from a complete
+    listing walk, or gone (404/410), are recorded as delisted.
+    """
+    from fetching import AsyncFetcher, ConcurrencyController, format_stats
+    from pipeline import stream_source
+    from storage import CheckpointStore, OfferIndex, RetryQueue, write_csv_dataset
+    from storage.retry_queue import GONE
 
-def remove_duplicates(data):
-    # Create a dictionary to track unique links
-    seen_links = {}
-    indices_to_remove = []
-    
-    for i, link in enumerate(data[Headers.LINK.value]):
-        # Skip empty links or skip entire records with empty links
-        if not link or link.strip() == '':
-            continue
-            
-        # If we've seen this link before, mark it for removal
-        if link in seen_links:
-            indices_to_remove.append(i)
-        else:
-            seen_links[link] = i
-    
-    # Remove duplicates (from highest index to lowest to avoid shifting problems)
-    for index in sorted(indices_to_remove, reverse=True):
-        for key in data.keys():
-            data[key].pop(index)
-    
-    return data
+    started = time.time()
 
-def process_data_source(scraper, source_name, pages, resources_dir, max_workers=10, resume=False):
-    """Process a single data source (OLX or Otodom) with checkpoint saving"""
     # Define all output files
     data_file = os.path.join(resources_dir, f'{source_name}_data.csv')
-    checkpoint_file = os.path.join(resources_dir, f'{source_name}_checkpoint.csv')
-    progress_file = os.path.join(resources_dir, f'{source_name}_progress.txt')
-    
-    # Check if we should resume from a previous run
-    last_completed_batch = -1
-    if resume and os.path.exists(progress_file):
-        try:
-            with open(progress_file, 'r') as f:
-                last_completed_batch = int(f.read().strip())
-            print(f"Resuming {source_name} scraping from batch {last_completed_batch + 1}")
-        except:
-            print(f"Could not read progress file for {source_name}, starting from beginning")
-    
-    # Get initial data only if not resuming or if checkpoint doesn't exist
-    if last_completed_batch == -1:
-        print(f"Scraping {source_name} offers...")
-        data = scraper.scrape_offers(pages=pages)
-        
-        # Add source information to each record
-        data[Headers.SOURCE.value] = [source_name] * len(data[Headers.LINK.value])
-        
-        # Save initial data as checkpoint
-        pd.DataFrame(data).to_csv(checkpoint_file, index=False, encoding='utf-8')
-        
-        # Reset progress tracking
-        with open(progress_file, 'w') as f:
-            f.write('-1')  # No batches completed yet
+    checkpoint = CheckpointStore(os.path.join(resources_dir, f'{source_name}_checkpoint.db'))
+    retries = RetryQueue(os.path.join(resources_dir, f'{source_name}_retries.db'))
+
+    # Resume from the checkpoint only if a previous run left one behind
+    resumed = resume and checkpoint.count()
+    if resumed:
+        print(f"Resuming {source_name} scraping from checkpoint "
+              f"({len(checkpoint.completed_pages())} listing pages, {checkpoint.count()} offers stored)")
     else:
-        # Load from checkpoint
-        print(f"Loading {source_name} data from checkpoint...")
-        checkpoint_df = pd.read_csv(checkpoint_file)
-        data = {column: checkpoint_df[column].tolist() for column in checkpoint_df.columns}
-    
-    # Process in smaller batches and save progress
-    batch_size = 100
-    all_links = data[Headers.LINK.value]
-    total_batches = len(all_links) // batch_size + (1 if len(all_links) % batch_size > 0 else 0)
-    
-    for batch_num in range(total_batches):
-        # Skip already processed batches if resuming
-        if batch_num <= last_completed_batch:
-            continue
-            
-        start_idx = batch_num * batch_size
-        end_idx = min(start_idx + batch_size, len(all_links))
-        batch_links = all_links[start_idx:end_idx]
-        
-        try:
-            print(f"Processing {source_name} batch {batch_num+1}/{total_batches} (links {start_idx+1}-{end_idx})")
-            batch_data = get_offer_details_threaded(batch_links, max_workers)
-            
-            # Add source information to batch data
-            batch_data[Headers.SOURCE.value] = [source_name] * len(batch_data[Headers.LINK.value])
-            
-            # Update data with batch results
-            for key in data.keys():
-                if start_idx < len(data[key]):
-                    # Handle case where data might have fewer entries than expected
-                    end_actual = min(end_idx, len(data[key]))
-                    # Make sure we don't exceed the length of batch_data[key]
-                    num_entries = min(end_actual - start_idx, len(batch_data[key]))
-                    data[key][start_idx:start_idx + num_entries] = batch_data[key][:num_entries]
-            
-            # Update the main checkpoint after each batch
-            pd.DataFrame(data).to_csv(checkpoint_file, index=False, encoding='utf-8')
-            
-            # Update progress tracker
-            with open(progress_file, 'w') as f:
-                f.write(str(batch_num))
-                
-            print(f"{source_name} batch {batch_num+1} complete and saved")
-            
-        except Exception as e:
-            print(f"Error processing batch {batch_num+1}: {str(e)}")
-            print(f"Last successfully processed batch: {batch_num}")
-            # Don't update progress file - this will allow resuming from this failed batch
-            import traceback
-            print(traceback.format_exc())
-            break
-    
-    # Remove duplicate entries
-    data = remove_duplicates(data)
-    
-    # Save final results
-    dataframe = pd.DataFrame(data)
-    dataframe.to_csv(data_file, index=False, encoding='utf-8')
-    
-    # Clean up progress files after successful completion
+        checkpoint.reset()
+
+    # Skip offers that are already in the dataset unchanged
+    index = None
+    if incremental:
+        index = OfferIndex.load(data_file)
+        print(f"{source_name}: {len(index)} offers already scraped, fetching only new or changed ones")
+
+    client_stats = scraper.client.stats()
+    controller = ConcurrencyController(max_limit=max_workers) if adaptive else None
+    fetcher = AsyncFetcher(max_concurrency=max_workers, client=scraper.client, controller=controller)
+    listed = set()
+    gone = []
     try:
-        os.remove(progress_file)
-    except:
-        pass
+        completed = await stream_source(scraper, source_name, pages, fetcher, checkpoint, index=index,
+                                        workers=max_workers, parse_executor=parse_executor, position=position,
+                                        retries=retries, listed=listed)
+    except Exception as e:
+        # Everything committed so far stays in the checkpoint for the next run
+        print(f"Error processing {source_name}: {str(e)}")
+        import traceback
+        print(traceback.format_exc())
+        completed = False
+    finally:
+        fetcher.close()
+        # Dead letters of earlier runs are already in the history, and their offers may be back by now
+        gone = [link for link, kind, _, _ in retries.dead_letters(since=started) if kind == GONE]
+        retries.close()
+    print(f"{source_name} HTTP: {format_stats(scraper.client.stats(), since=client_stats)}")
+    
+    # Merge listing rows with their details, dropping duplicate links, into the final file,
+    # off the event loop so that other sources keep scraping meanwhile
+    with STAGE_SECONDS.time(source_name, 'compact'):
+        rows = await asyncio.to_thread(checkpoint.compact, data_file, base_file=data_file if incremental else None)
+    ROWS_WRITTEN.inc(source_name, amount=rows)
+
+    if output_format != 'csv':
+        with STAGE_SECONDS.time(source_name, 'dataset'):
+            dataset_dir = await asyncio.to_thread(write_csv_dataset, data_file, output_format)
+        print(f"{source_name} dataset saved to {dataset_dir}")
+
+    # Offers missing from the listing only count as delisted when every listing page was walked in this run
+    if history_file is not None:
+        full_walk = completed and pages is None and not resumed
+        with STAGE_SECONDS.time(source_name, 'history'):
+            await asyncio.to_thread(record_history, history_file, source_name, checkpoint.iter_records(), started,
+                                    listed=listed if full_walk else None, gone=gone, region=scraper.region)
+
+    # Clean up the checkpoint after successful completion
+    if completed:
+        checkpoint.remove()
+    else:
+        checkpoint.close()
         
-    print(f"Completed processing {source_name} data, saved to {data_file}")
-    return data
+    print(f"Completed processing {source_name} data ({rows} offers), saved to {data_file}")
+    return data_file
 
-def main():
-    # Scraper settings
-    olx_scraper = OlxScraper()
-    otodom_scraper = OtodomScraper()
+def process_data_source(scraper, source_name, pages, resources_dir, max_workers=32, resume=False, incremental=False,
+                        parse_executor=None, output_format='csv', adaptive=True, history_file=None):
+    """Run a single data source to completion, see run_data_source."""
+    return asyncio.run(run_data_source(scraper, source_name, pages, resources_dir, max_workers=max_workers,
+                                       resume=resume, incremental=incremental, parse_executor=parse_executor,
+                                       output_format=output_format, adaptive=adaptive, history_file=history_file))
+
+def process_data_sources(scrapers, source_pages, resources_dir, max_workers=32, resume=False, incremental=False,
+                         parse_executor=None, output_format='csv', adaptive=True, history_file=None):
+    """Run several data sources concurrently and return their data files by source name.
+
+    Each source gets its own fetcher (worker pool), rate limit bucket and
+    checkpoint, so the total runtime is that of the slowest source.
+    """
+    async def run_all():
+        files = await asyncio.gather(*[
+            run_data_source(scraper, source_name, source_pages.get(source_name), resources_dir, max_workers=max_workers,
+                            resume=resume, incremental=incremental, parse_executor=parse_executor, position=position,
+                            output_format=output_format, adaptive=adaptive, history_file=history_file)
+            for position, (source_name, scraper) in enumerate(scrapers.items())
+        ])
+        return dict(zip(scrapers, files))
+
+    return asyncio.run(run_all())
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--source', nargs='+', choices=list(SCRAPERS), default=list(SCRAPERS),
+                        help='sources to scrape (default: all)')
+    parser.add_argument('--pages', type=int, default=None,
+                        help='cap on the listing pages walked per source (default: as many as the site reports)')
+    parser.add_argument('--workers', type=int, default=32, help='most detail requests in flight per source')
+    parser.add_argument('--resume', action=argparse.BooleanOptionalAction, default=True,
+                        help='continue from the checkpoints of an interrupted run')
+    parser.add_argument('--incremental', action=argparse.BooleanOptionalAction, default=True,
+                        help='only scrape offers that are new or changed since the last run')
+    parser.add_argument('--offline', action='store_true',
+                        help='replay every page from the HTTP cache (use with --no-incremental to re-extract)')
+    parser.add_argument('--reextract-only', action='store_true',
+                        help='only re-parse all cached offer pages into reextracted_data.csv')
+    parser.add_argument('--format', dest='output_format', choices=OUTPUT_FORMATS, default='csv',
+                        help='parquet or feather also writes partitioned datasets next to the CSV files')
+    parser.add_argument('--normalize', action=argparse.BooleanOptionalAction, default=True,
+                        help='add cleaned-up, typed columns (pipeline.normalize) to the combined data')
+    parser.add_argument('--history', action=argparse.BooleanOptionalAction, default=True,
+                        help='append price, rent and status changes of every offer to offer_history.db')
+    parser.add_argument('--region', dest='regions', nargs='+', choices=list(REGIONS), default=['lodz'],
+                        help='regions to scrape; more than one needs --crawl-processes')
+    parser.add_argument('--property-type', choices=list(PROPERTY_TYPES), default='flat')
+    parser.add_argument('--transaction', choices=list(TRANSACTIONS), default='sale')
+    parser.add_argument('--crawl-processes', type=int, default=0,
+                        help='crawl every source and region as shards of a work queue with this many processes')
+    parser.add_argument('--parse-executor', choices=EXECUTOR_KINDS, default='process',
+                        help='where detail pages are parsed (see pipeline.stages)')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='serve Prometheus metrics on http://127.0.0.1:<port>/metrics')
+    parser.add_argument('--resources-dir', default=RESOURCES_DIR)
+    args = parser.parse_args(argv)
+    if len(args.regions) > 1 and not args.crawl_processes:
+        parser.error('several regions need --crawl-processes')
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    resources_dir = args.resources_dir
 
-    # Data file paths
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    resources_dir = os.path.join(base_dir, 'resources')
-    
     # Create resources directory if it doesn't exist
     os.makedirs(resources_dir, exist_ok=True)
-    
-    # Check for resume flag
-    resume = True  # Set to True to enable auto-resuming from checkpoints
-    
-    # Process each data source separately
-    data_olx = process_data_source(olx_scraper, 'olx', pages=24, resources_dir=resources_dir, resume=resume)
-    data_otodom = process_data_source(otodom_scraper, 'otodom', pages=250, resources_dir=resources_dir, resume=resume)
 
-    # Combine data from both scrapers and save combined file
+    from fetching import HttpClient, ResponseCache
+
+    # Timings and counters of every stage go to resources/run_report.json at the end
+    started = time.time()
+    metrics_server = serve_metrics(args.metrics_port) if args.metrics_port else None
+
+    # Scraper settings, sharing one cached HTTP client
+    cache = ResponseCache(os.path.join(resources_dir, 'http_cache'))
+    client = HttpClient(cache=cache, offline=args.offline)
+    history_file = os.path.join(resources_dir, 'offer_history.db') if args.history else None
+
+    if args.reextract_only:
+        from pipeline import reextract_cache
+
+        reextract_cache(cache, os.path.join(resources_dir, 'reextracted_data.csv'))
+        client.close()
+        return
+
+    if args.crawl_processes:
+        from pipeline import export_crawl, run_crawl, seed_tasks
+        from storage import WorkQueue
+
+        # Shards of every source and region, leased by worker processes from a shared queue; more workers,
+        # here or on other machines, can join with pipeline.crawl.run_worker on the same queue file
+        queue = WorkQueue(os.path.join(resources_dir, 'crawl_queue.db'))
+        if args.resume and (queue.unfinished() or queue.failed_tasks()):
+            # An interrupted crawl goes on where it stopped, and its failed shards get another go
+            queue.requeue_failed()
+        else:
+            # A finished crawl is not resumed: its done tasks would leave nothing for seed_tasks to queue
+            queue.reset()
+        seed_tasks(queue, args.source, args.regions)
+        with STAGE_SECONDS.time('crawl', 'crawl'):
+            run_crawl(queue.path, processes=args.crawl_processes, cache_dir=cache.root, offline=args.offline,
+                      retries_dir=resources_dir, pages=args.pages, max_workers=args.workers,
+                      scraper_options={'property_type': args.property_type, 'transaction': args.transaction})
+        print(f"Crawl tasks: {queue.counts()}")
+        with STAGE_SECONDS.time('crawl', 'export'):
+            data_files = export_crawl(queue, resources_dir)
+        if history_file is not None:
+            # Only pages crawled in this run are sightings. A region's missing offers count as delisted only
+            # when this run walked all of its pages: none failed, none was done by an earlier run, no --pages cap
+            holes = {(source, region) for source, region, *_ in queue.failed_tasks()} | queue.done_before(started)
+            with STAGE_SECONDS.time('crawl', 'history'):
+                for source_name in data_files:
+                    for region in args.regions:
+                        full_walk = (args.pages is None and not queue.unfinished()
+                                     and (source_name, region) not in holes)
+                        listed = ([record.link for record in queue.iter_records(source_name, region=region,
+                                                                                 since=started)]
+                                  if full_walk else None)
+                        record_history(history_file, source_name,
+                                       queue.iter_records(source_name, region=region, since=started), started,
+                                       listed=listed, region=region)
+        queue.close()
+    else:
+        from pipeline import make_parse_executor
+
+        scrapers = {source_name: SCRAPERS[source_name](client=client, region=args.regions[0],
+                                                       property_type=args.property_type,
+                                                       transaction=args.transaction)
+                    for source_name in args.source}
+
+        # Parse detail pages on all cores, separately from the network I/O
+        parse_executor = make_parse_executor(args.parse_executor)
+
+        # Process the chosen data sources at the same time, each with its own checkpoint
+        try:
+            data_files = process_data_sources(scrapers, dict.fromkeys(scrapers, args.pages), resources_dir,
+                                              max_workers=args.workers, resume=args.resume,
+                                              incremental=args.incremental, parse_executor=parse_executor,
+                                              output_format=args.output_format, history_file=history_file)
+        finally:
+            if parse_executor is not None:
+                parse_executor.shutdown()
+
+    # Sources not scraped in this run keep their last data file in the combined dataset
+    for source_name in SCRAPERS:
+        data_file = os.path.join(resources_dir, f'{source_name}_data.csv')
+        if source_name not in data_files and os.path.exists(data_file):
+            data_files[source_name] = data_file
+
+    from pipeline import combine_data_files
+
+    # Combine data from all scrapers, dropping the same flat listed on both sites, chunk by chunk
     combined_file = os.path.join(resources_dir, 'combined_data.csv')
-    
-    # Use pandas to combine and save
-    df_olx = pd.DataFrame(data_olx)
-    df_otodom = pd.DataFrame(data_otodom)
-    combined_df = pd.concat([df_olx, df_otodom], ignore_index=True)
-    
-    # Remove duplicates from combined dataset
-    combined_df.drop_duplicates(subset=[Headers.LINK.value], keep='first', inplace=True)
-    
-    # Save combined data
-    combined_df.to_csv(combined_file, index=False, encoding='utf-8')
+    rows = combine_data_files(data_files.values(), combined_file, normalize=args.normalize,
+                              output_format=args.output_format)
+    ROWS_WRITTEN.inc('combined', amount=rows)
     print(f"Combined data saved to {combined_file}")
 
+    report_file = write_report(os.path.join(resources_dir, 'run_report.json'), started, http=client.stats(),
+                               data_files=data_files, combined_file=combined_file)
+    print(f"Run report saved to {report_file}")
+
+    client.close()
+    if metrics_server is not None:
+        metrics_server.shutdown()
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
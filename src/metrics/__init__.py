@@ -0,0 +1,2 @@
+from .exporter import prometheus_text, serve_metrics, write_report
+from .registry import Counter, Histogram, MetricsRegistry, default_registry
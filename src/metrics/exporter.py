@@ -0,0 +1,81 @@
+import json
+import threading
+import time
+
+from .registry import MetricsRegistry, default_registry
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def prometheus_text(registry: MetricsRegistry = None):
+    """The registry in the Prometheus text exposition format."""
+    registry = registry or default_registry
+    lines = []
+    for name, metric in sorted(registry.metrics.items()):
+        lines.append(f'# HELP {name} {metric.help}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        with metric._lock:
+            values = [(labels, value if metric.kind == 'counter' else (list(value[0]), value[1], value[2]))
+                      for labels, value in metric.values.items()]
+        if metric.kind == 'counter':
+            for labels, value in values:
+                lines.append(f'{name}{_labels(metric.labelnames, labels)} {value}')
+            continue
+        for labels, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(metric.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{_labels(metric.labelnames, labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(metric.labelnames, labels)} {total}')
+            lines.append(f'{name}_count{_labels(metric.labelnames, labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def serve_metrics(port: int, registry: MetricsRegistry = None, host: str = '127.0.0.1'):
+    """Serve /metrics in Prometheus format from a daemon thread; call shutdown() on the result to stop."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    registry = registry or default_registry
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = prometheus_text(registry).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
+
+
+def write_report(path: str, started: float, registry: MetricsRegistry = None, **details):
+    """Write a JSON run report: timing of the run, any details given and a snapshot of every metric."""
+    registry = registry or default_registry
+    finished = time.time()
+    report = {
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started)),
+        'finished': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(finished)),
+        'duration_seconds': round(finished - started, 3),
+        **details,
+        'metrics': registry.snapshot(),
+    }
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    return path
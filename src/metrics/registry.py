@@ -0,0 +1,132 @@
+import bisect
+import threading
+import time
+
+
+# Upper bounds in seconds, from cache hits and SQLite commits up to slow page loads
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """Monotonic count per combination of label values."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return [{'labels': dict(zip(self.labelnames, labels)), 'value': value}
+                    for labels, value in self.values.items()]
+
+
+class Histogram:
+    """Bucketed distribution per combination of label values, Prometheus style (cumulative on export)."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (the last one is +Inf), sum, count]
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *labels):
+        """Context manager observing the seconds its block takes."""
+        return _Timer(self, labels)
+
+    def quantile(self, fraction: float, counts, count):
+        """Upper bound of the bucket holding the given quantile (None past the last bucket)."""
+        rank = fraction * count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return None
+
+    def snapshot(self):
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self.values.items()]
+        return [{
+            'labels': dict(zip(self.labelnames, labels)),
+            'count': count,
+            'sum': total,
+            'mean': total / count if count else None,
+            'p50': self.quantile(0.5, counts, count),
+            'p95': self.quantile(0.95, counts, count),
+            'p99': self.quantile(0.99, counts, count),
+        } for labels, counts, total, count in series]
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class MetricsRegistry:
+    """Named counters and histograms of one run.
+
+    Metrics are created on first use and shared afterwards, so every module
+    can ask for the metric it records to without coordinating registration.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labelnames, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self.metrics.get(name)
+                if metric is None:
+                    metric = self.metrics[name] = cls(name, help, labelnames, **kwargs)
+        return metric
+
+    def counter(self, name: str, help: str = '', labelnames=()):
+        return self._get(Counter, name, help, labelnames)
+
+    def histogram(self, name: str, help: str = '', labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help, labelnames, buckets=buckets)
+
+    def snapshot(self):
+        """Metric name -> kind, help and the values of every label combination."""
+        return {name: {'kind': metric.kind, 'help': metric.help, 'series': metric.snapshot()}
+                for name, metric in sorted(self.metrics.items())}
+
+
+# Registry every stage of the scraper records to
+default_registry = MetricsRegistry()
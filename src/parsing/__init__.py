@@ -0,0 +1 @@
+from .backends import Selector, available_backends, get_backend, parse_document, set_backend
@@ -0,0 +1,177 @@
+"""Pluggable HTML parser backends behind one small node API.
+
+Site parsers are written once against Node (select, select_one, text, get,
+strings) with selectors compiled once per backend:
+
+* lxml        - libxml2 tree with CSS selectors compiled to XPath; needs lxml and cssselect
+* html.parser - BeautifulSoup on the standard library parser; always available
+"""
+import os
+
+
+PREFERRED_BACKENDS = ('lxml', 'html.parser')
+
+_backend = None
+
+
+class Selector:
+    """CSS selector compiled lazily, once per backend."""
+
+    def __init__(self, css: str):
+        self.css = css
+        self._compiled = {}
+
+    def compiled(self, backend: str):
+        compiled = self._compiled.get(backend)
+        if compiled is None:
+            compiled = self._compiled[backend] = _BACKENDS[backend].compile(self.css)
+        return compiled
+
+    def __repr__(self):
+        return f'Selector({self.css!r})'
+
+
+class SoupNode:
+    __slots__ = ('tag',)
+    backend = 'html.parser'
+
+    def __init__(self, tag):
+        self.tag = tag
+
+    def select(self, selector: Selector):
+        return [SoupNode(tag) for tag in selector.compiled(self.backend).select(self.tag)]
+
+    def select_one(self, selector: Selector):
+        tag = selector.compiled(self.backend).select_one(self.tag)
+        return SoupNode(tag) if tag is not None else None
+
+    @property
+    def text(self):
+        return self.tag.get_text()
+
+    def get(self, attribute: str, default=None):
+        value = self.tag.get(attribute, default)
+        return ' '.join(value) if isinstance(value, list) else value
+
+    def strings(self):
+        """Visible text nodes in document order (no scripts, styles or comments)."""
+        return self.tag.strings
+
+
+class LxmlNode:
+    __slots__ = ('element',)
+    backend = 'lxml'
+
+    def __init__(self, element):
+        self.element = element
+
+    def select(self, selector: Selector):
+        return [LxmlNode(element) for element in selector.compiled(self.backend)(self.element)]
+
+    def select_one(self, selector: Selector):
+        found = selector.compiled(self.backend)(self.element)
+        return LxmlNode(found[0]) if found else None
+
+    @property
+    def text(self):
+        return ''.join(_LxmlBackend.visible_text(self.element))
+
+    def get(self, attribute: str, default=None):
+        return self.element.get(attribute, default)
+
+    def strings(self):
+        """Visible text nodes in document order (no scripts, styles or comments)."""
+        return _LxmlBackend.visible_text(self.element)
+
+
+class _SoupBackend:
+    name = 'html.parser'
+
+    @staticmethod
+    def available():
+        return True
+
+    @staticmethod
+    def compile(css: str):
+        import soupsieve
+        return soupsieve.compile(css)
+
+    @staticmethod
+    def parse(content):
+        from bs4 import BeautifulSoup
+        return SoupNode(BeautifulSoup(content, 'html.parser'))
+
+
+class _LxmlBackend:
+    name = 'lxml'
+    _visible_text = None
+    _parser = None
+
+    @staticmethod
+    def available():
+        try:
+            import cssselect  # noqa: F401
+            import lxml.html  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    @staticmethod
+    def compile(css: str):
+        from cssselect import HTMLTranslator
+        from lxml import etree
+        # 'descendant::' matches BeautifulSoup's select, which never returns the context node itself
+        return etree.XPath(HTMLTranslator().css_to_xpath(css, prefix='descendant::'))
+
+    @classmethod
+    def visible_text(cls, element):
+        if cls._visible_text is None:
+            from lxml import etree
+            cls._visible_text = etree.XPath('descendant-or-self::text()[not(ancestor::script or ancestor::style)]')
+        return cls._visible_text(element)
+
+    @classmethod
+    def parse(cls, content):
+        import lxml.html
+        if cls._parser is None:
+            # The scraped sites are UTF-8; without this libxml2 falls back to Latin-1 for undeclared pages
+            cls._parser = lxml.html.HTMLParser(encoding='utf-8')
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        if not content.strip():
+            content = b'<html></html>'
+        return LxmlNode(lxml.html.document_fromstring(content, parser=cls._parser))
+
+
+_BACKENDS = {backend.name: backend for backend in (_LxmlBackend, _SoupBackend)}
+
+
+def available_backends():
+    return [backend for backend in PREFERRED_BACKENDS if _BACKENDS[backend].available()]
+
+
+def set_backend(backend: str):
+    """Select the parser backend used by parse_document for the whole process."""
+    global _backend
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown HTML parser backend: {backend}")
+    if not _BACKENDS[backend].available():
+        raise ImportError(f"HTML parser backend {backend} is not installed")
+    _backend = backend
+
+
+def get_backend():
+    """Backend chosen with set_backend, the SCRAPER_HTML_PARSER variable, or the fastest installed one."""
+    global _backend
+    if _backend is None:
+        requested = os.environ.get('SCRAPER_HTML_PARSER')
+        if requested:
+            set_backend(requested)
+        else:
+            _backend = available_backends()[0]
+    return _backend
+
+
+def parse_document(content, backend: str = None):
+    """Parse an HTML document and return its root Node."""
+    return _BACKENDS[backend or get_backend()].parse(content)
@@ -0,0 +1,63 @@
+"""Ad data embedded in pages as JSON, located without building a DOM.
+
+Otodom is a Next.js site and ships the whole ad in <script id="__NEXT_DATA__">;
+OLX assigns its store to window.__PRERENDERED_STATE__ as a JSON string. These
+helpers find the blobs with plain byte searches and return the decoded JSON,
+or None when a page has none.
+"""
+import json
+import re
+
+
+NEXT_DATA_MARKER = b'id="__NEXT_DATA__"'
+PRERENDERED_STATE_MARKER = b'window.__PRERENDERED_STATE__'
+SCRIPT_END = b'</script>'
+HTML_TAG_PATTERN = re.compile(r'<[^>]+>')
+
+
+def _script_body(content: bytes, marker: bytes):
+    """Bytes between the end of the tag holding marker and its </script>, or None."""
+    start = content.find(marker)
+    if start < 0:
+        return None
+    start = content.find(b'>', start)
+    end = content.find(SCRIPT_END, start)
+    if start < 0 or end < 0:
+        return None
+    return content[start + 1:end]
+
+
+def next_data(content: bytes):
+    """Decoded __NEXT_DATA__ of a Next.js page."""
+    body = _script_body(content, NEXT_DATA_MARKER)
+    if body is None:
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+def prerendered_state(content: bytes):
+    """Decoded window.__PRERENDERED_STATE__ of an OLX page."""
+    start = content.find(PRERENDERED_STATE_MARKER)
+    if start < 0:
+        return None
+    end = content.find(SCRIPT_END, start)
+    script = content[start + len(PRERENDERED_STATE_MARKER):end if end >= 0 else None].decode('utf-8', 'replace')
+    index = script.find('=') + 1
+    if index == 0:
+        return None
+    while index < len(script) and script[index].isspace():
+        index += 1
+    try:
+        # The state is a JSON document inside a JavaScript string literal
+        value, _ = json.JSONDecoder().raw_decode(script, index)
+        return json.loads(value) if isinstance(value, str) else value
+    except ValueError:
+        return None
+
+
+def html_text(html: str):
+    """Text of an HTML fragment from a JSON field, like the description."""
+    return HTML_TAG_PATTERN.sub('', html or '')
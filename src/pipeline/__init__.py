@@ -0,0 +1,13 @@
+from lazy import lazy_exports
+
+# Stages load with their first use, so parse workers importing pipeline.stages skip numpy and tqdm
+__all__ = ['normalize_offers', 'reextract_cache', 'make_parse_executor', 'stream_source', 'export_crawl', 'run_crawl',
+           'seed_tasks', 'combine_data_files']
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'normalize_offers': 'normalize',
+    'reextract_cache': 'reextract',
+    'make_parse_executor': 'stages',
+    'stream_source': 'streaming',
+    'export_crawl': 'crawl', 'run_crawl': 'crawl', 'seed_tasks': 'crawl',
+    'combine_data_files': 'combine',
+})
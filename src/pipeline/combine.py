@@ -0,0 +1,104 @@
+"""Merge of the per-source data files into the combined dataset, chunk by chunk.
+
+The data files are read chunk_size rows at a time. Each chunk is
+deduplicated against the earlier ones through a DiskDedupIndex, whose keys
+live in a scratch SQLite file, normalized and appended to the combined CSV,
+and to its dataset when a Parquet or Feather copy is asked for. Only a few
+chunks are in memory at once, so peak memory depends on chunk_size rather
+than on the size of the dataset.
+"""
+import os
+
+from .stages import STAGE_SECONDS
+
+CHUNK_SIZE = 20000
+
+
+def read_chunks(data_files, chunk_size: int = CHUNK_SIZE, usecols=None):
+    """Yield the rows of the data files as typed DataFrames (see records.typed_frame) of up to chunk_size rows."""
+    import pandas as pd
+
+    from records import typed_frame
+
+    # Text as written, empty fields as missing values, as a whole-file pd.read_csv reads them
+    for data_file in data_files:
+        with pd.read_csv(data_file, dtype=str, chunksize=chunk_size, usecols=usecols) as reader:
+            for chunk in reader:
+                yield chunk if usecols else typed_frame(chunk)
+
+
+def combine_data_files(data_files, combined_file: str, normalize: bool = True, output_format: str = 'csv',
+                       chunk_size: int = CHUNK_SIZE):
+    """Write the offers of the data files, deduplicated across sources and normalized, to combined_file.
+
+    With output_format 'parquet' or 'feather' the combined dataset is written
+    next to it (see storage.columnar). The CSV is moved into place once it is
+    complete; the number of rows written is returned.
+    """
+    from storage import DiskDedupIndex, dataset_path, deduplicate, write_frames_dataset
+    from .normalize import CATEGORY_COLUMNS, category_values, normalize_offers
+
+    data_files = list(data_files)
+    categories = None
+    if normalize and output_format != 'csv':
+        # Feather files take one set of categories per column, so they are collected in a first, narrow pass
+        with STAGE_SECONDS.time('combined', 'categories'):
+            categories = category_values(read_chunks(data_files, chunk_size,
+                                                     usecols={raw.value for raw in CATEGORY_COLUMNS}.__contains__))
+
+    temp_file = combined_file + '.tmp'
+    index = DiskDedupIndex(combined_file + '.keys.db')
+    written = 0
+
+    def chunks():
+        nonlocal written
+        import pandas as pd
+
+        from records import typed_frame
+
+        loaded = read_chunks(data_files, chunk_size)
+        while True:
+            with STAGE_SECONDS.time('combined', 'load'):
+                chunk = next(loaded, None)
+            if chunk is None:
+                break
+            with STAGE_SECONDS.time('combined', 'dedup'):
+                chunk = deduplicate(chunk, index=index)
+            if normalize:
+                with STAGE_SECONDS.time('combined', 'normalize'):
+                    chunk = normalize_offers(chunk, categories=categories)
+            with STAGE_SECONDS.time('combined', 'write_csv'):
+                chunk.to_csv(temp_file, mode='a' if written else 'w', header=not written, index=False,
+                             encoding='utf-8')
+            written += len(chunk)
+            yield chunk
+
+        if not written:
+            # No rows at all still makes a file with the header
+            empty = typed_frame(pd.DataFrame())
+            if normalize:
+                empty = normalize_offers(empty, categories=categories)
+            empty.to_csv(temp_file, index=False, encoding='utf-8')
+
+    # The stages above are timed per chunk; 'total' includes the dataset writes, during which pyarrow
+    # draws the chunks on a thread of its own
+    try:
+        with STAGE_SECONDS.time('combined', 'total'):
+            if output_format != 'csv':
+                dataset_dir = write_frames_dataset(chunks(), dataset_path(combined_file, output_format),
+                                                   output_format, normalized=normalize)
+                print(f"Combined dataset saved to {dataset_dir}")
+            else:
+                for _ in chunks():
+                    pass
+    except BaseException:
+        # combined_file keeps its previous contents; the partial one is of no use
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    finally:
+        index.remove()
+
+    os.replace(temp_file, combined_file)
+    print(f"Removed {index.duplicate_offers} duplicate offers and {index.duplicate_flats} flats listed on both sites")
+    return written
@@ -0,0 +1,220 @@
+"""Sharded crawl: (source, region, listing page) tasks from a WorkQueue, spread over worker processes.
+
+Every task is one listing page of one source and region. A worker leases a
+task, fetches and parses the listing page, scrapes the details of its offers
+and stores the merged records with the task completion; the first page of a
+region also queues the remaining pages, as many as it reports (or, without a
+page count, each page queues the next one until a page brings no new offers).
+Leases are kept alive by a heartbeat while the worker is busy, so a task of
+a crashed worker goes back to the queue once its lease expires, and the
+crawl can be resumed or scaled out by starting more workers on the same
+queue file at any time.
+
+Offers whose details fail keep their listing values and go to the source's
+RetryQueue, from where the next regular run retries them.
+"""
+import asyncio
+import functools
+import multiprocessing
+import os
+import socket
+
+from fetching import AsyncFetcher, ConcurrencyController, HttpClient, ResponseCache, format_stats
+from scrapers import SCRAPERS
+from storage import DiskDedupIndex, RetryQueue, WorkQueue
+from storage.checkpoint import write_records
+from storage.retry_queue import PARSE_ERROR, classify_failure
+from .stages import OFFER_FAILURES, PARSE_SECONDS, count_fields, has_details, timed_parse
+
+
+def build_scraper(source: str, region: str, client: HttpClient, rate_limit: float = 5.0, **options):
+    """Scraper of one source and region; options are the scraper's search settings (property_type, ...)."""
+    return SCRAPERS[source](rate_limit=rate_limit, client=client, region=region, **options)
+
+
+def seed_tasks(queue: WorkQueue, sources, regions):
+    """Queue the first listing page of every source and region; returns how many tasks were new."""
+    return queue.add_tasks((source, region, 1) for source in sources for region in regions)
+
+
+async def crawl_worker(queue: WorkQueue, client: HttpClient, owner: str = None, make_scraper=build_scraper,
+                       pages=None, tasks=4, max_workers=32, parse_executor=None, retries_dir=None, poll=1.0,
+                       adaptive=True):
+    """Work on queue tasks until none are left unfinished; returns the number of tasks completed.
+
+    tasks listing pages are worked on at a time, their detail pages sharing
+    max_workers requests in flight. make_scraper(source, region, client) builds
+    the scraper of a task's shard; pages caps the listing pages of every shard.
+    """
+    owner = owner or f'{socket.gethostname()}-{os.getpid()}'
+    loop = asyncio.get_running_loop()
+    controller = ConcurrencyController(max_limit=max_workers) if adaptive else None
+    fetcher = AsyncFetcher(max_concurrency=max_workers, client=client, controller=controller)
+    scrapers = {}
+    retry_queues = {}
+    held = set()
+    state = {'completed': 0, 'failed': 0, 'lost': 0}
+
+    def scraper_of(source, region):
+        if (source, region) not in scrapers:
+            scrapers[source, region] = make_scraper(source, region, client)
+        return scrapers[source, region]
+
+    def retries_of(source):
+        if retries_dir is None:
+            return None
+        if source not in retry_queues:
+            retry_queues[source] = RetryQueue(os.path.join(retries_dir, f'{source}_retries.db'))
+        return retry_queues[source]
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(queue.lease_seconds / 3)
+            for task_id in queue.heartbeat(owner, list(held)):
+                print(f"{owner}: lease of task {task_id} expired and was taken over")
+
+    async def scrape_details(source, record):
+        retries = retries_of(source)
+
+        def fail(kind, error):
+            print(f"Error processing {record.link} ({kind}): {error}")
+            OFFER_FAILURES.inc(source, kind)
+            if retries is not None:
+                retries.add_failure(record.link, record, kind, error)
+
+        result = await fetcher.fetch(record.link)
+        if not result.ok:
+            fail(classify_failure(result.status, result.timed_out), result.error or f"HTTP {result.status}")
+            return None
+        try:
+            if parse_executor is None:
+                data, seconds = timed_parse(record.link, result.content)
+            else:
+                data, seconds = await loop.run_in_executor(parse_executor, timed_parse, record.link, result.content)
+            PARSE_SECONDS.observe(seconds, source, 'detail')
+            if not has_details(data):
+                raise ValueError("No offer details found on the page")
+            return data
+        except Exception as e:
+            fail(PARSE_ERROR, str(e))
+            return None
+
+    async def crawl_page(task_id, source, region, page):
+        scraper = scraper_of(source, region)
+        # Listing pages change often, so cached copies are always revalidated
+        result = await fetcher.fetch(scraper.page_url(page), max_age=0)
+        if not result.ok:
+            raise RuntimeError(result.error or f"HTTP {result.status}")
+        with PARSE_SECONDS.time(source, 'listing'):
+            records = scraper.parse_page(result.content)
+
+        if page == 1 and queue.page_count(source, region) is None:
+            count = scraper.page_count(result.content)
+            if count is not None:
+                queue.set_page_count(source, region, count)
+                last = min(count, pages) if pages is not None else count
+                queue.add_tasks((source, region, later) for later in range(2, last + 1))
+
+        # Offers stored by an earlier page (OLX repeats promoted ones on every page) are not scraped again
+        stored = queue.stored_links(source, region, [record.link for record in records])
+        records = [record for record in records if record.link and record.link not in stored]
+        for record in records:
+            record.source = source
+        details = await asyncio.gather(*[scrape_details(source, record) for record in records])
+        parsed = [data for data in details if data is not None]
+        count_fields(source, parsed)
+        for record, data in zip(records, details):
+            if data is not None:
+                record.update(data)
+
+        added = queue.complete(task_id, owner, records)
+        if added is None:
+            state['lost'] += 1
+            return
+        state['completed'] += 1
+        if retries_of(source) is not None:
+            retries_of(source).resolve([record.link for record, data in zip(records, details) if data is not None])
+
+        # Without a page count, a page that still brought new offers queues the next one
+        if queue.page_count(source, region) is None and added and (pages is None or page < pages):
+            queue.add_tasks([(source, region, page + 1)])
+
+    async def work():
+        while True:
+            leased = queue.lease(owner)
+            if not leased:
+                if not queue.unfinished():
+                    return
+                # Other workers may still queue pages, or crash and leave their tasks to us
+                await asyncio.sleep(poll)
+                continue
+            task_id, source, region, page = leased[0]
+            held.add(task_id)
+            try:
+                await crawl_page(task_id, source, region, page)
+            except Exception as e:
+                print(f"Error processing {source} {region} listing page {page}: {str(e)}")
+                state['failed'] += 1
+                queue.fail(task_id, owner, str(e))
+            finally:
+                held.discard(task_id)
+
+    client_stats = client.stats()
+    beat = asyncio.create_task(heartbeat())
+    try:
+        await asyncio.gather(*[work() for _ in range(tasks)])
+    finally:
+        beat.cancel()
+        fetcher.close()
+        for retries in retry_queues.values():
+            retries.close()
+
+    print(f"{owner}: {state['completed']} listing pages completed, {state['failed']} failed, "
+          f"{state['lost']} lost to an expired lease")
+    print(f"{owner} HTTP: {format_stats(client.stats(), since=client_stats)}")
+    return state['completed']
+
+
+def run_worker(queue_path: str, cache_dir: str = None, offline: bool = False, lease_seconds: float = 60.0,
+               **options):
+    """Run one crawl worker in this process, with its own HTTP client; options go to crawl_worker."""
+    queue = WorkQueue(queue_path, lease_seconds=lease_seconds)
+    client = HttpClient(cache=ResponseCache(cache_dir) if cache_dir else None, offline=offline)
+    try:
+        return asyncio.run(crawl_worker(queue, client, **options))
+    finally:
+        client.close()
+        queue.close()
+
+
+def run_crawl(queue_path: str, processes: int = None, rate_limit: float = 5.0, make_scraper=build_scraper,
+              scraper_options: dict = None, **options):
+    """Run processes crawl workers on the queue and wait for them; options go to run_worker.
+
+    rate_limit is the requests per second per site of the whole crawl, split
+    evenly between the local processes. Workers started on other machines
+    against the same queue bring their own rate limits. scraper_options are
+    passed on to make_scraper.
+    """
+    processes = processes or os.cpu_count()
+    make_scraper = functools.partial(make_scraper, rate_limit=rate_limit / processes, **(scraper_options or {}))
+    workers = [multiprocessing.Process(target=run_worker, args=(queue_path,),
+                                       kwargs={**options, 'make_scraper': make_scraper}, name=f'crawl-{i}')
+               for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return [worker.exitcode for worker in workers]
+
+
+def export_crawl(queue: WorkQueue, resources_dir: str):
+    """Write the crawled records of every source to <source>_data.csv; returns the data files by source."""
+    data_files = {}
+    for source in queue.sources():
+        data_file = os.path.join(resources_dir, f'{source}_data.csv')
+        rows = write_records(queue.iter_records(source), data_file,
+                             index=DiskDedupIndex(data_file + '.keys.db', cross_source=False))
+        print(f"Exported {rows} crawled {source} offers to {data_file}")
+        data_files[source] = data_file
+    return data_files
@@ -0,0 +1,145 @@
+"""Vectorized cleanup of a whole dataset after scraping.
+
+The parsers store values roughly as the sites show them, and OLX and Otodom
+differ ('Blok' vs 'blok', 'parter/4' vs '1', 'brak informacji' for missing
+values). normalize_offers() turns the raw Headers columns into typed
+NormalizedHeaders columns in a few column-wide pandas operations, leaving the
+raw columns as they are.
+"""
+import datetime
+
+from headers import Headers, NormalizedHeaders
+
+# Text the sites show instead of leaving a field out
+MISSING_TEXT = ('brak informacji', 'brak danych', 'zapytaj', '-', '')
+
+NUMERIC_COLUMNS = {
+    Headers.M2: NormalizedHeaders.M2,
+    Headers.TOTAL_PRICE: NormalizedHeaders.TOTAL_PRICE,
+    Headers.PRICE_PER_M2: NormalizedHeaders.PRICE_PER_M2,
+    Headers.RENT: NormalizedHeaders.RENT,
+    Headers.ROOMS: NormalizedHeaders.ROOMS,
+}
+
+CATEGORY_COLUMNS = {
+    Headers.BUILDING_TYPE: NormalizedHeaders.BUILDING_TYPE,
+    Headers.MARKET: NormalizedHeaders.MARKET,
+    Headers.HEATING: NormalizedHeaders.HEATING,
+    Headers.FINISH_CONDITION: NormalizedHeaders.FINISH_CONDITION,
+    Headers.OWNERSHIP_FORM: NormalizedHeaders.OWNERSHIP_FORM,
+    Headers.ADVERTISER_TYPE: NormalizedHeaders.ADVERTISER_TYPE,
+    Headers.BUILDING_MATERIAL: NormalizedHeaders.BUILDING_MATERIAL,
+    Headers.WINDOWS: NormalizedHeaders.WINDOWS,
+}
+
+BOOLEAN_VALUES = {'tak': True, 'nie': False, 'yes': True, 'no': False}
+
+# Floors as the sites write them: '3', '3/4', 'parter/4', '> 10/11', '/3'
+FLOOR_PATTERN = r'^(?P<floor>parter|suterena|>\s*10|\d+)?\s*(?:/\s*(?P<total>\d+))?$'
+FLOOR_NAMES = {'parter': 0, 'suterena': -1}
+
+MIN_BUILDING_YEAR = 1800
+BUILDING_YEARS_AHEAD = 10
+
+
+def _text(df, header):
+    """Stripped, lowercased text of a column with the missing-value markers as NA."""
+    import pandas as pd
+
+    if header.value not in df:
+        return pd.Series(pd.NA, index=df.index, dtype='string')
+    values = df[header.value].astype('string').str.strip().str.lower()
+    return values.mask(values.isin(MISSING_TEXT))
+
+
+def _number(df, header):
+    """Float64 values of a column, parsing text like '255 000 zł' or '54,37 m²'."""
+    import pandas as pd
+
+    if header.value not in df:
+        return pd.Series(pd.NA, index=df.index, dtype='Float64')
+    values = df[header.value]
+    if not pd.api.types.is_numeric_dtype(values):
+        values = (_text(df, header)
+                  .str.replace(r'm²|m2|zł/m²', '', regex=True)
+                  .str.replace(r'[^\d,.\-]', '', regex=True)
+                  .str.replace(',', '.', regex=False))
+    return pd.to_numeric(values, errors='coerce').astype('Float64')
+
+
+def normalize_floors(values):
+    """(floor, total floors) as Float64 from raw piętro text; '> 10' only resolves in an 11-floor building."""
+    import pandas as pd
+
+    parts = values.str.replace(r'\s+', ' ', regex=True).str.extract(FLOOR_PATTERN)
+    named = parts['floor'].map(FLOOR_NAMES)
+    floor = pd.to_numeric(parts['floor'].where(named.isna()), errors='coerce').astype('Float64')
+    floor = floor.fillna(named.astype('Float64'))
+    total = pd.to_numeric(parts['total'], errors='coerce').astype('Float64')
+    above_ten = parts['floor'].str.startswith('>').fillna(False)
+    floor = floor.mask(above_ten & total.eq(11).fillna(False), 11.0)
+    # A floor above the top floor means one of the two is wrong
+    invalid = (floor > total).fillna(False)
+    return floor.mask(invalid), total.mask(invalid)
+
+
+def category_values(chunks):
+    """NormalizedHeaders category column -> sorted values found in an iterable of DataFrame chunks.
+
+    For normalizing a dataset chunk by chunk with the same categories in every
+    chunk; only the raw category columns of each chunk are looked at.
+    """
+    values = {normalized.value: set() for normalized in CATEGORY_COLUMNS.values()}
+    for chunk in chunks:
+        for raw, normalized in CATEGORY_COLUMNS.items():
+            values[normalized.value].update(_text(chunk, raw).dropna().unique())
+    return {column: sorted(found) for column, found in values.items()}
+
+
+def normalize_offers(df, today: datetime.date = None, categories: dict = None):
+    """Copy of df with NormalizedHeaders columns added next to the raw Headers columns.
+
+    Numbers become Float64, piętro splits into floor number and total floors
+    (parter is 0), rok budowy outside 1800..today+10 becomes NA, dostępne od
+    becomes a date, winda a nullable boolean and the categorical columns
+    lowercase categories. A missing cena za metr is recomputed from cena and
+    powierzchnia. categories (see category_values) fixes the categories of
+    those columns, so that chunks of one dataset share them.
+    """
+    import pandas as pd
+
+    today = today or datetime.date.today()
+    columns = {}
+
+    for raw, normalized in NUMERIC_COLUMNS.items():
+        columns[normalized.value] = _number(df, raw)
+
+    # Prices and areas of 0 are placeholders
+    for normalized in (NormalizedHeaders.M2, NormalizedHeaders.TOTAL_PRICE, NormalizedHeaders.PRICE_PER_M2):
+        values = columns[normalized.value]
+        columns[normalized.value] = values.mask(values <= 0)
+    price = columns[NormalizedHeaders.TOTAL_PRICE.value]
+    area = columns[NormalizedHeaders.M2.value]
+    price_per_m2 = columns[NormalizedHeaders.PRICE_PER_M2.value]
+    columns[NormalizedHeaders.PRICE_PER_M2.value] = price_per_m2.fillna((price / area).round())
+
+    floor, total_floors = normalize_floors(_text(df, Headers.FLOOR))
+    columns[NormalizedHeaders.FLOOR.value] = floor
+    columns[NormalizedHeaders.TOTAL_FLOORS.value] = total_floors
+
+    year = _number(df, Headers.BUILDING_YEAR).round()
+    columns[NormalizedHeaders.BUILDING_YEAR.value] = year.where(
+        (year >= MIN_BUILDING_YEAR) & (year <= today.year + BUILDING_YEARS_AHEAD)
+    )
+
+    columns[NormalizedHeaders.AVAILABLE_FROM.value] = pd.to_datetime(
+        _text(df, Headers.AVAILABLE_FROM), format='%Y-%m-%d', errors='coerce'
+    )
+    columns[NormalizedHeaders.ELEVATOR.value] = _text(df, Headers.ELEVATOR).map(BOOLEAN_VALUES).astype('boolean')
+
+    for raw, normalized in CATEGORY_COLUMNS.items():
+        dtype = pd.CategoricalDtype(categories[normalized.value]) if categories else 'category'
+        columns[normalized.value] = _text(df, raw).astype(dtype)
+
+    normalized = pd.DataFrame(columns, index=df.index)
+    return pd.concat([df.drop(columns=[column for column in normalized if column in df]), normalized], axis=1)
@@ -0,0 +1,69 @@
+"""Re-extract every offer page in the HTTP cache without touching the network.
+
+Used after a parser fix: pages are read and parsed inside the pool workers,
+so only urls and finished records cross process boundaries and the work
+scales across all cores.
+"""
+import time
+
+from fetching.cache import read_cached_body
+from records import OfferBatch
+from scrapers import is_offer_url
+from .stages import StageStats, make_parse_executor, timed_parse
+
+
+def parse_cached_offer(root: str, url: str):
+    """Read and parse one cached offer page; returns (record, read seconds, parse seconds, page bytes)."""
+    start = time.perf_counter()
+    try:
+        content = read_cached_body(root, url)
+    except (OSError, EOFError):
+        return None, time.perf_counter() - start, 0.0, 0
+    read_seconds = time.perf_counter() - start
+    data, seconds = timed_parse(url, content)
+    return data, read_seconds, seconds, len(content)
+
+
+def reextract_cache(cache, data_file: str, executor_kind: str = 'process', workers: int = None,
+                    chunksize: int = 16, chunk_rows: int = 1000):
+    """Parse all cached offer pages into data_file and return the number of records written.
+
+    Listing-card fields (title, location, listing price) are not in the cache's
+    offer pages, and the source is taken from each offer's domain.
+    """
+    urls = [url for url in cache.urls() if is_offer_url(url)]
+    read_stats = StageStats('read')
+    parse_stats = StageStats('parse')
+    executor = make_parse_executor(executor_kind, workers)
+
+    def tasks():
+        if executor is None:
+            return (parse_cached_offer(cache.root, url) for url in urls)
+        return executor.map(parse_cached_offer, [cache.root] * len(urls), urls, chunksize=chunksize)
+
+    written = 0
+    chunk = OfferBatch()
+    try:
+        for record, read_seconds, seconds, size in tasks():
+            if record is None:
+                continue
+            read_stats.add(read_seconds, size)
+            parse_stats.add(seconds, size)
+            record.source = 'otodom' if 'otodom' in record.link else 'olx'
+            chunk.append(record)
+            if len(chunk) >= chunk_rows:
+                chunk.to_frame().to_csv(data_file, mode='a' if written else 'w', header=not written, index=False,
+                                        encoding='utf-8')
+                written += len(chunk)
+                chunk = OfferBatch()
+        if chunk or not written:
+            chunk.to_frame().to_csv(data_file, mode='a' if written else 'w', header=not written, index=False,
+                                    encoding='utf-8')
+            written += len(chunk)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    print(f"Re-extracted {written} of {len(urls)} cached offer pages into {data_file}")
+    print(f"{read_stats.summary()}; {parse_stats.summary()}")
+    return written
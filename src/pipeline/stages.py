@@ -0,0 +1,95 @@
+"""Executors and bookkeeping for the CPU-bound parse stage.
+
+HTML parsing holds the GIL, so doing it on the fetch threads serializes the
+whole pipeline. The parse stage instead runs in its own pool: processes by
+default, so that it scales across cores, with raw page bytes passed in and
+OfferRecords passed back.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from metrics import default_registry
+from parsing import get_backend, set_backend
+from records import FIELDS
+from scrapers import parse_offer_details
+
+
+EXECUTOR_KINDS = ('process', 'thread', 'inline')
+
+PARSE_SECONDS = default_registry.histogram(
+    'scraper_parse_seconds', 'Time to parse one page, per source and page kind', ('source', 'page'))
+OFFERS_PARSED = default_registry.counter(
+    'scraper_offers_parsed_total', 'Offer pages parsed into a record', ('source',))
+FIELDS_EXTRACTED = default_registry.counter(
+    'scraper_fields_extracted_total',
+    'Parsed offers with a value per field; over scraper_offers_parsed_total this is the hit rate',
+    ('source', 'field'))
+OFFER_FAILURES = default_registry.counter(
+    'scraper_offer_failures_total', 'Offers whose details failed, per failure kind', ('source', 'kind'))
+STAGE_SECONDS = default_registry.histogram(
+    'scraper_stage_seconds', 'Wall time of the stages that process a whole dataset', ('source', 'stage'))
+
+
+def make_parse_executor(kind: str = 'process', workers: int = None):
+    """Pool for the parse stage; 'inline' returns None and parses on the event loop thread."""
+    if kind == 'process':
+        # Workers use the parent's parser backend even when started with spawn
+        return ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=set_backend,
+                                   initargs=(get_backend(),))
+    if kind == 'thread':
+        return ThreadPoolExecutor(max_workers=workers or os.cpu_count(), thread_name_prefix='parse')
+    if kind == 'inline':
+        return None
+    raise ValueError(f"Unknown parse executor {kind}, expected one of {', '.join(EXECUTOR_KINDS)}")
+
+
+def timed_parse(link: str, content: bytes):
+    """Parse an offer page in a pool worker, returning the OfferRecord and the seconds it took."""
+    start = time.perf_counter()
+    data = parse_offer_details(link, content)
+    return data, time.perf_counter() - start
+
+
+def has_details(record):
+    """True if a parsed offer has a title, a price or an area.
+
+    Block pages and layout changes parse without error into records with
+    nothing in them; they count as failed rather than as scraped.
+    """
+    return record.title is not None or record.total_price is not None or record.m2 is not None
+
+
+def count_fields(source: str, records):
+    """Count the parsed records and, per field, those that have a value."""
+    counts = dict.fromkeys(FIELDS, 0)
+    for record in records:
+        for field in FIELDS:
+            if getattr(record, field) is not None:
+                counts[field] += 1
+    OFFERS_PARSED.inc(source, amount=len(records))
+    for field, count in counts.items():
+        FIELDS_EXTRACTED.inc(source, field, amount=count)
+
+
+class StageStats:
+    """Items, bytes and busy time of one pipeline stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.bytes = 0
+        self.busy = 0.0
+        self.started = time.perf_counter()
+
+    def add(self, seconds: float, size: int = 0):
+        self.items += 1
+        self.bytes += size
+        self.busy += seconds
+
+    def summary(self):
+        wall = time.perf_counter() - self.started
+        throughput = self.items / wall if wall else 0.0
+        mean = self.busy / self.items * 1000 if self.items else 0.0
+        return (f"{self.name}: {self.items} pages, {throughput:.1f} pages/s, {mean:.1f} ms/page, "
+                f"{self.bytes / 2**20:.1f} MiB")
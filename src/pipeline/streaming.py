@@ -0,0 +1,270 @@
+"""Listing pages and detail pages of one source as a single streaming pipeline.
+
+A producer walks the listing pages and pushes every new offer link into a
+bounded queue as soon as its page is parsed; detail workers consume the
+queue concurrently. The page count is read from the first listing page and
+the following pages are fetched a window at a time, concurrently with the
+detail pages, but merged in page order; the walk stops at the first page
+without new links, or, when the page count is unknown, once the first page
+or MAX_FAILED_PAGES pages in a row fail. The queue bound gives backpressure,
+so listing pages are never fetched far ahead of the detail workers, and
+parsed records are checkpointed as they come.
+
+Fetching and parsing are separate stages: workers only wait on I/O and hand
+the raw page bytes to the parse executor (see pipeline.stages).
+
+When the fetcher has a ConcurrencyController, parsed records are committed in
+batches of controller.batch_size() and the progress bar shows the current
+concurrency limit and p95 latency.
+
+Offers whose details fail are not dropped: with a RetryQueue each failure is
+classified and rescheduled with backoff. Retries that fall due within
+retry_wait seconds run at the end of the scrape, later ones in the next run.
+"""
+import asyncio
+import collections
+import contextlib
+import itertools
+import time
+
+from tqdm import tqdm
+
+from storage.retry_queue import PARSE_ERROR, classify_failure
+from .stages import OFFER_FAILURES, PARSE_SECONDS, StageStats, count_fields, has_details, timed_parse
+
+
+_DONE = object()
+# Listing pages in a row that may fail before a walk without a known page count gives up
+MAX_FAILED_PAGES = 3
+
+
+async def stream_source(scraper, source_name, pages, fetcher, checkpoint, index=None, workers=10, queue_size=None,
+                        parse_executor=None, position=None, retries=None, retry_wait=60.0, listing_window=8,
+                        listed=None):
+    """Scrape one source into checkpoint and return True if every listing page was processed.
+
+    pages caps the listing pages walked; None walks all pages the site reports.
+
+    With an OfferIndex, only offers that are new or changed are queued for details.
+    With a RetryQueue, failed offers are retried (see the module docstring).
+    Detail pages are parsed in parse_executor, or on the event loop thread when it is None.
+    position places the progress bar when several sources run side by side.
+    listed, a set, collects the link of every offer seen on the listing pages.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=queue_size or workers * 4)
+    fetch_stats = StageStats('fetch')
+    parse_stats = StageStats('parse')
+    progress = tqdm(total=0, desc=f"Scraping {source_name} offers", unit='offer', position=position)
+    state = {'pages': 0, 'page_count': None, 'failed_pages': 0, 'failed_offers': 0}
+    controller = getattr(fetcher, 'controller', None)
+    parsed = []
+
+    def batch_size():
+        return controller.batch_size() if controller is not None else 1
+
+    def commit_parsed():
+        if parsed:
+            checkpoint.commit_records(parsed)
+            count_fields(source_name, [record for _, record in parsed])
+            if retries is not None:
+                retries.resolve([record.link for _, record in parsed])
+            parsed.clear()
+
+    def show_state(refresh=True):
+        postfix = {'pages': f"{state['pages']}/{state['page_count'] or '?'}", 'queued': queue.qsize()}
+        if controller is not None:
+            postfix['limit'] = controller.describe()
+            postfix['batch'] = batch_size()
+        progress.set_postfix(postfix, refresh=refresh)
+
+    def enqueue_count(count):
+        progress.total += count
+        progress.refresh()
+
+    async def put_all(items):
+        enqueue_count(len(items))
+        for item in items:
+            await queue.put(item)
+
+    async def produce():
+        # Offers stored by an interrupted run but never scraped go first, then retries left by earlier runs;
+        # an offer can be both, and is queued once
+        items = checkpoint.pending()
+        if retries is not None:
+            queued = {idx for idx, _ in items}
+            items += [item for item in checkpoint.ensure_offers(retries.due()) if item[0] not in queued]
+        await put_all(items)
+
+        # Listing pages are merged in page order; a page without new links means the results ran out
+        seen = set()
+        failed_in_row = 0
+        async with contextlib.aclosing(walk_listing()) as listing:
+            async for page, result in listing:
+                try:
+                    if not result.ok:
+                        raise RuntimeError(result.error or f"HTTP {result.status}")
+                    with PARSE_SECONDS.time(source_name, 'listing'):
+                        records = scraper.parse_page(result.content)
+                except Exception as e:
+                    # Leave the page uncommitted so that resuming retries it
+                    print(f"Error processing {source_name} listing page {page}: {str(e)}")
+                    state['failed_pages'] += 1
+                    failed_in_row += 1
+                    # Without a page count only the early stop below ends the walk, which failing pages never reach
+                    if state['page_count'] is None and (page == 1 or failed_in_row >= MAX_FAILED_PAGES):
+                        print(f"{source_name}: page count unknown and {failed_in_row} listing pages failed "
+                              f"in a row, stopping")
+                        break
+                    continue
+                failed_in_row = 0
+
+                links = {record.link for record in records}
+                if not links - seen:
+                    print(f"{source_name}: listing page {page} has no new offers, stopping")
+                    break
+                seen.update(links)
+                if listed is not None:
+                    listed.update(links)
+
+                for record in records:
+                    record.source = source_name
+                if index is not None:
+                    records = index.changed_records(records)
+
+                added = checkpoint.add_page(page, records)
+                state['pages'] += 1
+                enqueue_count(len(added))
+                show_state()
+                for item in added:
+                    await queue.put(item)
+
+    async def fetch_listing(page):
+        # Listing pages change often, so cached copies are always revalidated
+        return await fetcher.fetch(scraper.page_url(page), max_age=0)
+
+    async def walk_listing():
+        """Yield (page, FetchResult) of the listing pages still to do, in order, fetching listing_window ahead.
+
+        The page count comes from the first page (or the checkpoint when resuming),
+        capped by pages; without one, pages are walked until the early stop.
+        """
+        first = None
+        last = checkpoint.page_count()
+        if last is None:
+            first = await fetch_listing(1)
+            last = scraper.page_count(first.content) if first.ok else None
+            if last is not None:
+                checkpoint.set_page_count(last)
+        if pages is not None:
+            last = min(last, pages) if last is not None else pages
+        state['page_count'] = last
+
+        done_pages = checkpoint.completed_pages()
+        todo = (page for page in itertools.count(1) if page not in done_pages)
+        if last is not None:
+            todo = itertools.takewhile(lambda page: page <= last, todo)
+
+        window = collections.deque()
+
+        def fill_window():
+            for page in itertools.islice(todo, listing_window - len(window)):
+                if page == 1 and first is not None:
+                    task = loop.create_future()
+                    task.set_result(first)
+                else:
+                    task = asyncio.ensure_future(fetch_listing(page))
+                window.append((page, task))
+
+        try:
+            fill_window()
+            while window:
+                page, task = window.popleft()
+                result = await task
+                fill_window()
+                yield page, result
+        finally:
+            for _, task in window:
+                task.cancel()
+
+    async def produce_retries():
+        await put_all(checkpoint.ensure_offers(retries.due()))
+
+    def fail(idx, link, kind, error):
+        print(f"Error processing {link} ({kind}): {error}")
+        state['failed_offers'] += 1
+        OFFER_FAILURES.inc(source_name, kind)
+        if retries is not None:
+            retries.add_failure(link, checkpoint.listing_record(idx), kind, error)
+
+    async def consume():
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                return
+            idx, link = item
+            result = await fetcher.fetch(link)
+            fetch_stats.add(result.elapsed, len(result.content))
+            if not result.ok:
+                fail(idx, link, classify_failure(result.status, result.timed_out),
+                     result.error or f"HTTP {result.status}")
+            else:
+                try:
+                    if parse_executor is None:
+                        data, seconds = timed_parse(link, result.content)
+                    else:
+                        data, seconds = await loop.run_in_executor(parse_executor, timed_parse, link,
+                                                                   result.content)
+                    parse_stats.add(seconds, len(result.content))
+                    PARSE_SECONDS.observe(seconds, source_name, 'detail')
+                    if not has_details(data):
+                        raise ValueError("No offer details found on the page")
+                    parsed.append((idx, data))
+                    if len(parsed) >= batch_size():
+                        commit_parsed()
+                except Exception as e:
+                    fail(idx, link, PARSE_ERROR, str(e))
+            if controller is not None:
+                show_state(refresh=False)
+            progress.update(1)
+
+    async def run_workers(producer):
+        consumers = [asyncio.create_task(consume()) for _ in range(workers)]
+        try:
+            await producer()
+            for _ in consumers:
+                await queue.put(_DONE)
+            await asyncio.gather(*consumers)
+            # Resolves the retries that succeeded before the next round looks at the queue
+            commit_parsed()
+        except BaseException:
+            for consumer in consumers:
+                consumer.cancel()
+            raise
+
+    try:
+        await run_workers(produce)
+
+        # Retry rounds for the failures whose backoff ends within retry_wait
+        deadline = time.time() + retry_wait
+        while retries is not None:
+            next_attempt = retries.next_attempt()
+            if next_attempt is None or next_attempt > deadline:
+                break
+            await asyncio.sleep(max(0.0, next_attempt - time.time()))
+            await run_workers(produce_retries)
+    finally:
+        # Records parsed before a failure are kept as well
+        commit_parsed()
+        progress.close()
+
+    print(f"{source_name}: {state['pages']} listing pages, {progress.n} offers processed, "
+          f"{state['failed_pages']} pages and {state['failed_offers']} offers failed")
+    print(f"{source_name} {fetch_stats.summary()}; {parse_stats.summary()}")
+    if controller is not None:
+        print(f"{source_name} concurrency: {controller.describe()}")
+    if retries is not None:
+        counts = retries.counts()
+        print(f"{source_name} retry queue: {sum(counts['waiting'].values())} offers waiting {counts['waiting']}, "
+              f"{sum(counts['dead'].values())} dead letters {counts['dead']}")
+    return state['failed_pages'] == 0
@@ -0,0 +1,154 @@
+"""Typed offer records and a columnar batch builder, both following Headers.
+
+OfferRecord holds one offer in slots with None for missing values, instead
+of a dict keyed by Polish column names with '' placeholders. OfferBatch
+accumulates records column by column, numeric columns in packed float
+arrays with a missing-value mask, and turns them into a DataFrame with
+nullable Float64 columns and string columns (Arrow-backed when pyarrow is
+installed). Repeated text values (winda 'tak', rynek 'wtórny', ...) are
+stored once per batch.
+"""
+import math
+from array import array
+from dataclasses import fields, make_dataclass
+
+from headers import Headers
+
+# (column name, attribute name) pairs, looked up once rather than per value
+NUMERIC_COLUMNS = tuple((header.value, header.field) for header in Headers if header.numeric)
+TEXT_COLUMNS = tuple((header.value, header.field) for header in Headers if not header.numeric)
+COLUMNS = tuple((header.value, header.field) for header in Headers)
+
+
+def _to_float(value):
+    if value is None or value == '':
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def _to_text(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        # Values read back from a CSV, like a building year of 1978.0
+        return str(int(value)) if value.is_integer() else str(value)
+    return value if isinstance(value, str) else str(value)
+
+
+class _OfferRecordMethods:
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """Build a record from a dict keyed by column names; '', NaN and unparsable numbers become None."""
+        record = cls()
+        for column, field in NUMERIC_COLUMNS:
+            setattr(record, field, _to_float(data.get(column)))
+        for column, field in TEXT_COLUMNS:
+            setattr(record, field, _to_text(data.get(column)))
+        return record
+
+    def to_dict(self):
+        """Column name -> value of the fields that are set."""
+        data = {}
+        for column, field in COLUMNS:
+            value = getattr(self, field)
+            if value is not None:
+                data[column] = value
+        return data
+
+    def update(self, other):
+        """Overwrite fields with the ones set in other."""
+        for _, field in COLUMNS:
+            value = getattr(other, field)
+            if value is not None:
+                setattr(self, field, value)
+        return self
+
+
+OfferRecord = make_dataclass(
+    'OfferRecord',
+    [(header.field, float if header.numeric else str, None) for header in Headers],
+    bases=(_OfferRecordMethods,),
+    slots=True,
+)
+OfferRecord.__doc__ = "One offer, with a slot per Headers column and None for missing values."
+OfferRecord.__module__ = __name__
+
+# Attribute order of OfferRecord, which is the column order of Headers
+FIELDS = tuple(field.name for field in fields(OfferRecord))
+
+
+class OfferBatch:
+    """Columnar builder for many offers, see to_frame()."""
+
+    def __init__(self, records=()):
+        self.numeric = {field: array('d') for _, field in NUMERIC_COLUMNS}
+        self.missing = {field: bytearray() for _, field in NUMERIC_COLUMNS}
+        self.text = {field: [] for _, field in TEXT_COLUMNS}
+        self.strings = {}
+        self.rows = 0
+        self.extend(records)
+
+    def __len__(self):
+        return self.rows
+
+    def append(self, record):
+        """Add an OfferRecord, or a dict keyed by column names."""
+        if isinstance(record, dict):
+            record = OfferRecord.from_dict(record)
+        for field, values in self.numeric.items():
+            value = getattr(record, field)
+            values.append(0.0 if value is None else value)
+            self.missing[field].append(value is None)
+        strings = self.strings
+        for field, values in self.text.items():
+            value = getattr(record, field)
+            values.append(value if value is None else strings.setdefault(value, value))
+        self.rows += 1
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def to_frame(self):
+        """DataFrame in Headers order with Float64 numeric and string text columns."""
+        import numpy as np
+        import pandas as pd
+
+        columns = {}
+        for header in Headers:
+            if header.numeric:
+                columns[header.value] = pd.arrays.FloatingArray(
+                    np.frombuffer(self.numeric[header.field], dtype=np.float64).copy(),
+                    np.frombuffer(self.missing[header.field], dtype=np.bool_).copy(),
+                )
+            else:
+                columns[header.value] = pd.array(self.text[header.field], dtype='string')
+        return pd.DataFrame(columns)
+
+
+def typed_frame(df):
+    """Copy of a DataFrame with Headers columns in Headers order and the dtypes OfferBatch produces.
+
+    For frames read back with pd.read_csv, where a building year comes back
+    as 1978.0 and empty numeric columns as object.
+    """
+    import pandas as pd
+
+    columns = {}
+    for header in Headers:
+        values = df[header.value] if header.value in df else pd.Series(None, index=df.index, dtype=object)
+        if header.numeric:
+            columns[header.value] = pd.to_numeric(values, errors='coerce').astype('Float64')
+        elif isinstance(values.dtype, pd.StringDtype):
+            columns[header.value] = values
+        else:
+            columns[header.value] = values.map(_to_text, na_action='ignore').astype('string')
+    return pd.DataFrame(columns, index=df.index)
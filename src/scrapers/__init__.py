@@ -1,3 +1,51 @@
-from . import webpagescraper
-from . import olxscraper
-from . import otodomscraper
\ No newline at end of file
+import importlib
+from collections.abc import Mapping
+
+from records import OfferRecord
+
+
+class ScraperRegistry(Mapping):
+    """Source name -> scraper class, with each site module imported the first time its class is needed.
+
+    Listing the sources (for the command line, or to seed a crawl) imports
+    nothing; scraping or parsing one source imports only its module.
+    """
+
+    def __init__(self, classes: dict):
+        # name -> (module, class name)
+        self.classes = classes
+
+    def module(self, name: str):
+        return importlib.import_module(self.classes[name][0])
+
+    def __getitem__(self, name: str):
+        module, class_name = self.classes[name]
+        return getattr(importlib.import_module(module), class_name)
+
+    def __iter__(self):
+        return iter(self.classes)
+
+    def __len__(self):
+        return len(self.classes)
+
+
+# Every source main() scrapes, by the name used for its files and the źródło column
+SCRAPERS = ScraperRegistry({
+    'olx': ('scrapers.olxscraper', 'OlxScraper'),
+    'otodom': ('scrapers.otodomscraper', 'OtodomScraper'),
+})
+
+
+def parse_offer_details(link: str, content: bytes):
+    """Parse a downloaded offer page with the parser of the site it belongs to.
+
+    OLX listings often link straight to Otodom offers, so this goes by the
+    offer link rather than by the scraper that found it.
+    """
+    site = SCRAPERS.module('otodom' if 'otodom' in link else 'olx')
+    return OfferRecord.from_dict(site.parse_offer_details(link, content))
+
+
+def is_offer_url(link: str):
+    """True for offer detail pages, as opposed to listing pages."""
+    return '/oferta/' in link
@@ -0,0 +1,68 @@
+"""Declarative field extraction shared by the site parsers.
+
+Each site describes its labelled rows ('Czynsz: 490 zł', 'Rynek: wtórny')
+in a table of label -> FieldRule, in priority order. A page label is
+resolved to its rule once, by the first table label it contains, and the
+answer is cached, so parsing a row costs one dict lookup. The value is then
+read with the rule's precompiled pattern, if any, and converted by the type
+of the column: a float for numeric Headers, stripped text otherwise.
+Adding a field means adding a row to a site table.
+"""
+import re
+from functools import lru_cache
+
+NUMBER_CHARACTERS = re.compile(r'[^\d.,]')
+
+
+class FieldRule:
+    """Headers column filled by a labelled row, with a compiled pattern whose first group is the value.
+
+    Without a pattern the whole value is used. The column name and type are
+    read off the Headers member once here rather than for every row.
+    """
+    __slots__ = ('header', 'column', 'numeric', 'pattern')
+
+    def __init__(self, header, pattern: 're.Pattern' = None):
+        self.header = header
+        self.column = header.value
+        self.numeric = header.numeric
+        self.pattern = pattern
+
+    def __repr__(self):
+        return f'FieldRule({self.header}, {self.pattern!r})'
+
+
+def label_matcher(table: dict, maxsize: int = 256):
+    """Function resolving a page label to the value of the first table label it contains, or None."""
+    @lru_cache(maxsize=maxsize)
+    def match(label: str):
+        for key, value in table.items():
+            if key in label:
+                return value
+        return None
+    return match
+
+
+def parse_number(text: str):
+    """Float of the digits in text with a comma or dot decimal separator ('1 234,5 zł' -> 1234.5), or None."""
+    try:
+        return float(NUMBER_CHARACTERS.sub('', text).replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def apply_rule(data: dict, rule: FieldRule, value: str):
+    """Store value in data under the rule's column; returns False when the value does not fit the rule."""
+    if rule.pattern is not None:
+        match = rule.pattern.search(value)
+        if match is None:
+            return False
+        value = match.group(1)
+    if rule.numeric:
+        value = parse_number(value)
+        if value is None:
+            return False
+    else:
+        value = value.strip()
+    data[rule.column] = value
+    return True
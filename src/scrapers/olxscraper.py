@@ -1,44 +1,160 @@
 import logging
 import re
 
-import requests
-from bs4 import BeautifulSoup
-
-from headers import Headers
+import fetching
+from headers import Headers, empty_row
+from parsing import Selector, parse_document
+from parsing.embedded import html_text, prerendered_state
+from records import OfferRecord
+from .extraction import FieldRule, apply_rule, label_matcher
+from .regions import PROPERTY_TYPES, REGIONS, TRANSACTIONS, lookup
 from .webpagescraper import WebpageScraper
 
 logging.basicConfig(level=logging.INFO)
 
-def scrape_offer_details(link: str):
-    """Scrape details from a specific OLX offer page."""
-    if not link.startswith(('http://', 'https://')):
-        logging.error(f"Invalid URL: {link}")
-        return {}
+# Selectors for OLX pages, compiled once per parser backend
+OFFER_CARD_SELECTOR = Selector('div[data-cy="l-card"], div[data-testid="l-card"]')
+ANCHOR_SELECTOR = Selector('a')
+PARAGRAPH_SELECTOR = Selector('p')
+TITLE_SELECTOR = Selector('h4.css-10ofhqw')
+TITLE_FALLBACK_SELECTOR = Selector('h1')
+PRICE_SELECTOR = Selector('h3[class*="css-"]')
+PARAMS_CONTAINER_SELECTOR = Selector('div[data-testid="ad-parameters-container"]')
+PARAMS_CONTAINER_FALLBACK_SELECTOR = Selector('div[class*="css-41yf00"]')
+PARAM_ROW_SELECTOR = Selector('div[class*="css-ae1s7g"]')
+DESCRIPTION_SELECTOR = Selector('div[data-cy="ad_description"]')
+
+# Breadcrumb links of the offer's category, like /nieruchomosci/mieszkania/sprzedaz/lodz/, for every property
+# type and transaction a scraper can be set to: detail pages are parsed by link alone, without the scraper
+CATEGORY_PATHS = tuple(f'/nieruchomosci/{property_type.olx}/{transaction.olx}/'
+                       for property_type in PROPERTY_TYPES.values() for transaction in TRANSACTIONS.values())
+LOCATION_LINK_SELECTOR = Selector(', '.join(f'a[href*="{path}"]' for path in CATEGORY_PATHS))
+
+# Parameter rows ('Powierzchnia: 48 m²') by label as the page shows it, in priority order
+PARAMS = {
+    'Cena za m²:': FieldRule(Headers.PRICE_PER_M2, re.compile(r'([\d\s,.]+)\s*zł/m²')),
+    'Powierzchnia:': FieldRule(Headers.M2, re.compile(r'([\d\s,.]+)\s*m²')),
+    'Liczba pokoi:': FieldRule(Headers.ROOMS, re.compile(r'(\d+)\s*pok')),
+    'Poziom:': FieldRule(Headers.FLOOR, re.compile(r'^\s*(\d+)')),
+    'Umeblowane:': FieldRule(Headers.EQUIPMENT, re.compile(r'^\s*(\w+)')),
+    'Rynek:': FieldRule(Headers.MARKET, re.compile(r'^\s*(\w+)')),
+    'Rodzaj zabudowy:': FieldRule(Headers.BUILDING_TYPE, re.compile(r'^\s*([^\n]+)')),
+}
+param_rule = label_matcher(PARAMS)
+
+PRICE_PATTERN = re.compile(r'(\d[\d\s]*)')
+HEATING_WORDS = ('ogrzewanie', 'centralne', 'miejskie', 'gazowe', 'elektryczne')
+HEATING_PATTERN = re.compile(r'ogrzewanie[\s:]*([\w\s]+)')
+BUILDING_YEAR_PATTERN = re.compile(r'rok budowy[:\s]*(\d{4})')
+NO_ELEVATOR_PATTERN = re.compile(r'brak\s+wind')
+
+
+def _apply_param(data, name, value):
+    """Store one 'Name: value' parameter row of the ad."""
+    rule = param_rule(name.strip() + ':')
+    if rule is not None:
+        apply_rule(data, rule, value)
+
+
+def _apply_description(data, desc_text):
+    """Pick heating, building year and elevator out of the lowercased ad description."""
+    # Look for heating type
+    for pattern in HEATING_WORDS:
+        if pattern in desc_text:
+            idx = desc_text.find(pattern)
+            snippet = desc_text[max(0, idx-20):idx+30]
+            if 'ogrzewanie' in snippet:
+                # Try to extract the heating type
+                match = HEATING_PATTERN.search(snippet)
+                if match:
+                    data[Headers.HEATING.value] = match.group(1).strip()
+                    break
+
+    # Extract building year if mentioned
+    year_match = BUILDING_YEAR_PATTERN.search(desc_text)
+    if year_match:
+        data[Headers.BUILDING_YEAR.value] = year_match.group(1)
+
+    # Check for elevator mentions
+    if 'wind' in desc_text:
+        if NO_ELEVATOR_PATTERN.search(desc_text):
+            data[Headers.ELEVATOR.value] = 'nie'
+        else:
+            data[Headers.ELEVATOR.value] = 'tak'
+
+
+def parse_embedded_details(link: str, content: bytes):
+    """Extract details from the ad in window.__PRERENDERED_STATE__, or return None when the page has none.
+
+    A state of another shape than expected also gives None, so that the
+    caller falls back to the selectors.
+    """
+    state = prerendered_state(content)
+    try:
+        return _embedded_details(link, ((state or {}).get('ad') or {}).get('ad'))
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _embedded_details(link: str, ad):
+    if not isinstance(ad, dict):
+        return None
+
+    data = empty_row()
+    data[Headers.LINK.value] = link
+    data[Headers.TITLE.value] = (ad.get('title') or '').strip()
+
+    price = ((ad.get('price') or {}).get('regularPrice') or {}).get('value')
+    if price is not None:
+        try:
+            data[Headers.TOTAL_PRICE.value] = float(price)
+        except (ValueError, TypeError):
+            pass
 
+    # Parameters are the same rows the page shows, so they go through the same rules
+    for param in ad.get('params') or []:
+        _apply_param(data, str(param.get('name', '')), str(param.get('value', '')))
+
+    location = (ad.get('location') or {}).get('cityName')
+    if location:
+        data[Headers.LOCATION.value] = location
+
+    description = ad.get('description')
+    if description:
+        _apply_description(data, html_text(description).lower())
+
+    return data
+
+
+def parse_offer_details(link: str, content: bytes):
+    """Extract details from an already downloaded OLX offer page, from its embedded state when it has one."""
+    data = parse_embedded_details(link, content)
+    if data is None:
+        data = parse_selector_details(link, content)
+    return data
+
+
+def parse_selector_details(link: str, content: bytes):
+    """Extract details from an already downloaded OLX offer page by walking its HTML."""
     # Initialize dictionary for scraped data
-    data = {key: '' for key in [list(Headers)[i].value for i in range(len(Headers))]}
+    data = empty_row()
     data[Headers.LINK.value] = link
     
     try:
-        # Request page with a generous timeout
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        page = requests.get(link, headers=headers, timeout=10)
-        soup = BeautifulSoup(page.content, 'html.parser')
+        document = parse_document(content)
         
         # Extract title
-        title_element = soup.find('h4', class_='css-10ofhqw')
+        title_element = document.select_one(TITLE_SELECTOR)
         if not title_element:
-            title_element = soup.find('h1')  # Fallback to h1 if the specific h4 isn't found
+            title_element = document.select_one(TITLE_FALLBACK_SELECTOR)  # Fallback to h1 if the specific h4 isn't found
         if title_element:
             data[Headers.TITLE.value] = title_element.text.strip()
             
         # Extract total price
-        price_element = soup.find('h3', class_=lambda c: c and 'css-' in c)
+        price_element = document.select_one(PRICE_SELECTOR)
         if price_element:
             price_text = price_element.text.strip()
-            price_match = re.search(r'(\d[\d\s]*)', price_text)
+            price_match = PRICE_PATTERN.search(price_text)
             if price_match:
                 price_value = price_match.group(1).replace(' ', '')
                 try:
@@ -47,102 +163,34 @@ def scrape_offer_details(link: str):
                     pass
         
         # Find parameters container
-        params_container = soup.find('div', {'data-testid': 'ad-parameters-container'})
+        params_container = document.select_one(PARAMS_CONTAINER_SELECTOR)
         if not params_container:
-            params_container = soup.find('div', class_=lambda c: c and 'css-41yf00' in c)
+            params_container = document.select_one(PARAMS_CONTAINER_FALLBACK_SELECTOR)
             
         if params_container:
             # Extract all parameter rows
-            param_rows = params_container.find_all('div', class_=lambda c: c and 'css-ae1s7g' in c)
+            param_rows = params_container.select(PARAM_ROW_SELECTOR)
             
             for row in param_rows:
-                # Get the parameter text
-                param_text = row.get_text().strip()
-                
-                # Extract different parameters based on text content
-                if 'Cena za m²:' in param_text:
-                    match = re.search(r'([\d\s,.]+)\s*zł/m²', param_text)
-                    if match:
-                        try:
-                            value = match.group(1).replace(' ', '').replace(',', '.')
-                            data[Headers.PRICE_PER_M2.value] = float(value)
-                        except ValueError:
-                            pass
-                            
-                elif 'Powierzchnia:' in param_text:
-                    match = re.search(r'([\d\s,.]+)\s*m²', param_text)
-                    if match:
-                        try:
-                            value = match.group(1).replace(' ', '').replace(',', '.')
-                            data[Headers.M2.value] = float(value)
-                        except ValueError:
-                            pass
-                            
-                elif 'Liczba pokoi:' in param_text:
-                    match = re.search(r'(\d+)\s*pok', param_text)
-                    if match:
-                        try:
-                            data[Headers.ROOMS.value] = float(match.group(1))
-                        except ValueError:
-                            pass
-                            
-                elif 'Poziom:' in param_text:
-                    match = re.search(r'Poziom:\s*(\d+)', param_text)
-                    if match:
-                        data[Headers.FLOOR.value] = match.group(1)
-                        
-                elif 'Umeblowane:' in param_text:
-                    match = re.search(r'Umeblowane:\s*(\w+)', param_text)
-                    if match:
-                        data[Headers.EQUIPMENT.value] = match.group(1)
-                        
-                elif 'Rynek:' in param_text:
-                    match = re.search(r'Rynek:\s*(\w+)', param_text)
-                    if match:
-                        data[Headers.MARKET.value] = match.group(1)
-                        
-                elif 'Rodzaj zabudowy:' in param_text:
-                    match = re.search(r'Rodzaj zabudowy:\s*([^\n]+)', param_text)
-                    if match:
-                        data[Headers.BUILDING_TYPE.value] = match.group(1).strip()
+                # Split the row into its label and value and extract the parameter it holds
+                name, _, value = row.text.strip().partition(':')
+                _apply_param(data, name, value)
         
         # Extract location from breadcrumbs or other elements
-        location_elements = soup.find_all('a', href=lambda h: h and '/nieruchomosci/mieszkania/sprzedaz/' in h)
-        if location_elements and len(location_elements) > 0:
+        # The link of the category itself ('Sprzedaż', 'Wynajem') is not a location
+        location_elements = [element for element in document.select(LOCATION_LINK_SELECTOR)
+                             if not (element.get('href') or '').endswith(CATEGORY_PATHS)]
+        if location_elements:
             # Last breadcrumb is usually the location
             location = location_elements[-1].text.strip()
-            if location and not location.lower() == 'sprzedaż':
+            if location:
                 data[Headers.LOCATION.value] = location
         
         # Extract additional information from description
-        description = soup.find('div', {'data-cy': 'ad_description'})
+        description = document.select_one(DESCRIPTION_SELECTOR)
         if description:
             desc_text = description.text.lower()
-            
-            # Look for heating type
-            heating_patterns = ['ogrzewanie', 'centralne', 'miejskie', 'gazowe', 'elektryczne']
-            for pattern in heating_patterns:
-                if pattern in desc_text:
-                    idx = desc_text.find(pattern)
-                    snippet = desc_text[max(0, idx-20):idx+30]
-                    if 'ogrzewanie' in snippet:
-                        # Try to extract the heating type
-                        match = re.search(r'ogrzewanie[\s:]*([\w\s]+)', snippet)
-                        if match:
-                            data[Headers.HEATING.value] = match.group(1).strip()
-                            break
-            
-            # Extract building year if mentioned
-            year_match = re.search(r'rok budowy[:\s]*(\d{4})', desc_text)
-            if year_match:
-                data[Headers.BUILDING_YEAR.value] = year_match.group(1)
-                
-            # Check for elevator mentions
-            if 'wind' in desc_text:
-                if re.search(r'brak\s+wind', desc_text):
-                    data[Headers.ELEVATOR.value] = 'nie'
-                else:
-                    data[Headers.ELEVATOR.value] = 'tak'
+            _apply_description(data, desc_text)
                     
     except Exception as e:
         logging.error(f"Error scraping {link}: {str(e)}")
@@ -150,47 +198,63 @@ def scrape_offer_details(link: str):
     return data
 
 
+def scrape_offer_details(link: str, client: 'fetching.HttpClient' = None):
+    """Scrape details from a specific OLX offer page."""
+    if not link.startswith(('http://', 'https://')):
+        logging.error(f"Invalid URL: {link}")
+        return {}
+
+    try:
+        # Request page through the shared rate-limited client
+        page = (client or fetching.default_client).get(link)
+    except Exception as e:
+        logging.error(f"Error scraping {link}: {str(e)}")
+        page = None
+
+    return parse_offer_details(link, page.content if page is not None else b'')
+
+
 class OlxScraper(WebpageScraper):
-    def __init__(self, time_sleep: tuple[int, int] = (1, 2)):
-        super().__init__()
+    def __init__(self, rate_limit: float = 5.0, burst: int = 5, client: 'fetching.HttpClient' = None,
+                 region: str = 'lodz', property_type: str = 'flat', transaction: str = 'sale'):
+        super().__init__(client)
+        self.region = region
+        region = lookup(REGIONS, region, 'region').olx
+        property_type = lookup(PROPERTY_TYPES, property_type, 'property type').olx
+        transaction = lookup(TRANSACTIONS, transaction, 'transaction').olx
         self.domain = 'https://www.olx.pl'
-        self.endpoint = f'{self.domain}/nieruchomosci/mieszkania/sprzedaz/lodz'
-        self.t1 = time_sleep[0]
-        self.t2 = time_sleep[1]
+        self.endpoint = f'{self.domain}/nieruchomosci/{property_type}/{transaction}/{region}'
+        self.client.rate_limiter.configure(self.domain, rate_limit, burst)
 
-    def scrape_page(self, page: int):
-        # Get link to the page
-        link = f'{self.endpoint}/?page={page}'
+    def page_url(self, page: int):
+        return f'{self.endpoint}/?page={page}'
 
-        # Make a call and parse the page
-        page = requests.get(link)
-        soup = BeautifulSoup(page.content, 'html.parser')
+    def parse_page(self, content: bytes):
+        document = parse_document(content)
 
-        # Get all divs with offers
-        offers_divs = list(filter(lambda x: 'l-card' in x.attrs.values(), soup.find_all('div')))
+        # Get details from each offer card
+        records = []
+        for div in document.select(OFFER_CARD_SELECTOR):
+            anchor = div.select(ANCHOR_SELECTOR)[-1]
+            paragraphs = div.select(PARAGRAPH_SELECTOR)
+            record = OfferRecord()
 
-        # Get details from each offer
-        data = {key: [] for key in [list(Headers)[i].value for i in range(len(Headers))]}
-        for div in offers_divs:
             # Get offer link
-            offer_link = div.find_all('a')[-1].get('href')
-            offer_link = self.domain + offer_link if '/d/oferta' in offer_link else offer_link
-            data[Headers.LINK.value].append(offer_link)
+            offer_link = anchor.get('href')
+            record.link = self.domain + offer_link if '/d/oferta' in offer_link else offer_link
 
             # Get offer title
-            offer_title = div.find_all('a')[-1].text
-            data[Headers.TITLE.value].append(offer_title)
+            record.title = anchor.text
 
             # Get offer price
-            offer_price = float(div.find_all('p')[0].text.replace(' ', '').replace('zł', '').replace('donegocjacji', ''))
-            data[Headers.TOTAL_PRICE.value].append(offer_price)
+            record.total_price = float(paragraphs[0].text.replace(' ', '').replace('zł', '').replace('donegocjacji', ''))
 
             # Get offer location
-            offer_location = div.find_all('p')[-1].text.split(' - ')[0]
-            data[Headers.LOCATION.value].append(offer_location)
+            record.location = paragraphs[-1].text.split(' - ')[0]
+            records.append(record)
 
-        return data
+        return records
 
 
-    def scrape_offers(self, pages):
+    def scrape_offers(self, pages=None):
         return super().scrape_offers(pages)
\ No newline at end of file
@@ -1,30 +1,150 @@
-import requests
-from bs4 import BeautifulSoup
-
-from headers import Headers
+import fetching
+from headers import Headers, empty_row
+from parsing import Selector, parse_document
+from parsing.embedded import next_data
+from records import OfferRecord
+from scrapers.extraction import FieldRule, apply_rule, label_matcher
+from scrapers.regions import PROPERTY_TYPES, REGIONS, TRANSACTIONS, lookup
 from scrapers.webpagescraper import WebpageScraper
 
+# Selectors for Otodom pages, compiled once per parser backend
+DETAILS_CONTAINER_SELECTOR = Selector('div[class*="css-8mnxk5"], div[class*="ellui0j0"]')
+BUTTON_SELECTOR = Selector('button')
+DETAIL_PAIR_SELECTOR = Selector('div[class*="css-1xw0jqp"]')
+PARAGRAPH_SELECTOR = Selector('p')
+INFO_SECTION_SELECTOR = Selector('div.css-1xw0jqp')
+FEATURE_SELECTOR = Selector('span[class*="css-axw7ok"]')
+ARTICLE_SELECTOR = Selector('article')
+ANCHOR_SELECTOR = Selector('a')
+LISTING_TITLE_SELECTOR = Selector('p[data-cy="listing-item-title"]')
+LISTING_PRICE_SELECTOR = Selector('span[direction="horizontal"]')
+
+# Numeric characteristics of the ad in __NEXT_DATA__: key -> column name
+EMBEDDED_NUMBERS = {
+    'm': Headers.M2.value,
+    'rooms_num': Headers.ROOMS.value,
+    'price': Headers.TOTAL_PRICE.value,
+    'price_per_m': Headers.PRICE_PER_M2.value,
+}
+EMBEDDED_FLOOR = 'floor_no'
+EMBEDDED_BUILDING_FLOORS = 'building_floors_num'
+
+# Rows of the details table by lowercased label, in priority order; a row goes to the first label it contains
+DETAILS = {
+    'czynsz': FieldRule(Headers.RENT),
+    'rynek': FieldRule(Headers.MARKET),
+    'rodzaj zabudowy': FieldRule(Headers.BUILDING_TYPE),
+    'ogrzewanie': FieldRule(Headers.HEATING),
+    'piętro': FieldRule(Headers.FLOOR),
+    'stan wykończenia': FieldRule(Headers.FINISH_CONDITION),
+    'forma własności': FieldRule(Headers.OWNERSHIP_FORM),
+    'dostępne od': FieldRule(Headers.AVAILABLE_FROM),
+    'typ ogłoszeniodawcy': FieldRule(Headers.ADVERTISER_TYPE),
+    'rok budowy': FieldRule(Headers.BUILDING_YEAR),
+    'winda': FieldRule(Headers.ELEVATOR),
+    'materiał budynku': FieldRule(Headers.BUILDING_MATERIAL),
+    'okna': FieldRule(Headers.WINDOWS),
+    'certyfikat energetyczny': FieldRule(Headers.ENERGY_CERTIFICATE),
+}
+detail_rule = label_matcher(DETAILS)
+
+# Titled feature lists, stored comma-separated
+FEATURES = {
+    'informacje dodatkowe': FieldRule(Headers.ADDITIONAL_INFO),
+    'wyposażenie': FieldRule(Headers.EQUIPMENT),
+    'zabezpieczenia': FieldRule(Headers.SECURITY),
+    'media': FieldRule(Headers.MEDIA),
+}
+feature_rule = label_matcher(FEATURES)
+
+
+def _apply_detail_pair(data, key, value):
+    """Store one labelled detail ('Czynsz', '490 zł') shown in the details table."""
+    rule = detail_rule(key.strip().replace(':', '').lower())
+    if rule is not None:
+        apply_rule(data, rule, value)
+
+
+def _apply_features(data, title, features):
+    """Store one titled list of features ('Wyposażenie': meble, lodówka, ...)."""
+    rule = feature_rule(title.lower().strip())
+    if rule is not None:
+        apply_rule(data, rule, ', '.join(feature.strip() for feature in features))
+
+
+def parse_embedded_details(link, content):
+    """Extract details from the ad JSON in __NEXT_DATA__, or return None when the page has none.
+
+    JSON of another shape than expected also gives None, so that the caller
+    falls back to the selectors.
+    """
+    state = next_data(content)
+    try:
+        return _embedded_details(link, ((state or {}).get('props') or {}).get('pageProps', {}).get('ad'))
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def _embedded_details(link, ad):
+    if not isinstance(ad, dict):
+        return None
+
+    data = empty_row()
+    data[Headers.LINK.value] = link
+
+    floor = building_floors = None
+    for item in ad.get('characteristics') or []:
+        key = item.get('key')
+        value = item.get('value')
+        shown = item.get('localizedValue') or value or ''
+        column = EMBEDDED_NUMBERS.get(key)
+        if column is not None:
+            try:
+                data[column] = float(value)
+            except (ValueError, TypeError):
+                pass
+        elif key == EMBEDDED_FLOOR:
+            floor = shown
+        elif key == EMBEDDED_BUILDING_FLOORS:
+            building_floors = shown
+        else:
+            _apply_detail_pair(data, item.get('label') or '', shown)
+
+    # The page shows the floor together with the number of floors, as in 3/4
+    if floor:
+        data[Headers.FLOOR.value] = f'{floor}/{building_floors}' if building_floors and '/' not in floor else floor
+
+    for category in ad.get('featuresByCategory') or []:
+        _apply_features(data, category.get('label') or '', category.get('values') or [])
+
+    return data
+
+
+def parse_offer_details(link, content):
+    """Extract details from an Otodom offer page, from its embedded JSON when it has one."""
+    data = parse_embedded_details(link, content)
+    if data is None:
+        data = parse_selector_details(link, content)
+    return data
+
 
-def scrape_offer_details(link):
+def parse_selector_details(link, content):
+    """Extract details from an Otodom offer page by walking its HTML."""
     # Initialize dictionary for scraped data
-    data = {key: '' for key in [list(Headers)[i].value for i in range(len(Headers))]}
+    data = empty_row()
     data[Headers.LINK.value] = link
 
-    # Make a call and parse the page
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-    }
-    
     try:
-        page = requests.get(link, headers=headers)
-        soup = BeautifulSoup(page.content, 'html.parser')
+        document = parse_document(content)
         
         # Find the main details container div (with property info)
-        details_container = soup.find('div', class_=lambda cls: cls and ('css-8mnxk5' in cls or 'ellui0j0' in cls))
+        details_container = document.select_one(DETAILS_CONTAINER_SELECTOR)
         
         if details_container:
+            buttons = details_container.select(BUTTON_SELECTOR)
+
             # Extract area (m²) from button
-            for button in details_container.find_all('button'):
+            for button in buttons:
                 if 'm²' in button.text:
                     area_text = button.text.strip()
                     area_value = area_text.split('m²')[0].strip()
@@ -35,7 +155,7 @@ def scrape_offer_details(link):
                         pass
             
             # Extract number of rooms from button
-            for button in details_container.find_all('button'):
+            for button in buttons:
                 if any(room_text in button.text.lower() for room_text in ['pokoje', 'pokój', 'pokoj']):
                     rooms_text = button.text.strip()
                     rooms_value = rooms_text.split('pok')[0].strip()
@@ -46,101 +166,46 @@ def scrape_offer_details(link):
                         pass
             
             # Extract key-value pairs from div elements
-            detail_pairs = details_container.find_all('div', class_=lambda cls: cls and 'css-1xw0jqp' in cls)
+            detail_pairs = details_container.select(DETAIL_PAIR_SELECTOR)
             for div in detail_pairs:
-                p_elements = div.find_all('p')
+                p_elements = div.select(PARAGRAPH_SELECTOR)
                 if len(p_elements) >= 2:
-                    key = p_elements[0].text.strip().replace(':', '').lower()
-                    value = p_elements[1].text.strip()
-                    
-                    # Map keys to our Headers enum values
-                    if 'czynsz' in key:
-                        if 'brak' not in value.lower():
-                            try:
-                                # Remove non-numeric chars except decimal separator
-                                rent_value = ''.join(c for c in value if c.isdigit() or c == '.' or c == ',')
-                                rent_value = rent_value.replace(',', '.')
-                                data[Headers.RENT.value] = float(rent_value)
-                            except (ValueError, TypeError):
-                                pass
-                    elif 'rynek' in key:
-                        data[Headers.MARKET.value] = value
-                    elif 'rodzaj zabudowy' in key:
-                        data[Headers.BUILDING_TYPE.value] = value
-                    elif 'ogrzewanie' in key:
-                        data[Headers.HEATING.value] = value
-                    elif 'piętro' in key:
-                        data[Headers.FLOOR.value] = value
-                    elif 'stan wykończenia' in key:
-                        data[Headers.FINISH_CONDITION.value] = value
-                    elif 'forma własności' in key:
-                        data[Headers.OWNERSHIP_FORM.value] = value
-                    elif 'dostępne od' in key:
-                        data[Headers.AVAILABLE_FROM.value] = value
-                    elif 'typ ogłoszeniodawcy' in key:
-                        data[Headers.ADVERTISER_TYPE.value] = value
-                    elif 'rok budowy' in key:
-                        data[Headers.BUILDING_YEAR.value] = value
-                    elif 'winda' in key:
-                        data[Headers.ELEVATOR.value] = value
-                    elif 'materiał budynku' in key:
-                        data[Headers.BUILDING_MATERIAL.value] = value
-                    elif 'okna' in key:
-                        data[Headers.WINDOWS.value] = value
-                    elif 'certyfikat energetyczny' in key:
-                        data[Headers.ENERGY_CERTIFICATE.value] = value
+                    _apply_detail_pair(data, p_elements[0].text, p_elements[1].text)
             
             # Extract additional information (features with checkmarks)
-            additional_info = []
-            equipment = []
-            security = []
-            media = []
-            
-            # Find sections with additional information
-            info_sections = details_container.find_all('div', class_='css-1xw0jqp')
+            info_sections = details_container.select(INFO_SECTION_SELECTOR)
             for section in info_sections:
-                section_title = section.find('p')
+                section_title = section.select_one(PARAGRAPH_SELECTOR)
                 if section_title and section_title.text:
-                    title_text = section_title.text.lower().strip()
-                    if 'informacje dodatkowe' in title_text:
-                        features = section.find_all('span', class_=lambda cls: cls and 'css-axw7ok' in cls)
-                        additional_info = [feature.text.strip() for feature in features]
-                    elif 'wyposażenie' in title_text:
-                        features = section.find_all('span', class_=lambda cls: cls and 'css-axw7ok' in cls)
-                        equipment = [feature.text.strip() for feature in features]
-                    elif 'zabezpieczenia' in title_text:
-                        features = section.find_all('span', class_=lambda cls: cls and 'css-axw7ok' in cls)
-                        security = [feature.text.strip() for feature in features]
-                    elif 'media' in title_text:
-                        features = section.find_all('span', class_=lambda cls: cls and 'css-axw7ok' in cls)
-                        media = [feature.text.strip() for feature in features]
-            
-            data[Headers.ADDITIONAL_INFO.value] = ', '.join(additional_info) if additional_info else ''
-            data[Headers.EQUIPMENT.value] = ', '.join(equipment) if equipment else ''
-            data[Headers.SECURITY.value] = ', '.join(security) if security else ''
-            data[Headers.MEDIA.value] = ', '.join(media) if media else ''
+                    _apply_features(data, section_title.text,
+                                    [feature.text for feature in section.select(FEATURE_SELECTOR)])
         
-        # Find the price per m² (often in a div with price information)
-        price_per_m2_elements = soup.find_all(string=lambda text: text and 'zł/m²' in text)
-        for element in price_per_m2_elements:
-            try:
-                price_text = element.strip().replace(' ', '').split('zł/m²')[0]
-                data[Headers.PRICE_PER_M2.value] = float(price_text)
+        # Find the price per m² and the total price in a single pass over the page text
+        price_per_m2_found = total_price_found = False
+        for element in document.strings():
+            if 'zł' not in element:
+                continue
+
+            if 'zł/m²' in element:
+                if not price_per_m2_found:
+                    try:
+                        price_text = element.strip().replace(' ', '').split('zł/m²')[0]
+                        data[Headers.PRICE_PER_M2.value] = float(price_text)
+                        price_per_m2_found = True
+                    except (ValueError, TypeError):
+                        pass
+            elif not total_price_found:
+                try:
+                    price_text = ''.join(c for c in element if c.isdigit() or c == '.')
+                    price = float(price_text)
+                    if price > 1000:
+                        data[Headers.TOTAL_PRICE.value] = price
+                        total_price_found = True
+                except (ValueError, TypeError):
+                    pass
+
+            if price_per_m2_found and total_price_found:
                 break
-            except (ValueError, TypeError):
-                pass
-        
-        # Find the total price
-        price_elements = soup.find_all(string=lambda text: text and 'zł' in text and 'zł/m²' not in text)
-        for element in price_elements:
-            try:
-                price_text = ''.join(c for c in element if c.isdigit() or c == '.')
-                price = float(price_text)
-                if price > 1000:
-                    data[Headers.TOTAL_PRICE.value] = price
-                    break
-            except (ValueError, TypeError):
-                pass
                 
     except Exception as e:
         print(f"Error scraping {link}: {e}")
@@ -148,49 +213,60 @@ def scrape_offer_details(link):
     return data
 
 
+def scrape_offer_details(link, client: 'fetching.HttpClient' = None):
+    # Make a call and parse the page
+    try:
+        page = (client or fetching.default_client).get(link)
+    except Exception as e:
+        print(f"Error scraping {link}: {e}")
+        page = None
+
+    return parse_offer_details(link, page.content if page is not None else b'')
+
+
 class OtodomScraper(WebpageScraper):
-    def __init__(self, time_sleep: tuple[int, int] = (1, 2)):
-        super().__init__()
+    def __init__(self, rate_limit: float = 5.0, burst: int = 5, client: 'fetching.HttpClient' = None,
+                 region: str = 'lodz', property_type: str = 'flat', transaction: str = 'sale'):
+        super().__init__(client)
+        self.region = region
+        region = lookup(REGIONS, region, 'region').otodom
+        property_type = lookup(PROPERTY_TYPES, property_type, 'property type').otodom
+        transaction = lookup(TRANSACTIONS, transaction, 'transaction').otodom
         self.domain = 'https://www.otodom.pl'
-        self.endpoint = f'{self.domain}/pl/wyniki/sprzedaz/mieszkanie/lodzkie/lodz/lodz/lodz?viewType=listing'
+        self.endpoint = f'{self.domain}/pl/wyniki/{transaction}/{property_type}/{region}?viewType=listing'
+        self.client.rate_limiter.configure(self.domain, rate_limit, burst)
 
-        self.t1 = time_sleep[0]
-        self.t2 = time_sleep[1]
 
+    def page_url(self, page: int):
+        return f'{self.endpoint}&page={page}'
 
-    def scrape_page(self, page: int):
-        # Get link to the page
-        link = f'{self.endpoint}&page={page}'
 
-        # Make a call and parse the page
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-        }
-        page = requests.get(link, headers=headers)
-        soup = BeautifulSoup(page.content, 'html.parser')
+    def page_count(self, content: bytes):
+        # Search results carry their pagination in __NEXT_DATA__, next to the ads
+        try:
+            return int(next_data(content)['props']['pageProps']['data']['searchAds']['pagination']['totalPages'])
+        except (TypeError, KeyError, ValueError):
+            return super().page_count(content)
 
-        articles = soup.find_all('article')
-        data = {key: [] for key in [list(Headers)[i].value for i in range(len(Headers))]}
-        for article in articles:
-            offer_link = self.domain + article.find('a')['href']
-            data[Headers.LINK.value].append(offer_link)
 
-            offer_title = article.find('p', attrs={'data-cy': 'listing-item-title'}).text
-            data[Headers.TITLE.value].append(offer_title)
+    def parse_page(self, content: bytes):
+        document = parse_document(content)
 
-            offer_price = soup.find_all('article')[0].find('span', attrs={'direction': 'horizontal'}).text
-            if offer_price == 'Zapytaj o cenę':
-                offer_price = ''
-            else:
-                offer_price = float(''.join(offer_price.split()[:-1]))
-            data[Headers.TOTAL_PRICE.value].append(offer_price)
+        records = []
+        for article in document.select(ARTICLE_SELECTOR):
+            record = OfferRecord()
+            record.link = self.domain + article.select_one(ANCHOR_SELECTOR).get('href')
+            record.title = article.select_one(LISTING_TITLE_SELECTOR).text
 
-            offer_location = soup.find_all('article')[0].find_all('p')[-1].text
-            data[Headers.LOCATION.value].append(offer_location)
+            offer_price = article.select_one(LISTING_PRICE_SELECTOR).text
+            if offer_price != 'Zapytaj o cenę':
+                record.total_price = float(''.join(offer_price.split()[:-1]))
 
-        return data
+            record.location = article.select(PARAGRAPH_SELECTOR)[-1].text
+            records.append(record)
 
+        return records
 
 
-    def scrape_offers(self, pages: int):
+    def scrape_offers(self, pages: int = None):
         return super().scrape_offers(pages)
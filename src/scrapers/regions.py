@@ -0,0 +1,34 @@
+from collections import namedtuple
+
+
+# The value of one search setting in each site's URLs
+SiteSlugs = namedtuple('SiteSlugs', ['olx', 'otodom'])
+
+# Where a region's search results live: the OLX city slug and the Otodom
+# location path (voivodeship/county/municipality/city)
+REGIONS = {
+    'lodz': SiteSlugs('lodz', 'lodzkie/lodz/lodz/lodz'),
+    'warszawa': SiteSlugs('warszawa', 'mazowieckie/warszawa/warszawa/warszawa'),
+    'krakow': SiteSlugs('krakow', 'malopolskie/krakow/krakow/krakow'),
+    'wroclaw': SiteSlugs('wroclaw', 'dolnoslaskie/wroclaw/wroclaw/wroclaw'),
+    'poznan': SiteSlugs('poznan', 'wielkopolskie/poznan/poznan/poznan'),
+    'gdansk': SiteSlugs('gdansk', 'pomorskie/gdansk/gdansk/gdansk'),
+}
+
+# Property type and transaction query values, by the name used in settings
+PROPERTY_TYPES = {
+    'flat': SiteSlugs('mieszkania', 'mieszkanie'),
+    'house': SiteSlugs('domy', 'dom'),
+}
+TRANSACTIONS = {
+    'sale': SiteSlugs('sprzedaz', 'sprzedaz'),
+    'rent': SiteSlugs('wynajem', 'wynajem'),
+}
+
+
+def lookup(table: dict, name: str, kind: str):
+    """Entry of one of the tables above, with the valid names in the error for a typo."""
+    try:
+        return table[name]
+    except KeyError:
+        raise ValueError(f"Unknown {kind} {name!r}, expected one of {', '.join(table)}") from None
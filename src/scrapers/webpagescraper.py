@@ -1,40 +1,79 @@
-import random
-import time
+import re
 from abc import ABC, abstractmethod
 
-from tqdm import tqdm
+import fetching
+from records import OfferRecord
 
-from headers import Headers
+
+# Pagination links of both sites carry the page number in a page= query parameter
+PAGE_LINK_PATTERN = re.compile(rb'href="[^"]*[?&](?:amp;)?page=(\d+)')
 
 
 class WebpageScraper(ABC):
 
     @abstractmethod
-    def __init__(self):
+    def __init__(self, client: 'fetching.HttpClient' = None):
         self.domain = None
         self.endpoint = None
 
-        self.t1 = None
-        self.t2 = None
+        # All requests go through the shared client and its per-domain rate limiter
+        self.client = client or fetching.default_client
 
 
     @abstractmethod
-    def scrape_page(self, page: int):
+    def page_url(self, page: int):
+        pass
+
+
+    @abstractmethod
+    def parse_page(self, content: bytes) -> list[OfferRecord]:
         pass
 
 
+    def page_count(self, content: bytes):
+        """Number of listing pages, read from the pagination links of a listing page, or None if it has none."""
+        pages = [int(page) for page in PAGE_LINK_PATTERN.findall(content)]
+        return max(pages) if pages else None
+
+
+    def fetch_page(self, page: int):
+        # Listing pages change often, so always revalidate cached copies
+        return self.client.get(self.page_url(page), max_age=0).content
+
+
+    def scrape_page(self, page: int):
+        # Make a call and parse the page
+        return self.parse_page(self.fetch_page(page))
+
+
     @abstractmethod
-    def scrape_offers(self, pages: int):
-        scraped_data = {key: [] for key in [list(Headers)[i].value for i in range(len(Headers))]}
-        for p in tqdm(range(1, pages + 1), 'Scraping offers from pages'):
-            time.sleep(random.randint(self.t1, self.t2))
-            data = self.scrape_page(p)
-
-            # Append data to dictionary
-            for key in scraped_data.keys():
-                values = data[key]
-                if len(values) == 0:
-                    values = ['']*len(data[Headers.LINK.value])
-                scraped_data[key].extend(values)
+    def scrape_offers(self, pages: int = None):
+        """Walk the listing pages in order, up to pages or the page count shown on the first one.
+
+        Stops early at the first page that brings no new links.
+        """
+        from tqdm import tqdm
+
+        content = self.fetch_page(1)
+        count = self.page_count(content) or pages
+        last = min(count, pages) if pages else count
+
+        scraped_data = []
+        seen = set()
+        progress = tqdm(total=last, desc='Scraping offers from pages')
+        page = 1
+        while True:
+            records = self.parse_page(content)
+            progress.update(1)
+            new = [record for record in records if record.link not in seen]
+            if not new:
+                break
+            seen.update(record.link for record in new)
+            scraped_data.extend(new)
+            page += 1
+            if last is not None and page > last:
+                break
+            content = self.fetch_page(page)
+        progress.close()
 
         return scraped_data
@@ -0,0 +1,16 @@
+from lazy import lazy_exports
+
+# Each store loads with its first use; pandas only where a function needs it
+__all__ = ['CheckpointStore', 'dataset_path', 'load_offers', 'open_offers', 'write_csv_dataset', 'write_frame_dataset',
+           'write_frames_dataset', 'DedupIndex', 'DiskDedupIndex', 'deduplicate', 'normalize_url', 'offer_key',
+           'OfferIndex', 'RetryQueue', 'classify_failure', 'WorkQueue', 'OfferHistory']
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'CheckpointStore': 'checkpoint',
+    'dataset_path': 'columnar', 'load_offers': 'columnar', 'open_offers': 'columnar',
+    'write_csv_dataset': 'columnar', 'write_frame_dataset': 'columnar', 'write_frames_dataset': 'columnar',
+    'DedupIndex': 'dedup', 'DiskDedupIndex': 'dedup', 'deduplicate': 'dedup', 'normalize_url': 'dedup', 'offer_key': 'dedup',
+    'OfferIndex': 'offer_index',
+    'RetryQueue': 'retry_queue', 'classify_failure': 'retry_queue',
+    'WorkQueue': 'work_queue',
+    'OfferHistory': 'history',
+})
@@ -0,0 +1,237 @@
+import json
+import os
+import sqlite3
+import time
+
+from metrics import default_registry
+from records import OfferBatch, OfferRecord
+from .dedup import DedupIndex, DiskDedupIndex, offer_key
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS offers (
+    idx INTEGER PRIMARY KEY,
+    page INTEGER NOT NULL,
+    link TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS offers_link ON offers (link);
+CREATE TABLE IF NOT EXISTS details (
+    idx INTEGER PRIMARY KEY,
+    record TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    page INTEGER PRIMARY KEY,
+    offers INTEGER NOT NULL,
+    committed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+CHECKPOINT_SECONDS = default_registry.histogram(
+    'scraper_checkpoint_write_seconds', 'Time of checkpoint transactions, per operation', ('operation',))
+
+
+class CheckpointStore:
+    """Append-only SQLite checkpoint for one data source.
+
+    Each listing page is committed together with its offer rows in one
+    transaction, and scraped detail records are appended in small batches
+    as they are parsed, so a crash loses at most the records in flight and
+    one uncommitted batch. compact() merges listing rows with their details
+    into the final CSV.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # Compaction runs on a worker thread once scraping is done, never concurrently with it
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+
+    def reset(self):
+        """Forget all progress of a previous run."""
+        with self.connection:
+            self.connection.execute('DELETE FROM offers')
+            self.connection.execute('DELETE FROM details')
+            self.connection.execute('DELETE FROM pages')
+            self.connection.execute('DELETE FROM meta')
+
+    def count(self):
+        return self.connection.execute('SELECT COUNT(*) FROM offers').fetchone()[0]
+
+    def completed_pages(self):
+        return {page for (page,) in self.connection.execute('SELECT page FROM pages')}
+
+    def page_count(self):
+        """Listing page count detected by the run that created the checkpoint, or None."""
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'page_count'").fetchone()
+        return int(row[0]) if row else None
+
+    def set_page_count(self, count: int):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('page_count', ?)", (str(count),))
+
+    def add_page(self, page: int, records):
+        """Store the listing records of one page and mark it done, atomically.
+
+        Links already stored (OLX repeats promoted offers on every page) are
+        skipped; the (idx, link) pairs of the newly stored offers are returned.
+        """
+        added = []
+        with CHECKPOINT_SECONDS.time('add_page'), self.connection:
+            next_idx = self.connection.execute('SELECT COALESCE(MAX(idx), -1) + 1 FROM offers').fetchone()[0]
+            for record in records:
+                link = record.link
+                if link and self.connection.execute('SELECT 1 FROM offers WHERE link = ?', (link,)).fetchone():
+                    continue
+                self.connection.execute(
+                    'INSERT INTO offers (idx, page, link, record) VALUES (?, ?, ?, ?)',
+                    (next_idx, page, link, json.dumps(record.to_dict(), ensure_ascii=False))
+                )
+                added.append((next_idx, link))
+                next_idx += 1
+            self.connection.execute(
+                'INSERT OR REPLACE INTO pages (page, offers, committed_at) VALUES (?, ?, ?)',
+                (page, len(added), time.time())
+            )
+        return added
+
+    def ensure_offers(self, records):
+        """(idx, link) of the stored offer of every record, storing missing ones without a listing page."""
+        items = []
+        with self.connection:
+            for record in records:
+                row = self.connection.execute('SELECT idx FROM offers WHERE link = ?', (record.link,)).fetchone()
+                if row is None:
+                    row = self.connection.execute('SELECT COALESCE(MAX(idx), -1) + 1 FROM offers').fetchone()
+                    self.connection.execute(
+                        'INSERT INTO offers (idx, page, link, record) VALUES (?, 0, ?, ?)',
+                        (row[0], record.link, json.dumps(record.to_dict(), ensure_ascii=False))
+                    )
+                items.append((row[0], record.link))
+        return items
+
+    def listing_record(self, idx: int):
+        """The listing OfferRecord stored for an offer."""
+        row = self.connection.execute('SELECT record FROM offers WHERE idx = ?', (idx,)).fetchone()
+        return OfferRecord.from_dict(json.loads(row[0])) if row else None
+
+    def pending(self):
+        """(idx, link) pairs of stored offers whose details have not been scraped yet."""
+        return self.connection.execute(
+            'SELECT offers.idx, offers.link FROM offers LEFT JOIN details ON details.idx = offers.idx '
+            'WHERE details.idx IS NULL ORDER BY offers.idx'
+        ).fetchall()
+
+    def commit_record(self, idx: int, record: OfferRecord):
+        """Append the scraped details of one offer."""
+        self.commit_records([(idx, record)])
+
+    def commit_records(self, items):
+        """Append the scraped details of several offers, given as (idx, record) pairs, in one transaction."""
+        with CHECKPOINT_SECONDS.time('commit_records'), self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO details (idx, record) VALUES (?, ?)',
+                [(idx, json.dumps(record.to_dict(), ensure_ascii=False)) for idx, record in items]
+            )
+
+    def iter_records(self, chunk_size: int = 1000):
+        """Yield merged OfferRecords in listing order; scraped detail values override listing values."""
+        cursor = self.connection.execute(
+            'SELECT offers.record, details.record FROM offers '
+            'LEFT JOIN details ON details.idx = offers.idx ORDER BY offers.idx'
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for listing, details in rows:
+                record = OfferRecord.from_dict(json.loads(listing))
+                if details:
+                    record.update(OfferRecord.from_dict(json.loads(details)))
+                yield record
+
+    def compact(self, data_file: str, base_file: str = None, chunk_size: int = 1000):
+        """Write the merged records, deduplicated by offer ID, to data_file in chunks and return the row count.
+
+        With base_file, rows of that earlier dataset are carried over first, except
+        for the offers this checkpoint scraped again. The offer keys of both are
+        looked up in SQLite, so memory does not grow with the number of offers.
+        """
+        def records():
+            if base_file and os.path.exists(base_file):
+                import pandas as pd
+
+                # Offer keys of this checkpoint, in a temporary table rather than a set
+                with self.connection:
+                    self.connection.execute('CREATE TEMP TABLE IF NOT EXISTS refreshed (key TEXT PRIMARY KEY)')
+                    self.connection.execute('DELETE FROM refreshed')
+                    self.connection.executemany(
+                        'INSERT OR IGNORE INTO refreshed (key) VALUES (?)',
+                        ((offer_key(link),) for (link,) in self.connection.execute('SELECT link FROM offers'))
+                    )
+                for base_chunk in pd.read_csv(base_file, dtype=str, keep_default_na=False, chunksize=chunk_size):
+                    for row in base_chunk.to_dict('records'):
+                        record = OfferRecord.from_dict(row)
+                        if not self.connection.execute('SELECT 1 FROM refreshed WHERE key = ?',
+                                                       (offer_key(record.link),)).fetchone():
+                            yield record
+            yield from self.iter_records(chunk_size)
+
+        # Replace the output only once it is complete, since base_file may be data_file itself
+        return write_records(records(), data_file, chunk_size, index=DiskDedupIndex(data_file + '.keys.db', False))
+
+    def close(self):
+        self.connection.close()
+
+    def remove(self):
+        """Close the store and delete its files."""
+        self.close()
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(self.path + suffix)
+            except FileNotFoundError:
+                pass
+
+
+def write_records(records, data_file: str, chunk_size: int = 1000, index: DedupIndex = None):
+    """Write OfferRecords to a CSV file in chunks, keeping the first occurrence of every offer ID.
+
+    The file is written under a temporary name and moved into place once
+    complete; the number of rows written is returned. index is the DedupIndex
+    to drop duplicates with, an in-memory one by default; a DiskDedupIndex is
+    removed once the file is written.
+    """
+    temp_file = data_file + '.tmp'
+    seen = index if index is not None else DedupIndex(cross_source=False)
+    written = 0
+    chunk = OfferBatch()
+
+    def flush():
+        nonlocal written, chunk
+        chunk.to_frame().to_csv(
+            temp_file, mode='w' if written == 0 else 'a', header=written == 0, index=False, encoding='utf-8'
+        )
+        written += len(chunk)
+        chunk = OfferBatch()
+
+    try:
+        for record in records:
+            if not seen.add_record(record):
+                continue
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                flush()
+
+        if chunk or written == 0:
+            flush()
+    finally:
+        if isinstance(seen, DiskDedupIndex):
+            seen.remove()
+
+    os.replace(temp_file, data_file)
+    return written
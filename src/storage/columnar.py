@@ -0,0 +1,245 @@
+"""Parquet/Feather copies of the datasets for training, and a lazy loader.
+
+Datasets are directories of compressed Parquet or Feather (Arrow IPC) files,
+hive-partitioned by źródło and scrape date:
+    resources/combined_data.parquet/źródło=olx/data pobrania=2025-03-20/part-0.parquet
+Every run writes a full snapshot into its own date partition, replacing an
+earlier one from the same day. The schema comes from Headers: nullable
+float64 for numeric columns, string for the rest.
+
+load_offers() reads only the requested columns, skips files and row groups
+that the filters rule out, and memory-maps the files. Feather datasets are
+written with zstd like Parquet ones; write them with compression=None to
+read them back zero-copy.
+
+Needs pyarrow, which is imported only when a dataset is written or read.
+"""
+import datetime
+import os
+
+from headers import Headers, NormalizedHeaders
+from records import typed_frame
+
+
+SCRAPE_DATE = 'data pobrania'
+PARTITION_COLUMNS = (Headers.SOURCE.value, SCRAPE_DATE)
+FORMATS = ('parquet', 'feather')
+
+NUMERIC_NORMALIZED_HEADERS = frozenset({
+    NormalizedHeaders.M2,
+    NormalizedHeaders.TOTAL_PRICE,
+    NormalizedHeaders.PRICE_PER_M2,
+    NormalizedHeaders.RENT,
+    NormalizedHeaders.ROOMS,
+    NormalizedHeaders.FLOOR,
+    NormalizedHeaders.TOTAL_FLOORS,
+    NormalizedHeaders.BUILDING_YEAR,
+})
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+    except ImportError as e:
+        raise ImportError("Parquet/Feather output needs pyarrow, install it with: pip install pyarrow") from e
+    return pyarrow
+
+
+def dataset_path(data_file: str, output_format: str):
+    """Dataset directory next to a CSV data file, e.g. resources/olx_data.parquet."""
+    return f'{os.path.splitext(data_file)[0]}.{output_format}'
+
+
+def arrow_schema(partitioned: bool = True, normalized: bool = False):
+    """Arrow schema of the Headers columns, the NormalizedHeaders ones if asked, and the scrape date when partitioned."""
+    pa = _pyarrow()
+    fields = [pa.field(header.value, pa.float64() if header.numeric else pa.string()) for header in Headers]
+    if normalized:
+        fields += [pa.field(header.value, _normalized_type(header)) for header in NormalizedHeaders]
+    if partitioned:
+        fields.append(pa.field(SCRAPE_DATE, pa.date32()))
+    return pa.schema(fields)
+
+
+def _normalized_type(header):
+    pa = _pyarrow()
+    if header == NormalizedHeaders.ELEVATOR:
+        return pa.bool_()
+    if header == NormalizedHeaders.AVAILABLE_FROM:
+        return pa.timestamp('us')
+    if header in NUMERIC_NORMALIZED_HEADERS:
+        return pa.float64()
+    # The rest are categories
+    return pa.dictionary(pa.int32(), pa.string())
+
+
+def _partitioning():
+    pa = _pyarrow()
+    return pa.dataset.partitioning(
+        pa.schema([pa.field(Headers.SOURCE.value, pa.string()), pa.field(SCRAPE_DATE, pa.date32())]),
+        flavor='hive',
+    )
+
+
+def _file_format(output_format: str):
+    pa = _pyarrow()
+    if output_format == 'parquet':
+        return pa.dataset.ParquetFileFormat()
+    if output_format == 'feather':
+        return pa.dataset.IpcFileFormat()
+    raise ValueError(f"Unknown dataset format {output_format}, expected one of {', '.join(FORMATS)}")
+
+
+def _write_batches(batches, root: str, output_format: str, compression: str):
+    # The schema comes with the batches, a RecordBatchReader or a Table
+    pa = _pyarrow()
+    file_format = _file_format(output_format)
+    if output_format == 'feather' and compression is not None:
+        compression = pa.Codec(compression)
+    pa.dataset.write_dataset(
+        batches, root, format=file_format,
+        file_options=file_format.make_write_options(compression=compression),
+        partitioning=_partitioning(), existing_data_behavior='delete_matching',
+        basename_template=f'part-{{i}}.{output_format}',
+    )
+
+
+def _with_scrape_date(batch, scrape_date):
+    pa = _pyarrow()
+    dates = pa.array([scrape_date] * batch.num_rows, type=pa.date32())
+    return pa.RecordBatch.from_arrays(batch.columns + [dates], schema=arrow_schema())
+
+
+def write_csv_dataset(data_file: str, output_format: str = 'parquet', scrape_date: datetime.date = None,
+                      compression: str = 'zstd', block_size: int = 16 * 2**20):
+    """Convert a CSV data file into its dataset directory in blocks and return the directory."""
+    pa = _pyarrow()
+    import pyarrow.csv
+
+    scrape_date = scrape_date or datetime.date.today()
+    schema = arrow_schema(partitioned=False)
+    reader = pyarrow.csv.open_csv(
+        data_file,
+        read_options=pyarrow.csv.ReadOptions(block_size=block_size),
+        convert_options=pyarrow.csv.ConvertOptions(column_types=schema, include_columns=schema.names,
+                                                   strings_can_be_null=True),
+    )
+    root = dataset_path(data_file, output_format)
+    batches = (_with_scrape_date(batch, scrape_date) for batch in reader)
+    _write_batches(pa.RecordBatchReader.from_batches(arrow_schema(), batches), root, output_format, compression)
+    return root
+
+
+def write_frame_dataset(df, root: str, output_format: str = 'parquet', scrape_date: datetime.date = None,
+                        compression: str = 'zstd'):
+    """Write a DataFrame with Headers columns into a dataset directory and return the directory.
+
+    NormalizedHeaders columns (see pipeline.normalize) are kept when df has them.
+    """
+    normalized = all(header.value in df for header in NormalizedHeaders)
+    return write_frames_dataset([df], root, output_format, scrape_date, compression, normalized=normalized)
+
+
+def write_frames_dataset(frames, root: str, output_format: str = 'parquet', scrape_date: datetime.date = None,
+                         compression: str = 'zstd', normalized: bool = False):
+    """write_frame_dataset() for an iterable of DataFrame chunks, converted and written one at a time.
+
+    With normalized every chunk must have the NormalizedHeaders columns, and
+    for Feather the same categories in each of them (see
+    pipeline.normalize.category_values).
+    """
+    import pandas as pd
+
+    pa = _pyarrow()
+
+    scrape_date = scrape_date or datetime.date.today()
+    schema = arrow_schema(normalized=normalized)
+
+    def batches():
+        for df in frames:
+            frame = typed_frame(df)
+            if normalized:
+                frame = pd.concat([frame, df[[header.value for header in NormalizedHeaders]]], axis=1)
+            frame = frame.assign(**{SCRAPE_DATE: scrape_date})
+            yield from pa.Table.from_pandas(frame, schema=schema, preserve_index=False).to_batches()
+
+    _write_batches(pa.RecordBatchReader.from_batches(schema, batches()), root, output_format, compression)
+    return root
+
+
+def _expression(filters):
+    """pyarrow expression from [(column, op, value), ...] conditions that must all hold."""
+    pa = _pyarrow()
+    operators = {
+        '==': lambda field, value: field == value,
+        '!=': lambda field, value: field != value,
+        '<': lambda field, value: field < value,
+        '<=': lambda field, value: field <= value,
+        '>': lambda field, value: field > value,
+        '>=': lambda field, value: field >= value,
+        'in': lambda field, value: field.isin(list(value)),
+        'not in': lambda field, value: ~field.isin(list(value)),
+    }
+    expression = None
+    for column, op, value in filters:
+        if op not in operators:
+            raise ValueError(f"Unknown filter operator {op}, expected one of {', '.join(operators)}")
+        condition = operators[op](pa.dataset.field(column), value)
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def open_offers(root: str, output_format: str = None):
+    """Lazy pyarrow Dataset over a dataset directory, memory-mapping its files.
+
+    Snapshots written with and without NormalizedHeaders columns can share a
+    directory; the older ones read those columns as nulls.
+    """
+    pa = _pyarrow()
+    import pyarrow.fs
+
+    output_format = output_format or os.path.splitext(root.rstrip(os.sep))[1].lstrip('.') or 'parquet'
+    options = dict(format=_file_format(output_format), partitioning=_partitioning(),
+                   filesystem=pyarrow.fs.LocalFileSystem(use_mmap=True))
+    # Only the file footers are read to find out which snapshots have which columns
+    fragments = pa.dataset.dataset(root, **options).get_fragments()
+    normalized = any(NormalizedHeaders.M2.value in fragment.physical_schema.names for fragment in fragments)
+    return pa.dataset.dataset(root, schema=arrow_schema(normalized=normalized), **options)
+
+
+def load_offers(root: str, columns=None, filters=None, latest: bool = True, as_arrow: bool = False):
+    """Read offers from a dataset directory into a DataFrame (or an Arrow table with as_arrow).
+
+    columns limits what is read, e.g. ['cena', 'powierzchnia', 'lokalizacja'].
+    filters are (column, op, value) conditions that must all hold, e.g.
+    [('źródło', '==', 'olx'), ('cena', '<', 500000)]; partition columns prune
+    whole files and the rest skip Parquet row groups by their statistics.
+    With latest, only the most recent scrape of every source is read.
+    """
+    import pandas as pd
+
+    dataset = open_offers(root)
+    expression = _expression(filters or [])
+
+    if latest:
+        # Partition values come from the paths, so this does not touch the data
+        snapshots = {}
+        for fragment in dataset.get_fragments(filter=expression):
+            keys = _pyarrow().dataset.get_partition_keys(fragment.partition_expression)
+            source, date = keys.get(Headers.SOURCE.value), keys.get(SCRAPE_DATE)
+            snapshots[source] = max(snapshots.get(source, date), date)
+        if snapshots:
+            pa = _pyarrow()
+            latest_expression = None
+            for source, date in snapshots.items():
+                condition = (pa.dataset.field(Headers.SOURCE.value) == source) & (pa.dataset.field(SCRAPE_DATE) == date)
+                latest_expression = condition if latest_expression is None else latest_expression | condition
+            expression = latest_expression if expression is None else expression & latest_expression
+
+    table = dataset.to_table(columns=columns, filter=expression)
+    if as_arrow:
+        return table
+    pa = _pyarrow()
+    return table.to_pandas(types_mapper={pa.float64(): pd.Float64Dtype(), pa.string(): pd.StringDtype(),
+                                         pa.bool_(): pd.BooleanDtype()}.get)
@@ -0,0 +1,266 @@
+"""Offer identity: normalized URLs, site offer IDs and cross-site flat keys.
+
+The same offer shows up under several URLs: OLX links straight to Otodom
+offers with a trailing .html, Otodom promotes offers under /hpr/, and links
+pick up tracking query parameters. offer_key() reduces all of them to the
+site's offer ID. The same flat listed separately on both sites is matched by
+flat_key(), built from its area, price, rooms, location and floor.
+"""
+import functools
+import math
+import os
+import re
+import sqlite3
+import threading
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from headers import Headers
+
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = frozenset({'search_reason', 'reason', 'ad_reason', 'isPromoted', 'fbclid', 'gclid', 'ref'})
+
+# Offer links: otodom.pl/pl/oferta/<slug>-ID4uTlW[.html], olx.pl/d/oferta/<slug>-CID3-IDabcd1.html
+OFFER_LINK_PATTERN = re.compile(r'^\s*https?://(?:www\.)?([^/?#]+)/[^?#]*-ID([0-9A-Za-z]+)(?:\.html)?/?(?:[?#].*)?$',
+                                re.IGNORECASE)
+SITES = {'olx.pl': 'olx', 'otodom.pl': 'otodom'}
+
+DISK_INDEX_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS offers (key TEXT PRIMARY KEY) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS flats (key TEXT PRIMARY KEY, site TEXT NOT NULL) WITHOUT ROWID;
+'''
+
+
+@functools.lru_cache(maxsize=1024)
+def _site(host: str):
+    host = host.lower()
+    host = host[4:] if host.startswith('www.') else host
+    return SITES.get(host, host)
+
+
+def site_of(url: str):
+    """'olx' or 'otodom' for links to those sites, else the bare host."""
+    return _site(urlsplit(url).netloc)
+
+
+def normalize_url(url: str):
+    """Lowercase host without www., no fragment, no tracking parameters and no trailing slash."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    host = host[4:] if host.startswith('www.') else host
+    query = urlencode([
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in TRACKING_PARAMS and not key.startswith('utm_')
+    ])
+    return urlunsplit((parts.scheme.lower() or 'https', host, parts.path.rstrip('/'), query, ''))
+
+
+def offer_key(url):
+    """'<site>:<offer ID>' for offer links, the normalized URL otherwise, None for empty links."""
+    return offer_identity(url)[0]
+
+
+def offer_identity(url):
+    """(offer_key(url), site_of(url)) with a single match of the link, or (None, None) for empty links."""
+    if not isinstance(url, str) or not url.strip():
+        return None, None
+    match = OFFER_LINK_PATTERN.match(url)
+    if match:
+        site = _site(match.group(1))
+        return f'{site}:{match.group(2)}', site
+    return normalize_url(url), site_of(url)
+
+
+def _number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def _text(value):
+    return ' '.join(value.casefold().split()) if isinstance(value, str) else ''
+
+
+def flat_key(area, price, rooms, location, floor):
+    """Key identifying a flat across sites, or None when there is too little to go on.
+
+    Area is rounded to whole square metres and price to thousands of zł, since
+    the sites round differently. Area and price are required, and so is at
+    least one of location and floor: many new-build flats share area, price
+    and rooms.
+    """
+    area = _number(area)
+    price = _number(price)
+    if area is None or price is None:
+        return None
+    location = _text(location)
+    floor = _text(floor)
+    if not location and not floor:
+        return None
+    rooms = _number(rooms)
+    return round(area), round(price, -3), None if rooms is None else int(rooms), location, floor
+
+
+class DedupIndex:
+    """Single-pass duplicate detection over offer IDs and cross-site flat keys.
+
+    add() returns True for the first occurrence of an offer and False for a
+    duplicate; records without a link are always kept.
+    """
+
+    def __init__(self, cross_source: bool = True):
+        self.cross_source = cross_source
+        self.offers = set()
+        self.flats = {}
+        self.duplicate_offers = 0
+        self.duplicate_flats = 0
+
+    def _new_offer(self, key):
+        """Remember an offer key; True when it was not seen before."""
+        if key in self.offers:
+            return False
+        self.offers.add(key)
+        return True
+
+    def _first_site(self, flat, site):
+        """Site the flat was first seen on, remembering site for flats not seen before."""
+        return self.flats.setdefault(flat, site)
+
+    def add(self, link, area=None, price=None, rooms=None, location=None, floor=None):
+        """Register one offer."""
+        key, site = offer_identity(link)
+        if key is None:
+            return True
+        flat = flat_key(area, price, rooms, location, floor) if self.cross_source else None
+        return self.add_keys(key, flat, site)
+
+    def add_keys(self, key, flat=None, site=None):
+        """add() for an offer whose offer_key, flat_key (None without one) and site are already known."""
+        # Later rows of this offer are duplicates even when this one goes as a flat from the other site
+        if not self._new_offer(key):
+            self.duplicate_offers += 1
+            return False
+
+        if self.cross_source and flat is not None:
+            # Identical flats on one site are usually separate units of one development
+            if self._first_site(flat, site) != site:
+                self.duplicate_flats += 1
+                return False
+        return True
+
+    def add_record(self, record):
+        """add() for an OfferRecord."""
+        return self.add(record.link, record.m2, record.total_price, record.rooms, record.location, record.floor)
+
+
+class DiskDedupIndex(DedupIndex):
+    """DedupIndex keeping its offer and flat keys in a scratch SQLite file rather than in memory.
+
+    For deduplicating a dataset chunk by chunk (see pipeline.combine) in memory
+    that does not grow with the number of offers. The chunks may be produced
+    on another thread than the one that made the index, such as pyarrow's
+    dataset writer; the connection is shared and used under a lock.
+    remove() deletes the file.
+    """
+
+    def __init__(self, path: str, cross_source: bool = True):
+        super().__init__(cross_source)
+        self.path = path
+        # A file left by an interrupted run holds the keys of another dataset
+        if os.path.exists(path):
+            os.remove(path)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # Scratch data: nothing to recover after a crash
+        self.connection.execute('PRAGMA journal_mode=OFF')
+        self.connection.execute('PRAGMA synchronous=OFF')
+        self.connection.executescript(DISK_INDEX_SCHEMA)
+
+    def _new_offer(self, key):
+        with self._lock:
+            return self.connection.execute('INSERT OR IGNORE INTO offers (key) VALUES (?)', (key,)).rowcount == 1
+
+    def _first_site(self, flat, site):
+        flat = repr(flat)
+        with self._lock:
+            if self.connection.execute('INSERT OR IGNORE INTO flats (key, site) VALUES (?, ?)',
+                                       (flat, site)).rowcount:
+                return site
+            return self.connection.execute('SELECT site FROM flats WHERE key = ?', (flat,)).fetchone()[0]
+
+    def remove(self):
+        """Close the index and delete its file."""
+        with self._lock:
+            self.connection.close()
+        os.remove(self.path)
+
+
+def _per_value(values, function):
+    """function of every row of an array, called once per distinct value (and once for missing values)."""
+    import numpy as np
+    import pandas as pd
+
+    codes, uniques = pd.factorize(values)
+    # Filled one by one, since numpy would unpack tuple results into a second dimension
+    results = np.empty(len(uniques) + 1, dtype=object)
+    for position, value in enumerate(uniques.tolist()):
+        results[position] = function(value)
+    # Code -1, for missing values, picks the last entry
+    results[-1] = function(None)
+    return results[codes]
+
+
+def _rounded(digits):
+    def rounded(value):
+        value = _number(value)
+        return None if value is None else round(value, digits)
+    return rounded
+
+
+def _whole(value):
+    value = _number(value)
+    return None if value is None else int(value)
+
+
+def deduplicate(df, cross_source: bool = True, index: DedupIndex = None):
+    """Drop duplicate offers from a DataFrame with Headers columns, keeping first occurrences.
+
+    Equivalent of feeding every row through DedupIndex, with the keys built
+    per distinct value rather than per row: offer_identity() runs once per
+    distinct link, and flat keys are put together from the rounded and
+    cleaned-up values of each column. Only the final pass over the rows, with
+    the keys ready, is a Python loop.
+    To deduplicate a dataset chunk by chunk, pass the same index with every
+    chunk: rows of offers and flats it has seen in earlier chunks are dropped
+    too, and its counters add up the duplicates of all chunks.
+    """
+    import numpy as np
+
+    chunked = index is not None
+    index = index if chunked else DedupIndex(cross_source)
+    duplicate_offers, duplicate_flats = index.duplicate_offers, index.duplicate_flats
+
+    identities = _per_value(df[Headers.LINK.value], offer_identity)
+    rows = len(df)
+    if index.cross_source:
+        def column(header, function):
+            if header.value not in df:
+                return [function(None)] * rows
+            return _per_value(df[header.value], function)
+
+        flats = [flat if flat[0] is not None and flat[1] is not None and (flat[3] or flat[4]) else None
+                 for flat in zip(column(Headers.M2, _rounded(None)), column(Headers.TOTAL_PRICE, _rounded(-3)),
+                                 column(Headers.ROOMS, _whole), column(Headers.LOCATION, _text),
+                                 column(Headers.FLOOR, _text))]
+    else:
+        flats = [None] * rows
+
+    keep = np.fromiter((key is None or index.add_keys(key, flat, site)
+                        for (key, site), flat in zip(identities, flats)), dtype=bool, count=rows)
+
+    if not chunked:
+        print(f"Removed {index.duplicate_offers - duplicate_offers} duplicate offers and "
+              f"{index.duplicate_flats - duplicate_flats} flats listed on both sites")
+    return df[keep]
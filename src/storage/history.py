@@ -0,0 +1,270 @@
+import itertools
+import json
+import math
+import sqlite3
+import time
+
+from headers import Headers
+from records import OfferBatch, OfferRecord
+from .dedup import offer_key
+
+
+# Fields whose changes are recorded, besides the status of the offer
+TRACKED_FIELDS = (Headers.TOTAL_PRICE.field, Headers.PRICE_PER_M2.field, Headers.RENT.field)
+STATUS = 'status'
+ACTIVE = 'active'
+DELISTED = 'delisted'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS changes (
+    offer_id TEXT NOT NULL,
+    field TEXT NOT NULL,
+    observed_at REAL NOT NULL,
+    value,
+    PRIMARY KEY (offer_id, field, observed_at)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS offers (
+    offer_id TEXT PRIMARY KEY,
+    source TEXT,
+    region TEXT,
+    link TEXT,
+    status TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS offers_source_status ON offers (source, status);
+'''
+# Latest value of every tracked field per offer, one seek on the changes key each, so that the
+# cost grows with the number of offers and not with the length of their history
+AS_OF_QUERY = (
+    'WITH tracked (field) AS (VALUES ' + ', '.join(f"('{field}')" for field in (*TRACKED_FIELDS, STATUS)) + ') '
+    'SELECT offers.offer_id, offers.first_seen, offers.record, tracked.field, '
+    '(SELECT value FROM changes WHERE changes.offer_id = offers.offer_id AND changes.field = tracked.field '
+    'AND changes.observed_at <= :timestamp ORDER BY changes.observed_at DESC LIMIT 1) '
+    'FROM offers CROSS JOIN tracked WHERE offers.first_seen <= :timestamp'
+)
+
+
+def _same(old, new):
+    if isinstance(old, float) and isinstance(new, float):
+        return math.isclose(old, new, abs_tol=0.005)
+    return old == new
+
+
+class OfferHistory:
+    """Append-only change log of every offer's price, rent and status, keyed by offer ID (dedup.offer_key).
+
+    Each run records only the fields that changed since the offer was last
+    seen, so the history grows with the changes rather than with the runs.
+    The offers table is the index of the current state: the latest merged
+    record, status and first/last sighting of every offer, one row each.
+    State as of a date is read from the change log through its
+    (offer_id, field, observed_at) key, one index seek per offer and field.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+        # Files written before offers had a region get the column; their offers take one when next seen
+        if 'region' not in {column for _, column, *_ in self.connection.execute('PRAGMA table_info(offers)')}:
+            self.connection.execute('ALTER TABLE offers ADD COLUMN region TEXT')
+
+    def _append(self, offer_id, observed_at, values: dict):
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO changes (offer_id, field, observed_at, value) VALUES (?, ?, ?, ?)',
+            [(offer_id, field, observed_at, value) for field, value in values.items()]
+        )
+
+    def record_snapshot(self, source: str, records, observed_at: float = None, listed=None, region: str = None):
+        """Record the changes in freshly scraped OfferRecords of a source and return counts by outcome.
+
+        listed holds the links of every offer on the source's listing pages in
+        this run; when given, listed offers count as seen even if they were not
+        scraped again, and active offers of the source missing from it are
+        marked delisted. Pass it only for runs that walked every listing page.
+        With region, the records are stored as offers of that region and only
+        the region's offers can be delisted, so walking one region of a source
+        leaves the others alone.
+        """
+        observed_at = observed_at or time.time()
+        counts = {'new': 0, 'changed': 0, 'unchanged': 0, 'relisted': 0, 'delisted': 0}
+        seen = set()
+        with self.connection:
+            for record in records:
+                offer_id = offer_key(record.link)
+                if offer_id is None or offer_id in seen:
+                    continue
+                seen.add(offer_id)
+                row = self.connection.execute(
+                    'SELECT status, record FROM offers WHERE offer_id = ?', (offer_id,)
+                ).fetchone()
+                if row is None:
+                    values = {field: getattr(record, field) for field in TRACKED_FIELDS
+                              if getattr(record, field) is not None}
+                    values[STATUS] = ACTIVE
+                    self._append(offer_id, observed_at, values)
+                    self.connection.execute(
+                        'INSERT INTO offers (offer_id, source, region, link, status, first_seen, last_seen, record) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        (offer_id, source, region, record.link, ACTIVE, observed_at, observed_at,
+                         json.dumps(record.to_dict(), ensure_ascii=False))
+                    )
+                    counts['new'] += 1
+                    continue
+
+                status, stored = row
+                current = OfferRecord.from_dict(json.loads(stored))
+                values = {field: getattr(record, field) for field in TRACKED_FIELDS
+                          if getattr(record, field) is not None
+                          and not _same(getattr(current, field), getattr(record, field))}
+                if status != ACTIVE:
+                    values[STATUS] = ACTIVE
+                    counts['relisted'] += 1
+                counts['changed' if values else 'unchanged'] += 1
+                self._append(offer_id, observed_at, values)
+                self.connection.execute(
+                    'UPDATE offers SET link = ?, region = COALESCE(?, region), status = ?, last_seen = ?, record = ? '
+                    'WHERE offer_id = ?',
+                    (record.link, region, ACTIVE, observed_at,
+                     json.dumps(current.update(record).to_dict(), ensure_ascii=False), offer_id)
+                )
+
+            if listed is not None:
+                listed = {offer_key(link) for link in listed} - seen - {None}
+                counts['relisted'] += self._set_status(listed, ACTIVE, observed_at)
+                self.connection.executemany('UPDATE offers SET last_seen = ? WHERE offer_id = ?',
+                                            [(observed_at, offer_id) for offer_id in listed])
+                query, parameters = 'SELECT offer_id FROM offers WHERE source = ? AND status = ?', [source, ACTIVE]
+                if region is not None:
+                    query += ' AND region = ?'
+                    parameters.append(region)
+                missing = [offer_id for (offer_id,) in self.connection.execute(query, parameters)
+                           if offer_id not in listed and offer_id not in seen]
+                counts['delisted'] += self._set_status(missing, DELISTED, observed_at)
+        return counts
+
+    def _set_status(self, offer_ids, status: str, observed_at: float):
+        """Change the status of the given offers that have another one; returns how many changed."""
+        changed = 0
+        for offer_id in offer_ids:
+            updated = self.connection.execute(
+                'UPDATE offers SET status = ? WHERE offer_id = ? AND status != ?', (status, offer_id, status)
+            ).rowcount
+            if updated:
+                self._append(offer_id, observed_at, {STATUS: status})
+                changed += 1
+        return changed
+
+    def mark_delisted(self, links, observed_at: float = None):
+        """Record offers known to be taken down (404/410 on their page); returns how many were active.
+
+        Offers seen at observed_at or later, by a snapshot of the same run, are
+        left active.
+        """
+        observed_at = observed_at or time.time()
+        with self.connection:
+            offer_ids = [offer_id for offer_id in {offer_key(link) for link in links} - {None}
+                         if not self.connection.execute('SELECT 1 FROM offers WHERE offer_id = ? AND last_seen >= ?',
+                                                        (offer_id, observed_at)).fetchone()]
+            return self._set_status(offer_ids, DELISTED, observed_at)
+
+    def current(self, link: str):
+        """Latest merged record of an offer with its status and first/last sighting, or None."""
+        row = self.connection.execute(
+            'SELECT record, status, first_seen, last_seen FROM offers WHERE offer_id = ?', (offer_key(link),)
+        ).fetchone()
+        if row is None:
+            return None
+        record, status, first_seen, last_seen = row
+        return {'record': OfferRecord.from_dict(json.loads(record)), STATUS: status,
+                'first_seen': first_seen, 'last_seen': last_seen}
+
+    def _as_of(self, timestamp: float, offer_id: str = None, source: str = None):
+        """Yield (offer_id, first_seen, record JSON, {field: value}) of the offers first seen by timestamp."""
+        query = AS_OF_QUERY
+        parameters = {'timestamp': timestamp}
+        if offer_id is not None:
+            query += ' AND offers.offer_id = :offer_id'
+            parameters['offer_id'] = offer_id
+        if source is not None:
+            query += ' AND offers.source = :source'
+            parameters['source'] = source
+        rows = self.connection.execute(query + ' ORDER BY offers.offer_id', parameters)
+        for offer_id, group in itertools.groupby(rows, key=lambda row: row[0]):
+            values = {}
+            for _, first_seen, record, field, value in group:
+                if value is not None:
+                    values[field] = value
+            yield offer_id, first_seen, record, values
+
+    def as_of(self, link: str, timestamp: float):
+        """Tracked field -> value of an offer as of timestamp; empty before the offer was first seen."""
+        for _, _, _, values in self._as_of(timestamp, offer_id=offer_key(link)):
+            return values
+        return {}
+
+    def changes(self, link: str):
+        """(observed_at, field, value) of every recorded change of an offer, oldest first."""
+        return self.connection.execute(
+            'SELECT observed_at, field, value FROM changes WHERE offer_id = ? ORDER BY observed_at, field',
+            (offer_key(link),)
+        ).fetchall()
+
+    def current_frame(self, source: str = None, active_only: bool = True):
+        """DataFrame of the current records (Headers columns) plus offer ID, status and first/last sighting."""
+        query = 'SELECT offer_id, status, first_seen, last_seen, record FROM offers'
+        conditions, parameters = [], []
+        if source is not None:
+            conditions.append('source = ?')
+            parameters.append(source)
+        if active_only:
+            conditions.append('status = ?')
+            parameters.append(ACTIVE)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        return self._frame(self.connection.execute(query + ' ORDER BY offer_id', parameters))
+
+    def as_of_frame(self, timestamp: float, source: str = None, active_only: bool = True):
+        """current_frame() as it was at timestamp: offers first seen by then, with their tracked values and status then.
+
+        The other columns keep their latest values, as attributes like the floor
+        area or the floor are not tracked.
+        """
+        rows = []
+        for offer_id, first_seen, record, values in self._as_of(timestamp, source=source):
+            status = values.pop(STATUS, None)
+            if active_only and status != ACTIVE:
+                continue
+            record = OfferRecord.from_dict(json.loads(record))
+            for field in TRACKED_FIELDS:
+                setattr(record, field, values.get(field))
+            rows.append((offer_id, status, first_seen, None, record))
+        return self._frame(rows, decoded=True)
+
+    @staticmethod
+    def _frame(rows, decoded: bool = False):
+        ids, statuses, first_seen, last_seen = [], [], [], []
+        batch = OfferBatch()
+        for offer_id, status, first, last, record in rows:
+            ids.append(offer_id)
+            statuses.append(status)
+            first_seen.append(first)
+            last_seen.append(last)
+            batch.append(record if decoded else OfferRecord.from_dict(json.loads(record)))
+
+        import pandas as pd
+
+        df = batch.to_frame()
+        df.insert(0, 'offer_id', pd.array(ids, dtype='string'))
+        df['status'] = pd.array(statuses, dtype='string')
+        df['first_seen'] = pd.to_datetime(first_seen, unit='s')
+        if not decoded:
+            df['last_seen'] = pd.to_datetime(last_seen, unit='s')
+        return df
+
+    def close(self):
+        self.connection.close()
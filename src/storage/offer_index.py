@@ -0,0 +1,63 @@
+import math
+import os
+
+from headers import Headers
+from .dedup import offer_key
+
+
+def _normalize_price(value):
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(price) else round(price, 2)
+
+
+def _normalize_title(value):
+    return value.strip() if isinstance(value, str) else ''
+
+
+class OfferIndex:
+    """Offer key (see dedup.offer_key) -> (price, title) of the offers already present in a dataset."""
+
+    def __init__(self, entries: dict = None):
+        self.entries = entries or {}
+
+    @classmethod
+    def load(cls, data_file: str, chunk_size: int = 20000):
+        """Read only the link, price and title columns of a previous data file, chunk_size rows at a time."""
+        if not os.path.exists(data_file):
+            return cls()
+
+        import pandas as pd
+
+        columns = [Headers.LINK.value, Headers.TOTAL_PRICE.value, Headers.TITLE.value]
+        entries = {}
+        with pd.read_csv(data_file, usecols=columns, dtype=str, keep_default_na=False, chunksize=chunk_size) as reader:
+            for df in reader:
+                entries.update(
+                    (offer_key(link), (_normalize_price(price), _normalize_title(title)))
+                    for link, price, title in zip(*(df[column] for column in columns))
+                    if link
+                )
+        return cls(entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, link):
+        return offer_key(link) in self.entries
+
+    def is_changed(self, link: str, price, title):
+        """True for links not in the index and for offers whose listing price or title differs."""
+        known = self.entries.get(offer_key(link))
+        if known is None:
+            return True
+        known_price, known_title = known
+        price = _normalize_price(price)
+        title = _normalize_title(title)
+        return (price is not None and price != known_price) or (title != '' and title != known_title)
+
+    def changed_records(self, records):
+        """Filter listing OfferRecords down to the ones that need their details scraped."""
+        return [record for record in records if self.is_changed(record.link, record.total_price, record.title)]
@@ -0,0 +1,129 @@
+import json
+import random
+import sqlite3
+import time
+
+from records import OfferRecord
+
+
+# Failure kinds, see classify_failure
+TIMEOUT = 'timeout'
+NETWORK = 'network'
+GONE = 'gone'
+CLIENT_ERROR = 'http_4xx'
+SERVER_ERROR = 'http_5xx'
+PARSE_ERROR = 'parse'
+
+# Offers that were taken down are not worth retrying
+PERMANENT_KINDS = {GONE}
+GONE_STATUSES = (404, 410)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS retries (
+    link TEXT PRIMARY KEY,
+    record TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    error TEXT,
+    attempts INTEGER NOT NULL,
+    next_attempt REAL NOT NULL,
+    dead INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS retries_due ON retries (dead, next_attempt);
+'''
+
+
+def classify_failure(status: int = 0, timed_out: bool = False):
+    """Failure kind of a detail fetch that did not succeed."""
+    if timed_out:
+        return TIMEOUT
+    if status in GONE_STATUSES:
+        return GONE
+    if 400 <= status < 500:
+        return CLIENT_ERROR
+    if status >= 500:
+        return SERVER_ERROR
+    return NETWORK
+
+
+class RetryQueue:
+    """Persistent retry and dead-letter queue of offers whose details could not be scraped.
+
+    Every failure is stored with its kind and the listing record of the offer,
+    and rescheduled with exponential backoff and jitter. Offers come back to
+    the detail workers at the end of the run or in the next one, until they
+    succeed, are gone (404/410) or have failed max_attempts times, after which
+    they stay in the table as dead letters. An offer that is scraped
+    successfully later on, as a relisted one can be, leaves the table either way.
+    """
+
+    def __init__(self, path: str, base_delay: float = 5.0, max_delay: float = 3600.0, max_attempts: int = 5):
+        self.path = path
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        # Crawl worker processes share the file of a source, so writers wait for each other
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+
+    def backoff(self, attempts: int):
+        """Delay before the next attempt: exponential in attempts, with half of it random."""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def add_failure(self, link: str, record: OfferRecord, kind: str, error: str = None):
+        """Record a failed attempt and return True if the offer will be retried, False once it is a dead letter."""
+        row = self.connection.execute('SELECT attempts FROM retries WHERE link = ?', (link,)).fetchone()
+        attempts = (row[0] if row else 0) + 1
+        dead = kind in PERMANENT_KINDS or attempts >= self.max_attempts
+        now = time.time()
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO retries (link, record, kind, error, attempts, next_attempt, dead, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (link, json.dumps(record.to_dict(), ensure_ascii=False), kind, error, attempts,
+                 now + self.backoff(attempts), int(dead), now)
+            )
+        return not dead
+
+    def resolve(self, links):
+        """Drop the offers that have now been scraped, dead letters included."""
+        # Looked up in the table, which other processes write too; successes only take the write lock
+        # when they resolve an offer
+        links = [link for link in links
+                 if self.connection.execute('SELECT 1 FROM retries WHERE link = ?', (link,)).fetchone()]
+        if not links:
+            return
+        with self.connection:
+            self.connection.executemany('DELETE FROM retries WHERE link = ?', [(link,) for link in links])
+
+    def due(self, within: float = 0.0):
+        """Listing records of the offers whose next attempt is due within the given number of seconds."""
+        rows = self.connection.execute(
+            'SELECT record FROM retries WHERE dead = 0 AND next_attempt <= ? ORDER BY next_attempt',
+            (time.time() + within,)
+        )
+        return [OfferRecord.from_dict(json.loads(record)) for (record,) in rows]
+
+    def next_attempt(self):
+        """Time of the earliest scheduled retry, or None."""
+        return self.connection.execute('SELECT MIN(next_attempt) FROM retries WHERE dead = 0').fetchone()[0]
+
+    def counts(self):
+        """Offers waiting for a retry and dead letters, by failure kind."""
+        counts = {'waiting': {}, 'dead': {}}
+        for kind, dead, count in self.connection.execute(
+                'SELECT kind, dead, COUNT(*) FROM retries GROUP BY kind, dead'):
+            counts['dead' if dead else 'waiting'][kind] = count
+        return counts
+
+    def dead_letters(self, since: float = 0.0):
+        """(link, kind, error, attempts) of the offers that will not be retried, dead-lettered since the given time."""
+        return self.connection.execute(
+            'SELECT link, kind, error, attempts FROM retries WHERE dead = 1 AND updated_at >= ? ORDER BY updated_at',
+            (since,)
+        ).fetchall()
+
+    def close(self):
+        self.connection.close()
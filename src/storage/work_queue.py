@@ -0,0 +1,251 @@
+import contextlib
+import json
+import sqlite3
+import time
+
+from records import OfferRecord
+
+
+# Task states
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    region TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    offers INTEGER,
+    updated_at REAL NOT NULL,
+    UNIQUE (source, region, page)
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_expires);
+CREATE TABLE IF NOT EXISTS shards (
+    source TEXT NOT NULL,
+    region TEXT NOT NULL,
+    page_count INTEGER,
+    PRIMARY KEY (source, region)
+);
+CREATE TABLE IF NOT EXISTS offers (
+    source TEXT NOT NULL,
+    region TEXT NOT NULL,
+    link TEXT NOT NULL,
+    task_id INTEGER NOT NULL,
+    record TEXT NOT NULL,
+    PRIMARY KEY (source, region, link)
+);
+'''
+
+
+class WorkQueue:
+    """Durable SQLite queue of (source, region, page) listing tasks shared by crawl workers.
+
+    Workers lease tasks for lease_seconds and extend the lease with heartbeats
+    while they work; a task whose lease runs out (its worker crashed or hung)
+    is handed to the next worker that asks. Results are stored with the task
+    completion in one transaction, and only by the worker still holding the
+    lease, so a task taken over from a slow worker is never stored twice.
+
+    Any number of processes can share the database file; on several machines
+    it has to be on a file system with working locks.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 60.0, max_attempts: int = 5):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Autocommit mode; transactions are explicit, see _transaction
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        # Takes the write lock up front, so what a transaction reads is still true when it writes
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+    def add_tasks(self, tasks):
+        """Queue (source, region, page) tasks that are not queued yet; returns how many were added."""
+        now = time.time()
+        with self._transaction():
+            before = self.connection.total_changes
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO tasks (source, region, page, status, updated_at) VALUES (?, ?, ?, ?, ?)',
+                [(source, region, page, PENDING, now) for source, region, page in tasks]
+            )
+            return self.connection.total_changes - before
+
+    def lease(self, owner: str, limit: int = 1):
+        """Lease up to limit tasks, pending or with an expired lease, as (id, source, region, page) tuples."""
+        now = time.time()
+        with self._transaction():
+            # A task whose worker keeps dying on it is not handed out forever
+            self.connection.execute(
+                "UPDATE tasks SET status = ?, error = 'lease expired', updated_at = ? "
+                'WHERE status = ? AND lease_expires < ? AND attempts >= ?',
+                (FAILED, now, LEASED, now, self.max_attempts)
+            )
+            rows = self.connection.execute(
+                'SELECT id, source, region, page FROM tasks '
+                'WHERE status = ? OR (status = ? AND lease_expires < ?) ORDER BY page, id LIMIT ?',
+                (PENDING, LEASED, now, limit)
+            ).fetchall()
+            self.connection.executemany(
+                'UPDATE tasks SET status = ?, owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? '
+                'WHERE id = ?',
+                [(LEASED, owner, now + self.lease_seconds, now, task_id) for task_id, *_ in rows]
+            )
+        return rows
+
+    def heartbeat(self, owner: str, task_ids):
+        """Extend the leases owner still holds; returns the ids of those it lost to another worker."""
+        now = time.time()
+        lost = []
+        with self._transaction():
+            for task_id in task_ids:
+                updated = self.connection.execute(
+                    'UPDATE tasks SET lease_expires = ?, updated_at = ? WHERE id = ? AND owner = ? AND status = ?',
+                    (now + self.lease_seconds, now, task_id, owner, LEASED)
+                ).rowcount
+                if not updated:
+                    lost.append(task_id)
+        return lost
+
+    def complete(self, task_id: int, owner: str, records):
+        """Store the OfferRecords of a leased task and mark it done.
+
+        Offers already stored for the same source and region are skipped. Returns
+        the number of new offers, or None when the lease was lost meanwhile and
+        nothing was stored.
+        """
+        with self._transaction():
+            task = self.connection.execute(
+                'SELECT source, region FROM tasks WHERE id = ? AND owner = ? AND status = ?', (task_id, owner, LEASED)
+            ).fetchone()
+            if task is None:
+                return None
+            source, region = task
+            before = self.connection.total_changes
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO offers (source, region, link, task_id, record) VALUES (?, ?, ?, ?, ?)',
+                [(source, region, record.link, task_id, json.dumps(record.to_dict(), ensure_ascii=False))
+                 for record in records if record.link]
+            )
+            added = self.connection.total_changes - before
+            self.connection.execute(
+                'UPDATE tasks SET status = ?, offers = ?, lease_expires = NULL, error = NULL, updated_at = ? '
+                'WHERE id = ?',
+                (DONE, added, time.time(), task_id)
+            )
+        return added
+
+    def fail(self, task_id: int, owner: str, error: str):
+        """Give a leased task back for another attempt, or mark it failed after max_attempts."""
+        with self._transaction():
+            self.connection.execute(
+                'UPDATE tasks SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, owner = NULL, '
+                'lease_expires = NULL, error = ?, updated_at = ? WHERE id = ? AND owner = ? AND status = ?',
+                (self.max_attempts, FAILED, PENDING, error, time.time(), task_id, owner, LEASED)
+            )
+
+    def requeue_failed(self):
+        """Give the tasks that ran out of attempts a fresh set of them; returns how many were requeued."""
+        with self._transaction():
+            return self.connection.execute(
+                'UPDATE tasks SET status = ?, owner = NULL, lease_expires = NULL, attempts = 0, updated_at = ? '
+                'WHERE status = ?',
+                (PENDING, time.time(), FAILED)
+            ).rowcount
+
+    def page_count(self, source: str, region: str):
+        """Listing page count recorded for a source and region, or None."""
+        row = self.connection.execute(
+            'SELECT page_count FROM shards WHERE source = ? AND region = ?', (source, region)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_page_count(self, source: str, region: str, count: int):
+        with self._transaction():
+            self.connection.execute(
+                'INSERT OR REPLACE INTO shards (source, region, page_count) VALUES (?, ?, ?)', (source, region, count)
+            )
+
+    def stored_links(self, source: str, region: str, links):
+        """The links among links whose offers are already stored for the source and region."""
+        return {link for link in links if self.connection.execute(
+            'SELECT 1 FROM offers WHERE source = ? AND region = ? AND link = ?', (source, region, link)
+        ).fetchone()}
+
+    def reset(self):
+        """Forget all tasks and results of a previous crawl."""
+        with self._transaction():
+            self.connection.execute('DELETE FROM tasks')
+            self.connection.execute('DELETE FROM shards')
+            self.connection.execute('DELETE FROM offers')
+
+    def unfinished(self):
+        """Number of tasks pending or leased; 0 once the crawl is over."""
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM tasks WHERE status IN (?, ?)', (PENDING, LEASED)
+        ).fetchone()[0]
+
+    def counts(self):
+        """Tasks by status."""
+        return dict(self.connection.execute('SELECT status, COUNT(*) FROM tasks GROUP BY status').fetchall())
+
+    def failed_tasks(self):
+        """(source, region, page, attempts, error) of the tasks that ran out of attempts."""
+        return self.connection.execute(
+            'SELECT source, region, page, attempts, error FROM tasks WHERE status = ? ORDER BY source, region, page',
+            (FAILED,)
+        ).fetchall()
+
+    def done_before(self, timestamp: float):
+        """(source, region) of the shards with tasks completed before timestamp, by an earlier run."""
+        return set(self.connection.execute(
+            'SELECT DISTINCT source, region FROM tasks WHERE status = ? AND updated_at < ?', (DONE, timestamp)
+        ).fetchall())
+
+    def iter_records(self, source: str, chunk_size: int = 1000, region: str = None, since: float = None):
+        """Yield the stored OfferRecords of a source, by region and listing page.
+
+        region limits them to one region, and since to the tasks completed at
+        that time or later.
+        """
+        query = ('SELECT offers.record FROM offers JOIN tasks ON tasks.id = offers.task_id '
+                 'WHERE offers.source = ?')
+        parameters = [source]
+        if region is not None:
+            query += ' AND offers.region = ?'
+            parameters.append(region)
+        if since is not None:
+            query += ' AND tasks.updated_at >= ?'
+            parameters.append(since)
+        cursor = self.connection.execute(query + ' ORDER BY offers.region, tasks.page, offers.rowid', parameters)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for (record,) in rows:
+                yield OfferRecord.from_dict(json.loads(record))
+
+    def sources(self):
+        return [source for (source,) in self.connection.execute('SELECT DISTINCT source FROM tasks ORDER BY source')]
+
+    def close(self):
+        self.connection.close()
+